@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+SOAR MCP 管理后台
+管理页面与管理 API 作为自定义路由挂载在 MCP 服务的 ASGI 应用上，与 MCP 端点共用同一进程、事件循环和端口；
+数据库访问走数据库线程池，连接测试复用共享的 SOAR HTTP 客户端
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+
+from async_db import async_db, db_executor
+from auth_provider import soar_auth_provider
+from auth_utils import get_auth_manager, jwt_required
+from config_manager import config_manager
+from logger_config import logger
+from models import SystemConfigData, db_manager
+from playbook_catalog import playbook_catalog
+from profiler import MAX_DURATION, ProfilerBusy, profile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+
+# 获取共享 SOAR HTTP 客户端的协程函数（由 register_admin_routes 注入）
+HttpClientFactory = Callable[[], Awaitable[httpx.AsyncClient]]
+
+
+def _send_file(directory: str, filename: str, not_found: str) -> Response:
+    """返回目录内的文件，拒绝越出目录的路径"""
+    path = os.path.realpath(os.path.join(directory, filename))
+    if os.path.commonpath([path, directory]) != directory or not os.path.isfile(path):
+        return JSONResponse({"error": not_found}, status_code=404)
+    return FileResponse(path)
+
+
+async def _json_body(request: Request) -> Optional[Any]:
+    """解析 JSON 请求体，非 JSON 或格式错误时返回 None"""
+    try:
+        return await request.json()
+    except Exception:
+        return None
+
+
+def _parse_playbook_id(playbook_id: str) -> int:
+    if playbook_id.startswith('id_'):
+        return int(playbook_id[3:])
+    return int(playbook_id)
+
+
+def _collect_stats() -> dict:
+    return {
+        **db_manager.get_playbooks_stats(),
+        **db_manager.get_apps_stats(),
+        "last_sync_time": db_manager.get_last_sync_time(),
+    }
+
+
+def register_admin_routes(server, http_client: HttpClientFactory):
+    """在 FastMCP 服务上注册管理后台页面与 API"""
+
+    @server.custom_route('/login', methods=['GET'])
+    async def login_page(request: Request) -> Response:
+        """登录页面"""
+        return _send_file(TEMPLATES_DIR, 'login.html', "登录页面未找到")
+
+    @server.custom_route('/admin', methods=['GET'])
+    async def admin_page(request: Request) -> Response:
+        """管理后台首页"""
+        return _send_file(TEMPLATES_DIR, 'admin.html', "管理页面未找到")
+
+    @server.custom_route('/static/{filename:path}', methods=['GET'])
+    async def serve_static(request: Request) -> Response:
+        """提供静态文件服务"""
+        return _send_file(STATIC_DIR, request.path_params['filename'], "文件未找到")
+
+    @server.custom_route('/api/admin/login', methods=['POST'])
+    async def admin_login(request: Request) -> JSONResponse:
+        """管理员登录"""
+        try:
+            data = await _json_body(request)
+            if not isinstance(data, dict) or 'adminPassword' not in data:
+                return JSONResponse({"success": False, "error": "请提供管理员密码"}, status_code=400)
+
+            admin_password = data['adminPassword'].strip()
+            if not admin_password:
+                return JSONResponse({"success": False, "error": "管理员密码不能为空"}, status_code=400)
+
+            # bcrypt 校验耗时约数百毫秒，放到线程中执行
+            jwt_token = await asyncio.to_thread(get_auth_manager().login_with_password, admin_password)
+
+            if jwt_token:
+                return JSONResponse({"success": True, "jwt": jwt_token, "message": "登录成功"})
+            else:
+                return JSONResponse({"success": False, "error": "密码无效，请检查后重试"}, status_code=401)
+
+        except Exception as e:
+            logger.error(f"管理员登录失败: {e}")
+            return JSONResponse({"success": False, "error": "登录过程中发生错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/verify', methods=['GET'])
+    async def verify_token(request: Request) -> JSONResponse:
+        """验证JWT Token"""
+        try:
+            auth_header = request.headers.get('Authorization')
+            if not auth_header:
+                return JSONResponse({"valid": False}, status_code=401)
+            try:
+                token = auth_header.split(' ')[1]
+            except IndexError:
+                return JSONResponse({"valid": False}, status_code=401)
+
+            payload = get_auth_manager().verify_jwt(token)
+            if payload:
+                return JSONResponse({"valid": True, "user": payload})
+            else:
+                return JSONResponse({"valid": False}, status_code=401)
+        except Exception as e:
+            logger.error(f"Token验证失败: {e}")
+            return JSONResponse({"valid": False}, status_code=401)
+
+    @server.custom_route('/api/admin/playbooks', methods=['GET'])
+    @jwt_required
+    async def get_admin_playbooks(request: Request) -> JSONResponse:
+        """获取所有剧本（管理界面）"""
+        try:
+            playbooks = await async_db.get_playbooks_admin()
+            return JSONResponse({"success": True, "data": playbooks, "total": len(playbooks)})
+        except Exception as e:
+            logger.error(f"获取管理剧本列表失败: {e}")
+            return JSONResponse({"success": False, "error": "获取剧本列表时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/playbooks/{playbook_id}', methods=['GET'])
+    @jwt_required
+    async def get_playbook_detail(request: Request) -> JSONResponse:
+        """获取单个剧本详情"""
+        try:
+            playbook_id = _parse_playbook_id(request.path_params['playbook_id'])
+            playbook = await async_db.get_playbook_by_id(playbook_id)
+            if playbook:
+                return JSONResponse({"success": True, "data": playbook})
+            else:
+                return JSONResponse({"success": False, "error": "剧本未找到"}, status_code=404)
+        except Exception as e:
+            logger.error(f"获取剧本详情失败: {e}")
+            return JSONResponse({"success": False, "error": "获取剧本详情时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/playbooks/{playbook_id}/toggle', methods=['POST'])
+    @jwt_required
+    async def toggle_playbook(request: Request) -> JSONResponse:
+        """切换剧本启用状态"""
+        playbook_id = request.path_params['playbook_id']
+        try:
+            data = await _json_body(request) or {}
+            enabled = data.get('enabled', True)
+            success = await async_db.update_playbook_status(_parse_playbook_id(playbook_id), enabled)
+            if success:
+                await db_executor.run(playbook_catalog.rebuild)
+                return JSONResponse({"success": True, "message": f"剧本 {playbook_id} 已{'启用' if enabled else '禁用'}"})
+            else:
+                return JSONResponse({"success": False, "error": f"未找到剧本 {playbook_id}"}, status_code=404)
+        except Exception as e:
+            logger.error(f"切换剧本状态失败: {e}")
+            return JSONResponse({"success": False, "error": "切换剧本状态时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/config', methods=['GET'])
+    @jwt_required
+    async def get_system_config(request: Request) -> JSONResponse:
+        """获取系统配置"""
+        try:
+            config = config_manager.get_soar_config()
+            config_dict = config.model_dump()
+            if config_dict.get('soar_api_token'):
+                token = config_dict['soar_api_token']
+                if len(token) > 10:
+                    config_dict['soar_api_token'] = token[:6] + '****' + token[-4:]
+            return JSONResponse({"success": True, "data": config_dict})
+        except Exception as e:
+            logger.error(f"获取系统配置失败: {e}")
+            return JSONResponse({"success": False, "error": "获取配置时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/config', methods=['POST'])
+    @jwt_required
+    async def update_system_config(request: Request) -> JSONResponse:
+        """更新系统配置"""
+        try:
+            data = await _json_body(request)
+            if not isinstance(data, dict):
+                return JSONResponse({"success": False, "error": "配置数据格式错误: 需要JSON对象"}, status_code=400)
+            old_config = config_manager.get_soar_config()
+
+            if 'soar_api_token' not in data:
+                data['soar_api_token'] = old_config.soar_api_token
+
+            try:
+                config_data = SystemConfigData(**data)
+            except Exception as e:
+                return JSONResponse({"success": False, "error": f"配置数据格式错误: {e}"}, status_code=400)
+
+            # 检查影响同步的字段变化
+            sync_affecting_fields = []
+            if old_config.soar_api_url != config_data.soar_api_url:
+                sync_affecting_fields.append("API地址")
+            if 'soar_api_token' in data and not data['soar_api_token'].startswith('***'):
+                if old_config.soar_api_token != config_data.soar_api_token:
+                    sync_affecting_fields.append("API Token")
+            if set(old_config.soar_labels or []) != set(config_data.soar_labels or []):
+                sync_affecting_fields.append("标签配置")
+            if old_config.soar_timeout != config_data.soar_timeout:
+                sync_affecting_fields.append("超时设置")
+
+            success = await db_executor.run(config_manager.update_soar_config, config_data)
+
+            if success and sync_affecting_fields:
+                # 定时同步服务订阅了这些配置项，由后台任务主节点立即执行同步
+                return JSONResponse({"success": True, "message": "系统配置已更新，正在触发数据同步..."})
+            elif success:
+                return JSONResponse({"success": True, "message": "系统配置已更新"})
+            else:
+                return JSONResponse({"success": False, "error": "配置更新失败"}, status_code=500)
+
+        except Exception as e:
+            logger.error(f"更新系统配置失败: {e}")
+            return JSONResponse({"success": False, "error": "更新配置时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/config/validate', methods=['POST'])
+    @jwt_required
+    async def validate_system_config(request: Request) -> JSONResponse:
+        """验证系统配置"""
+        try:
+            config_data = None
+            data = await _json_body(request)
+            if data:
+                try:
+                    config_data = SystemConfigData(**data)
+                except Exception as e:
+                    return JSONResponse({"success": False, "error": f"配置数据格式错误: {e}"}, status_code=400)
+            validation_result = config_manager.validate_config(config_data)
+            return JSONResponse({"success": True, "data": validation_result})
+        except Exception as e:
+            logger.error(f"验证系统配置失败: {e}")
+            return JSONResponse({"success": False, "error": "验证配置时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/config/test', methods=['POST'])
+    @jwt_required
+    async def test_connection(request: Request) -> JSONResponse:
+        """测试API连接"""
+        try:
+            config_data = None
+            data = await _json_body(request)
+            if data:
+                try:
+                    config_data = SystemConfigData(**data)
+                except Exception as e:
+                    return JSONResponse({"success": False, "error": f"配置数据格式错误: {e}"}, status_code=400)
+            test_result = await config_manager.test_connection(config_data, client=await http_client())
+            return JSONResponse({"success": True, "data": test_result})
+        except Exception as e:
+            logger.error(f"测试连接失败: {e}")
+            return JSONResponse({"success": False, "error": "测试连接时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/tokens', methods=['GET'])
+    @jwt_required
+    async def get_tokens(request: Request) -> JSONResponse:
+        """获取所有Token列表"""
+        try:
+            tokens = await async_db.get_user_tokens()
+            return JSONResponse({"success": True, "data": tokens})
+        except Exception as e:
+            logger.error(f"获取Token列表失败: {e}")
+            return JSONResponse({"success": False, "error": "获取Token列表时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/tokens', methods=['POST'])
+    @jwt_required
+    async def create_token(request: Request) -> JSONResponse:
+        """创建新Token"""
+        try:
+            data = await _json_body(request)
+            if not isinstance(data, dict) or 'name' not in data:
+                return JSONResponse({"success": False, "error": "请提供Token名称"}, status_code=400)
+            name = data['name'].strip()
+            expires_in_days = data.get('expires_in_days')
+            if not name:
+                return JSONResponse({"success": False, "error": "Token名称不能为空"}, status_code=400)
+            token = await async_db.create_user_token(name, expires_in_days)
+            if token:
+                return JSONResponse({"success": True, "token": token, "message": "Token创建成功"})
+            else:
+                return JSONResponse({"success": False, "error": "Token创建失败"}, status_code=500)
+        except Exception as e:
+            logger.error(f"创建Token失败: {e}")
+            return JSONResponse({"success": False, "error": "创建Token时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/tokens/{token_id:int}', methods=['DELETE'])
+    @jwt_required
+    async def delete_token(request: Request) -> JSONResponse:
+        """删除Token"""
+        try:
+            success = await async_db.delete_user_token(request.path_params['token_id'])
+            if success:
+                await soar_auth_provider.invalidate_token(request.path_params['token_id'])
+                return JSONResponse({"success": True, "message": "Token删除成功"})
+            else:
+                return JSONResponse({"success": False, "error": "Token删除失败或不存在"}, status_code=404)
+        except Exception as e:
+            logger.error(f"删除Token失败: {e}")
+            return JSONResponse({"success": False, "error": "删除Token时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/tokens/{token_id:int}/rate-limit', methods=['PUT'])
+    @jwt_required
+    async def update_token_rate_limit(request: Request) -> JSONResponse:
+        """更新Token速率限制（每分钟调用数，null 表示使用系统配置，0 表示不限）"""
+        try:
+            data = await _json_body(request) or {}
+            limits = {}
+            for key in ("execute_rate_limit", "status_rate_limit"):
+                value = data.get(key)
+                if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+                    return JSONResponse({"success": False, "error": f"{key} 必须为非负整数或 null"}, status_code=400)
+                limits[key] = value
+            success = await async_db.update_token_rate_limits(request.path_params['token_id'], **limits)
+            if success:
+                await soar_auth_provider.invalidate_token(request.path_params['token_id'])
+                return JSONResponse({"success": True, "message": "Token速率限制已更新"})
+            else:
+                return JSONResponse({"success": False, "error": "Token不存在"}, status_code=404)
+        except Exception as e:
+            logger.error(f"更新Token速率限制失败: {e}")
+            return JSONResponse({"success": False, "error": "更新Token速率限制时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/tokens/{token_id:int}/toggle', methods=['POST'])
+    @jwt_required
+    async def toggle_token_status(request: Request) -> JSONResponse:
+        """切换Token启用状态"""
+        try:
+            data = await _json_body(request)
+            if not isinstance(data, dict) or 'is_active' not in data:
+                return JSONResponse({"success": False, "error": "请提供is_active参数"}, status_code=400)
+            is_active = data['is_active']
+            success = await async_db.update_token_status(request.path_params['token_id'], is_active)
+            if success:
+                await soar_auth_provider.invalidate_token(request.path_params['token_id'])
+                return JSONResponse({"success": True, "message": f"Token已{'启用' if is_active else '禁用'}"})
+            else:
+                return JSONResponse({"success": False, "error": "Token状态更新失败或不存在"}, status_code=404)
+        except Exception as e:
+            logger.error(f"更新Token状态失败: {e}")
+            return JSONResponse({"success": False, "error": "更新Token状态时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/stats', methods=['GET'])
+    @jwt_required
+    async def get_system_stats(request: Request) -> JSONResponse:
+        """获取系统统计信息"""
+        try:
+            stats = await db_executor.run(_collect_stats)
+            return JSONResponse({"success": True, "stats": stats})
+        except Exception as e:
+            logger.error(f"获取系统统计失败: {e}")
+            return JSONResponse({"success": False, "error": "获取统计信息时发生内部错误"}, status_code=500)
+
+    @server.custom_route('/api/admin/profile', methods=['POST'])
+    @jwt_required
+    async def profile_server(request: Request) -> Response:
+        """对运行中的服务采样 N 秒，返回折叠栈文件（可用 flamegraph.pl / speedscope 生成火焰图）"""
+        data = await _json_body(request) or {}
+        if not isinstance(data, dict):
+            return JSONResponse({"success": False, "error": "请求体需要JSON对象"}, status_code=400)
+        seconds = data.get("seconds", 10)
+        interval = data.get("interval", 0.01)
+        thread_filter = data.get("thread")
+        for key, value, low, high in (("seconds", seconds, 0.1, MAX_DURATION), ("interval", interval, 0.001, 1.0)):
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or not low <= value <= high:
+                return JSONResponse({"success": False, "error": f"{key} 必须为 {low} 到 {high} 之间的数字"}, status_code=400)
+        if thread_filter is not None and not isinstance(thread_filter, str):
+            return JSONResponse({"success": False, "error": "thread 必须为字符串"}, status_code=400)
+
+        try:
+            # 在独立线程中采样，事件循环保持运行并被一同采样
+            collapsed, samples = await asyncio.to_thread(
+                profile, seconds, interval, bool(data.get("include_idle", False)), thread_filter)
+        except ProfilerBusy as e:
+            return JSONResponse({"success": False, "error": str(e)}, status_code=409)
+        except Exception as e:
+            logger.error(f"性能采样失败: {e}")
+            return JSONResponse({"success": False, "error": "性能采样时发生内部错误"}, status_code=500)
+
+        logger.info(f"性能采样完成: {seconds}秒, {samples}次采样")
+        filename = f"soar-mcp-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+        return PlainTextResponse(collapsed, headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Samples": str(samples),
+        })
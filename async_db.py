@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+SOAR MCP 数据库异步访问
+异步工具与认证路径通过专用线程池执行同步的 SQLAlchemy 调用，
+SQLite 锁等待或慢查询只占用数据库线程，不会阻塞事件循环上的其他 MCP 请求
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from models import DatabaseManager, db_manager
+from logger_config import logger
+
+
+class DatabaseExecutor:
+    """数据库专用线程池，pending 为已提交（run 与 submit）尚未完成的调用数"""
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._pending = 0
+        # submit 的调用在数据库线程中完成计数，与事件循环线程并发修改
+        self._pending_lock = threading.Lock()
+
+    def _add_pending(self, delta: int):
+        with self._pending_lock:
+            self._pending += delta
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """在数据库线程中执行并等待结果"""
+        loop = asyncio.get_running_loop()
+        # 在调用方的上下文中执行，数据库调用归属到当前请求的追踪链路
+        context = contextvars.copy_context()
+        self._add_pending(1)
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+        finally:
+            self._add_pending(-1)
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs):
+        """提交不需要结果的数据库操作（不等待，异常只记录日志）"""
+        context = contextvars.copy_context()
+
+        def run():
+            try:
+                context.run(func, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"后台数据库操作异常: {e}")
+            finally:
+                self._add_pending(-1)
+        self._add_pending(1)
+        try:
+            self._executor.submit(run)
+        except RuntimeError:
+            # 线程池已关闭
+            self._add_pending(-1)
+            raise
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池"""
+        self._executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, int]:
+        """线程池统计"""
+        return {"workers": self.max_workers, "pending": self._pending}
+
+
+class AsyncDatabaseManager:
+    """
+    DatabaseManager 的异步门面
+
+    访问任意方法都会得到对应的协程函数，例如
+    `await async_db.get_executions(limit=50)` 在数据库线程中执行 `db_manager.get_executions(limit=50)`
+    """
+
+    def __init__(self, db: DatabaseManager, executor: DatabaseExecutor):
+        self._db = db
+        self._executor = executor
+
+    def __getattr__(self, name: str):
+        method = getattr(self._db, name)
+        if not callable(method):
+            raise AttributeError(f"{name} 不是 DatabaseManager 的方法")
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self._executor.run(method, *args, **kwargs)
+        return call
+
+
+# 全局数据库线程池与异步门面
+db_executor = DatabaseExecutor(max_workers=int(os.getenv("DB_THREAD_POOL_SIZE", "4")))
+async_db = AsyncDatabaseManager(db_manager, db_executor)
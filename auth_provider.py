@@ -4,8 +4,11 @@
 支持双模式认证：HTTP Bearer Token 和 URL查询参数Token
 """
 
+import hashlib
+import os
+import time
 from datetime import datetime
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 
 from starlette.authentication import AuthCredentials, AuthenticationBackend
 from starlette.middleware import Middleware
@@ -20,9 +23,23 @@ from mcp.server.auth.middleware.bearer_auth import (
     RequireAuthMiddleware,
 )
 from models import db_manager
+from async_db import db_executor
+from request_context import set_current_user_info
+from cache_backend import CacheBackend, LocalCacheBackend, cache_backend
+from tracing import TracingMiddleware, start_span
 from logger_config import logger
 
 
+# 管理后台页面与 API、指标端点使用管理员 JWT（auth_utils.jwt_required）或 METRICS_TOKEN 认证，
+# 其 Authorization 头不是 MCP Token
+ADMIN_PATHS = ("/admin", "/login", "/metrics")
+ADMIN_PATH_PREFIXES = ("/api/admin/", "/static/")
+
+
+def _is_admin_path(path: str) -> bool:
+    return path in ADMIN_PATHS or path.startswith(ADMIN_PATH_PREFIXES)
+
+
 class BearerOrQueryAuthBackend(AuthenticationBackend):
     """
     双模式认证后端：优先检查 Authorization: Bearer <token>，
@@ -37,6 +54,10 @@ class BearerOrQueryAuthBackend(AuthenticationBackend):
         self.token_verifier = token_verifier
 
     async def authenticate(self, conn: HTTPConnection):
+        if _is_admin_path(conn.url.path):
+            # 管理后台请求不查询 MCP Token，避免每次请求一次数据库查询和"无效的token"告警
+            return None
+
         token_value = None
         auth_method = None
 
@@ -76,12 +97,70 @@ class SOARAuthProvider(AuthProvider):
     - URL查询参数:       ?token=<token>                  (兼容)
 
     两种方式使用同一套Token体系，后端验证逻辑完全复用。
+
+    验证通过的Token信息在缓存后端中保留 cache_ttl 秒（按Token哈希作键），
+    缓存命中时不再查询数据库，使用统计改为后台更新；Token启停、删除或修改限速后需调用
+    invalidate_token 使缓存失效。cache_ttl <= 0 表示不缓存。
+
+    invalidate_token 只能清除共享缓存或当前进程的本地缓存。使用本地缓存时，缓存项另外
+    记录写入时的Token版本号（数据库触发器维护），每隔 version_check_interval 秒读取一次
+    版本号，版本号变化后旧缓存项全部失效，其他 worker 进程的修改同样可见。
     """
 
-    def __init__(self, required_scopes: List[str] = None):
+    def __init__(self, required_scopes: List[str] = None, cache: Optional[CacheBackend] = None,
+                 cache_ttl: float = 30.0, version_check_interval: float = 1.0):
         super().__init__(base_url=None, required_scopes=required_scopes or [])
+        self._cache = cache or LocalCacheBackend()
+        self.cache_ttl = cache_ttl
+        self.version_check_interval = version_check_interval
+        self._token_version = None
+        self._version_checked_at = None
         logger.info("SOARAuthProvider初始化完成 (支持Bearer Token + URL参数双模式认证)")
 
+    @staticmethod
+    def _cache_key(token: str) -> str:
+        return "token:" + hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    async def _current_token_version(self) -> Optional[int]:
+        """本地缓存时按间隔读取数据库中的Token版本号（在数据库线程中执行），共享缓存不检查"""
+        if self.cache_ttl <= 0 or self._cache.shared:
+            return None
+        now = time.monotonic()
+        if self._version_checked_at is None or now - self._version_checked_at >= self.version_check_interval:
+            self._version_checked_at = now
+            self._token_version = await db_executor.run(db_manager.get_token_version)
+        return self._token_version
+
+    async def _cached_token_info(self, token: str, version: Optional[int]) -> Optional[Dict[str, Any]]:
+        """读取缓存的Token信息，过期的Token或写入后Token版本号已变化的缓存项视为未命中"""
+        if self.cache_ttl <= 0:
+            return None
+        token_info = await self._cache.get(self._cache_key(token))
+        if not token_info or token_info.get("version") != version:
+            return None
+        expires_at = token_info.get("expires_at")
+        if expires_at and datetime.now() > datetime.fromisoformat(expires_at):
+            return None
+        token_info = {k: v for k, v in token_info.items() if k != "version"}
+        return dict(token_info, token=token)
+
+    async def _cache_token_info(self, token: str, token_info: Dict[str, Any], version: Optional[int]):
+        """缓存Token信息（不保存Token明文），同时记录 Token ID 到缓存键的映射以便失效
+
+        version 须在查询数据库之前读取，查询期间发生的修改会使该缓存项立即失效。
+        """
+        if self.cache_ttl <= 0:
+            return
+        key = self._cache_key(token)
+        cached = {k: v for k, v in token_info.items() if k != "token"}
+        await self._cache.set(key, dict(cached, version=version), ttl=self.cache_ttl)
+        await self._cache.set(f"token-id:{token_info['id']}", key, ttl=self.cache_ttl)
+
+    async def invalidate_token(self, token_id: int):
+        """使指定Token的验证缓存失效"""
+        key = await self._cache.get(f"token-id:{token_id}")
+        await self._cache.delete(*(k for k in (key, f"token-id:{token_id}") if k))
+
     async def verify_token(self, token: str) -> Optional[AccessToken]:
         """
         验证Token并返回AccessToken。
@@ -89,30 +168,40 @@ class SOARAuthProvider(AuthProvider):
         此方法被 BearerOrQueryAuthBackend 调用，
         无论Token来自 Bearer header 还是 URL 参数都走这个验证逻辑。
         """
+        with start_span("verify_token") as span:
+            access_token = await self._verify_token(token, span)
+            span.set_attribute("soar.auth.valid", access_token is not None)
+            return access_token
+
+    async def _verify_token(self, token: str, span) -> Optional[AccessToken]:
         try:
             if not token:
                 return None
 
-            # 从数据库查找Token信息
-            token_info = db_manager.get_token_by_value(token)
-            if not token_info:
-                logger.warning(f"无效的token: {token[:8]}...")
-                return None
-
-            # 验证Token有效性（同时更新使用统计）
-            is_valid = db_manager.verify_token(token)
-            if not is_valid:
-                logger.warning(f"Token验证失败: {token[:8]}...")
-                return None
+            version = await self._current_token_version()
+            token_info = await self._cached_token_info(token, version)
+            span.set_attribute("soar.auth.cache_hit", token_info is not None)
+            if token_info is not None:
+                # 缓存命中：使用统计在后台更新，不等待数据库
+                db_executor.submit(db_manager.verify_token, token)
+            else:
+                # 从数据库查找Token信息（在数据库线程中执行，不阻塞事件循环）
+                token_info = await db_executor.run(db_manager.get_token_by_value, token)
+                if not token_info:
+                    logger.warning(f"无效的token: {token[:8]}...")
+                    return None
+
+                # 验证Token有效性（同时更新使用统计）
+                is_valid = await db_executor.run(db_manager.verify_token, token)
+                if not is_valid:
+                    logger.warning(f"Token验证失败: {token[:8]}...")
+                    return None
+                await self._cache_token_info(token, token_info, version)
 
             logger.debug(f"Token验证成功: 用户={token_info['name']}")
 
             # 将用户信息存储到请求上下文
-            try:
-                from soar_mcp_server import set_current_user_info
-                set_current_user_info(token, token_info)
-            except Exception as e:
-                logger.debug(f"存储用户信息到上下文失败: {e}")
+            set_current_user_info(token, token_info)
 
             return AccessToken(
                 token=token,
@@ -128,6 +217,8 @@ class SOARAuthProvider(AuthProvider):
     def get_middleware(self) -> list:
         """返回认证中间件列表，使用自定义的双模式认证后端"""
         return [
+            # 追踪中间件位于认证之前，Token 验证计入请求的根 span
+            Middleware(TracingMiddleware),
             Middleware(
                 AuthenticationMiddleware,
                 backend=BearerOrQueryAuthBackend(self),
@@ -160,5 +251,5 @@ class SOARAuthProvider(AuthProvider):
         return routes
 
 
-# 创建全局认证提供者实例
-soar_auth_provider = SOARAuthProvider()
+# 创建全局认证提供者实例（Token验证缓存使用全局缓存后端，多节点部署时共享）
+soar_auth_provider = SOARAuthProvider(cache=cache_backend, cache_ttl=float(os.getenv("TOKEN_CACHE_TTL", "30")))
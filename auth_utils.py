@@ -2,16 +2,14 @@
 """
 认证工具模块
 处理密码认证、JWT认证等功能
+bcrypt 与 jwt 在首次使用时才导入，不计入 MCP 服务的启动时间
 """
 
 import secrets
 import string
-import jwt
-import bcrypt
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
 from functools import wraps
-from flask import request, jsonify, current_app
 
 from models import db_manager
 from logger_config import logger
@@ -45,6 +43,7 @@ class AuthManager:
 
     def hash_password(self, password: str) -> str:
         """使用 bcrypt 对密码进行哈希"""
+        import bcrypt
         return bcrypt.hashpw(
             password.encode('utf-8'),
             bcrypt.gensalt()
@@ -52,6 +51,7 @@ class AuthManager:
 
     def check_password(self, password: str, password_hash: str) -> bool:
         """验证密码是否与哈希匹配"""
+        import bcrypt
         try:
             return bcrypt.checkpw(
                 password.encode('utf-8'),
@@ -87,6 +87,7 @@ class AuthManager:
 
     def generate_jwt(self, payload: Dict[str, Any], expires_hours: int = 24) -> str:
         """生成JWT token"""
+        import jwt
         try:
             now = datetime.now(timezone.utc)
             payload['exp'] = now + timedelta(hours=expires_hours)
@@ -98,6 +99,7 @@ class AuthManager:
 
     def verify_jwt(self, token: str) -> Optional[Dict[str, Any]]:
         """验证JWT token"""
+        import jwt
         try:
             payload = jwt.decode(token, self.jwt_secret_key, algorithms=['HS256'])
             return payload
@@ -120,10 +122,12 @@ class AuthManager:
         return None
 
 
-def jwt_required(f):
-    """JWT认证装饰器"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
+def jwt_required(handler):
+    """JWT认证装饰器（Starlette 异步路由），认证通过后载荷写入 request.state.user"""
+    @wraps(handler)
+    async def decorated_function(request):
+        from starlette.responses import JSONResponse
+
         token = None
         auth_header = request.headers.get('Authorization')
 
@@ -131,22 +135,21 @@ def jwt_required(f):
             try:
                 token = auth_header.split(' ')[1]  # Bearer <token>
             except IndexError:
-                return jsonify({'error': 'Authorization header格式错误'}), 401
+                return JSONResponse({'error': 'Authorization header格式错误'}, status_code=401)
 
         if not token:
-            return jsonify({'error': '需要认证token'}), 401
+            return JSONResponse({'error': '需要认证token'}, status_code=401)
 
         try:
-            auth_manager = current_app.auth_manager
-            payload = auth_manager.verify_jwt(token)
+            payload = get_auth_manager().verify_jwt(token)
             if not payload:
-                return jsonify({'error': 'token无效或已过期'}), 401
-
-            request.user = payload
-            return f(*args, **kwargs)
+                return JSONResponse({'error': 'token无效或已过期'}, status_code=401)
         except Exception as e:
             logger.error(f"JWT验证失败: {e}")
-            return jsonify({'error': 'token验证失败'}), 401
+            return JSONResponse({'error': 'token验证失败'}, status_code=401)
+
+        request.state.user = payload
+        return await handler(request)
 
     return decorated_function
 
@@ -154,3 +157,15 @@ def jwt_required(f):
 def create_auth_manager() -> AuthManager:
     """创建认证管理器实例"""
     return AuthManager()
+
+
+# 全局认证管理器（依赖数据库中的 JWT 密钥，首次使用时创建）
+_auth_manager: Optional[AuthManager] = None
+
+
+def get_auth_manager() -> AuthManager:
+    """获取全局认证管理器"""
+    global _auth_manager
+    if _auth_manager is None:
+        _auth_manager = create_auth_manager()
+    return _auth_manager
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+SOAR MCP 共享缓存后端
+为Token验证缓存、执行状态缓存、速率限制与幂等键提供统一的键值与锁接口：
+单节点使用进程内实现；多节点部署在负载均衡之后时配置 Redis 协议的后端，
+各节点共享热点状态，无需各自查询 SQLite 或 SOAR
+
+值以 JSON 存储；后端故障时读取视为未命中、写入被忽略，调用方回退到各自的本地逻辑。
+令牌桶预约（reserve_tokens）在后端内原子执行，后端故障时抛出 CacheBackendError
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from logger_config import logger
+
+
+class CacheBackendError(Exception):
+    """缓存后端不可用"""
+
+
+class CacheLockTimeout(CacheBackendError):
+    """等待锁超时"""
+
+
+# 令牌桶预约（Redis 服务端原子执行）：KEYS[1] 为令牌桶哈希（tokens、updated_at），
+# ARGV 为 每秒补充令牌数、容量、消耗、最长等待秒数、当前时间；返回 {是否准入, 等待秒数}。
+# 计算与 rate_limiter.TokenBucket.reserve 一致；浮点数以字符串返回，避免被转换为整数
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = capacity
+if state[1] then
+    tokens = math.min(capacity, tonumber(state[1]) + (now - tonumber(state[2])) * rate)
+end
+local wait = math.max(0, (math.min(cost, capacity) - tokens) / rate)
+if wait > max_wait then
+    return {0, tostring(wait)}
+end
+tokens = tokens - cost
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((math.max(0, capacity - tokens) / rate + 1) * 1000))
+return {1, tostring(wait)}
+"""
+
+
+def reserve_token_bucket(state: Optional[Dict[str, float]], rate: float, capacity: float, cost: float,
+                         max_wait: float, now: float) -> Tuple[bool, float, Optional[Dict[str, float]]]:
+    """TOKEN_BUCKET_SCRIPT 的 Python 实现，返回 (是否准入, 等待秒数, 准入后的新状态)"""
+    tokens = capacity
+    if state:
+        tokens = min(capacity, state["tokens"] + (now - state["updated_at"]) * rate)
+    wait = max(0.0, (min(cost, capacity) - tokens) / rate)
+    if wait > max_wait:
+        return False, wait, None
+    return True, wait, {"tokens": tokens - cost, "updated_at": now}
+
+
+class CacheBackend:
+    """
+    缓存后端接口
+
+    shared 为 True 表示状态在多个节点之间共享，调用方据此决定是否需要在本地缓存之外读写后端
+    """
+
+    shared = False
+
+    async def get(self, key: str) -> Optional[Any]:
+        """读取键值，未命中、已过期或后端故障时返回 None"""
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """写入键值，ttl 为过期秒数（None 表示不过期）"""
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        """删除键"""
+        raise NotImplementedError
+
+    def lock(self, name: str, ttl: float = 10.0, timeout: float = 5.0):
+        """
+        互斥锁（异步上下文管理器）
+
+        Args:
+            ttl: 锁的最长持有时间，持有者异常退出后锁自动释放
+            timeout: 等待获取锁的最长时间，超时抛出 CacheLockTimeout
+        """
+        raise NotImplementedError
+
+    async def reserve_tokens(self, key: str, rate: float, capacity: float, cost: float,
+                             max_wait: float, now: float) -> Tuple[bool, float]:
+        """
+        在令牌桶中原子地预约 cost 个令牌（读取、补充、扣减在一次操作内完成）
+
+        Returns:
+            (是否准入, 需要等待的秒数)
+
+        Raises:
+            CacheBackendError: 后端不可用
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """关闭后端连接"""
+
+    def stats(self) -> Dict[str, Any]:
+        """后端统计"""
+        raise NotImplementedError
+
+
+class LocalCacheBackend(CacheBackend):
+    """进程内缓存后端（TTL + 条目数上限的LRU），只在当前进程内有效"""
+
+    def __init__(self, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and self._clock() >= expires_at:
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = self._clock() + ttl if ttl is not None else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    @asynccontextmanager
+    async def lock(self, name: str, ttl: float = 10.0, timeout: float = 5.0) -> AsyncIterator[None]:
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise CacheLockTimeout(f"等待锁 {name} 超时")
+        try:
+            yield
+        finally:
+            lock.release()
+
+    async def reserve_tokens(self, key: str, rate: float, capacity: float, cost: float,
+                             max_wait: float, now: float) -> Tuple[bool, float]:
+        # 读取与写入之间没有 await，在事件循环内天然原子
+        admitted, wait, state = reserve_token_bucket(await self.get(key), rate, capacity, cost, max_wait, now)
+        if admitted:
+            await self.set(key, state, ttl=max(0.0, capacity - state["tokens"]) / rate + 1)
+        return admitted, wait
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "local", "shared": False, "entries": len(self._entries)}
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Redis 协议缓存后端（Redis、Valkey、KeyDB 等）
+
+    依赖可选的 redis 包，仅在使用该后端时导入；也可以传入已创建的异步客户端
+    """
+
+    shared = True
+
+    def __init__(self, url: Optional[str] = None, client: Any = None, prefix: str = "soar-mcp:"):
+        if client is None:
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError as e:
+                raise CacheBackendError("使用 Redis 缓存后端需要安装 redis 包: pip install redis") from e
+            client = redis_asyncio.from_url(url)
+        self._client = client
+        self.prefix = prefix
+        self._hits = 0
+        self._misses = 0
+        self._errors = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _failed(self, action: str, key: str, error: Exception):
+        self._errors += 1
+        logger.warning(f"缓存后端{action}失败 [{key}]: {error}")
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = await self._client.get(self._key(key))
+        except Exception as e:
+            self._failed("读取", key, e)
+            return None
+        if raw is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        px = max(1, int(ttl * 1000)) if ttl is not None else None
+        try:
+            await self._client.set(self._key(key), json.dumps(value, ensure_ascii=False, default=str), px=px)
+        except Exception as e:
+            self._failed("写入", key, e)
+
+    async def delete(self, *keys: str):
+        if not keys:
+            return
+        try:
+            await self._client.delete(*(self._key(key) for key in keys))
+        except Exception as e:
+            self._failed("删除", ",".join(keys), e)
+
+    @asynccontextmanager
+    async def lock(self, name: str, ttl: float = 10.0, timeout: float = 5.0) -> AsyncIterator[None]:
+        lock = self._client.lock(self._key(f"lock:{name}"), timeout=ttl, blocking_timeout=timeout)
+        try:
+            acquired = await lock.acquire()
+        except Exception as e:
+            self._failed("加锁", name, e)
+            raise CacheBackendError(f"获取锁 {name} 失败: {e}") from e
+        if not acquired:
+            raise CacheLockTimeout(f"等待锁 {name} 超时")
+        try:
+            yield
+        finally:
+            try:
+                await lock.release()
+            except Exception as e:
+                # 持有时间超过 ttl 时锁已自动释放
+                self._failed("释放锁", name, e)
+
+    async def reserve_tokens(self, key: str, rate: float, capacity: float, cost: float,
+                             max_wait: float, now: float) -> Tuple[bool, float]:
+        try:
+            admitted, wait = await self._client.eval(TOKEN_BUCKET_SCRIPT, 1, self._key(key),
+                                                     rate, capacity, cost, max_wait, now)
+        except Exception as e:
+            self._failed("预约令牌", key, e)
+            raise CacheBackendError(f"预约令牌 {key} 失败: {e}") from e
+        return bool(int(admitted)), float(wait)
+
+    async def close(self):
+        await self._client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "shared": True,
+                "hits": self._hits, "misses": self._misses, "errors": self._errors}
+
+
+def create_cache_backend(url: Optional[str] = None) -> CacheBackend:
+    """
+    根据地址创建缓存后端
+
+    - 空或 memory://           进程内缓存
+    - redis:// / rediss:// / unix://  Redis 协议后端
+    """
+    if not url or url.startswith("memory://"):
+        return LocalCacheBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCacheBackend(url)
+    raise ValueError(f"不支持的缓存后端地址: {url}")
+
+
+# 全局缓存后端
+cache_backend = create_cache_backend(os.getenv("CACHE_BACKEND_URL"))
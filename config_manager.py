@@ -1,64 +1,180 @@
 #!/usr/bin/env python3
 """
 SOAR MCP 配置管理器
-统一管理系统配置，支持缓存和实时更新
+统一管理系统配置，支持缓存和实时更新；读取使用不可变快照无需加锁，配置变化时通知订阅方
 """
 
+import itertools
+import threading
 import time
-from typing import Any, Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
 from threading import Lock
+import httpx
 from models import db_manager, SystemConfigData
 from logger_config import logger
 
+_snapshot_versions = itertools.count(1)
+
+# 订阅回调：(变化的配置键集合, 新快照)
+ConfigListener = Callable[[frozenset, "ConfigSnapshot"], None]
+
+
+class ConfigSnapshot:
+    """不可变的配置快照，读取无需加锁；配置变化时整体替换"""
+
+    __slots__ = ("version", "loaded_at", "data_version", "values")
+
+    def __init__(self, values: Dict[str, Any], loaded_at: float = 0, data_version: Optional[int] = None):
+        self.version = next(_snapshot_versions)
+        self.loaded_at = loaded_at
+        # 加载时数据库中的配置版本号，用于跨进程检测变化
+        self.data_version = data_version
+        self.values: Mapping[str, Any] = MappingProxyType(dict(values))
+
+    def get(self, key: str, default_value: Any = None) -> Any:
+        return self.values.get(key, default_value)
+
+    def diff(self, other: "ConfigSnapshot") -> frozenset:
+        """与另一快照相比发生变化的配置键"""
+        keys = set(self.values) | set(other.values)
+        return frozenset(k for k in keys if self.values.get(k) != other.values.get(k))
+
 
 class ConfigManager:
     """系统配置管理器"""
     
     def __init__(self):
-        self._config_cache = {}
-        self._cache_timestamp = 0
-        self._cache_ttl = 60  # 缓存有效期60秒
-        self._lock = Lock()
-    
-    def _refresh_cache(self, force: bool = False):
-        """刷新配置缓存"""
-        current_time = time.time()
-        
-        with self._lock:
-            if not force and (current_time - self._cache_timestamp < self._cache_ttl):
-                return  # 缓存仍有效
-            
+        self._snapshot = ConfigSnapshot({})
+        self._cache_ttl = 60  # 无法读取配置版本号时的缓存有效期（秒）
+        self._check_interval = 0.05  # 检查配置版本号的最小间隔（秒）
+        self._last_checked = 0.0
+        self._lock = Lock()  # 只用于串行化刷新，读取不加锁
+        self._listeners: List[Tuple[ConfigListener, Optional[frozenset]]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_stop = threading.Event()
+
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """
+        当前配置快照
+
+        数据库中的配置版本号由触发器在 system_config 变化时递增，其他进程的修改同样可见。
+        后台检查线程运行时由其检查版本号并替换快照，读取只返回内存中的快照，不访问数据库
+        （事件循环中读取配置不会阻塞）；未启动检查线程时（命令行工具等）读取时按间隔检查，
+        检查与加载由一个调用方完成，其余调用方继续使用旧快照
+        """
+        snapshot = self._snapshot
+        if not snapshot.loaded_at or (
+                not self.watching and time.time() - self._last_checked >= self._check_interval):
+            # 尚未加载过时必须等待首次加载完成
+            self._refresh_cache(blocking=not snapshot.loaded_at)
+            snapshot = self._snapshot
+        return snapshot
+
+    @property
+    def watching(self) -> bool:
+        return self._watcher is not None and self._watcher.is_alive()
+
+    def start_watcher(self, interval: float = 0.5):
+        """启动后台线程定期检查配置版本号（多 worker 部署时感知其他 worker 的配置修改）"""
+        if self.watching:
+            return
+        self._watcher_stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="config-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """停止版本号检查线程"""
+        self._watcher_stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def _watch(self, interval: float):
+        while not self._watcher_stop.wait(interval):
+            self._refresh_cache()
+
+    def _is_current(self, snapshot: ConfigSnapshot, data_version: Optional[int], now: float) -> bool:
+        if not snapshot.loaded_at:
+            return False
+        if data_version is None or snapshot.data_version is None:
+            return now - snapshot.loaded_at < self._cache_ttl
+        return data_version == snapshot.data_version
+
+    def _refresh_cache(self, force: bool = False, blocking: bool = True):
+        """配置版本变化时从数据库重新加载并替换快照；非阻塞模式下已有刷新在进行时直接返回"""
+        if not self._lock.acquire(blocking=blocking):
+            return
+        try:
+            current_time = time.time()
+            self._last_checked = current_time
+            old = self._snapshot
             try:
-                self._config_cache = db_manager.get_all_system_configs()
-                self._cache_timestamp = current_time
-                logger.debug("配置缓存已刷新")
+                data_version = db_manager.get_config_version()
+                if not force and self._is_current(old, data_version, current_time):
+                    return  # 配置未变化
+                new = ConfigSnapshot(db_manager.get_all_system_configs(), current_time, data_version)
             except Exception as e:
                 logger.error(f"刷新配置缓存失败: {e}")
-    
+                return
+            self._snapshot = new
+            logger.debug(f"配置缓存已刷新: 配置版本 {data_version}")
+        finally:
+            self._lock.release()
+
+        changed = new.diff(old)
+        if changed and old.loaded_at:
+            self._notify(changed, new)
+
+    def subscribe(self, listener: ConfigListener, keys: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """
+        订阅配置变化，返回取消订阅函数
+
+        Args:
+            listener: 回调，参数为变化的配置键集合与新快照；在刷新配置的线程中同步调用
+            keys: 只关注的配置键，为空表示关注全部
+        """
+        entry = (listener, frozenset(keys) if keys is not None else None)
+        self._listeners.append(entry)
+
+        def unsubscribe():
+            if entry in self._listeners:
+                self._listeners.remove(entry)
+        return unsubscribe
+
+    def _notify(self, changed: frozenset, snapshot: ConfigSnapshot):
+        for listener, keys in list(self._listeners):
+            if keys is not None and not (keys & changed):
+                continue
+            try:
+                listener(changed, snapshot)
+            except Exception as e:
+                logger.error(f"配置变化回调执行失败: {e}")
+
     def get(self, key: str, default_value: Any = None) -> Any:
         """获取配置值"""
-        self._refresh_cache()
-        
-        with self._lock:
-            return self._config_cache.get(key, default_value)
+        return self.snapshot.get(key, default_value)
     
     def set(self, key: str, value: Any, description: str = None) -> bool:
         """设置配置值"""
-        try:
-            success = db_manager.set_system_config(key, value, description)
-            if success:
-                self._refresh_cache(force=True)
-            return success
-        except Exception as e:
-            logger.error(f"设置配置失败 {key}: {e}")
-            return False
+        return self.set_many({key: (value, description)})
+
+    def set_many(self, items: Dict[str, Tuple[Any, Optional[str]]]) -> bool:
+        """批量设置配置值（键 -> (值, 描述)），全部写入后只刷新一次快照"""
+        success = True
+        for key, (value, description) in items.items():
+            try:
+                success &= db_manager.set_system_config(key, value, description)
+            except Exception as e:
+                logger.error(f"设置配置失败 {key}: {e}")
+                success = False
+        self._refresh_cache(force=True)
+        return success
     
     def get_all(self) -> Dict[str, Any]:
         """获取所有配置"""
-        self._refresh_cache()
-        
-        with self._lock:
-            return self._config_cache.copy()
+        return dict(self.snapshot.values)
     
     def get_soar_config(self) -> SystemConfigData:
         """获取SOAR相关配置"""
@@ -75,12 +191,13 @@ class ConfigManager:
     def update_soar_config(self, config_data: SystemConfigData) -> bool:
         """更新SOAR配置"""
         try:
-            success = True
-            success &= self.set("soar_api_url", config_data.soar_api_url, "SOAR服务器API地址")
-            success &= self.set("soar_api_token", config_data.soar_api_token, "SOAR API Token")
-            success &= self.set("soar_timeout", config_data.soar_timeout, "API超时时间(秒)")
-            success &= self.set("sync_interval", config_data.sync_interval, "同步周期(秒)")
-            success &= self.set("soar_labels", config_data.soar_labels, "剧本抓取标签列表")
+            success = self.set_many({
+                "soar_api_url": (config_data.soar_api_url, "SOAR服务器API地址"),
+                "soar_api_token": (config_data.soar_api_token, "SOAR API Token"),
+                "soar_timeout": (config_data.soar_timeout, "API超时时间(秒)"),
+                "sync_interval": (config_data.sync_interval, "同步周期(秒)"),
+                "soar_labels": (config_data.soar_labels, "剧本抓取标签列表"),
+            })
 
             if success:
                 logger.info("SOAR配置更新成功")
@@ -178,35 +295,34 @@ class ConfigManager:
             logger.error(f"检查配置完整性失败: {e}")
             return ["配置检查异常"]
 
-    def test_connection(self, config_data: Optional[SystemConfigData] = None) -> Dict[str, Any]:
-        """测试API连接（不修改全局缓存）"""
+    async def test_connection(self, config_data: Optional[SystemConfigData] = None,
+                              client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+        """测试API连接（不修改全局缓存）；传入 client 时复用其连接池"""
+        owned_client = None
         try:
-            import requests
-            
             config = config_data or self.get_soar_config()
-            
-            # 确定 SSL 验证设置
-            ssl_verify = self.get_ssl_verify()
-            
+            if client is None:
+                # 确定 SSL 验证设置
+                client = owned_client = httpx.AsyncClient(verify=self.get_ssl_verify())
+
             headers = {
                 "hg-token": config.soar_api_token,
                 "Content-Type": "application/json"
             }
-            
+
             test_url = f"{config.soar_api_url.rstrip('/')}/odp/core/v1/api/playbook/findAll"
             test_data = {"publishStatus": "ONLINE"}
 
             if config.soar_labels:
                 test_data["labelList"] = [{"name": label} for label in config.soar_labels[:1]]
-            
-            response = requests.post(
+
+            response = await client.post(
                 test_url,
                 json=test_data,
                 headers=headers,
-                timeout=config.soar_timeout,
-                verify=ssl_verify
+                timeout=float(config.soar_timeout)
             )
-            
+
             if response.status_code == 200:
                 data = response.json()
                 if data.get("code") == 200:
@@ -231,13 +347,16 @@ class ConfigManager:
                     "message": f"API返回错误: {response.status_code}",
                     "response_code": response.status_code
                 }
-        
-        except requests.exceptions.Timeout:
+
+        except httpx.TimeoutException:
             return {"success": False, "message": "连接超时", "error": "请检查网络连接和超时设置"}
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             return {"success": False, "message": "连接失败", "error": "请检查API地址是否正确"}
         except Exception as e:
             return {"success": False, "message": "测试连接时发生错误", "error": str(e)}
+        finally:
+            if owned_client is not None:
+                await owned_client.aclose()
     
     def init(self):
         """初始化配置管理器"""
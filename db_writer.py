@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+SOAR MCP 数据库单写线程
+SQLite 同一时刻只允许一个写事务，多线程并发写入只会在忙等待中排队甚至失败。
+所有变更统一交给一个写线程按优先级串行执行：交互操作（Token启停、剧本开关）优先于同步的批量写入，
+相邻的小写入（审计日志、执行记录、Token使用统计）合并到同一事务提交，调用方通过 Future 获取结果
+"""
+
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from logger_config import logger
+
+# 写入优先级（数值越小越优先）
+WRITE_PRIORITY_INTERACTIVE = 0
+WRITE_PRIORITY_NORMAL = 10
+WRITE_PRIORITY_BULK = 20
+
+# 停止信号排在所有写入之后，停止前已提交的写入都会完成
+_STOP_PRIORITY = float("inf")
+
+
+class WriteJob:
+    """一次写入：merge 为 True 时 func(session, ...) 只修改会话，由写线程统一提交"""
+
+    __slots__ = ("func", "args", "kwargs", "merge", "future")
+
+    def __init__(self, func: Callable[..., Any], args: tuple, kwargs: dict, merge: bool):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.merge = merge
+        self.future: Future = Future()
+
+
+class DatabaseWriter:
+    """数据库单写线程"""
+
+    def __init__(self, session_factory: Callable[[], Any], max_batch: int = 100):
+        self._session_factory = session_factory
+        self.max_batch = max_batch
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._deferred: Optional[WriteJob] = None
+        self._stats = {"jobs": 0, "transactions": 0, "merged": 0, "failed": 0}
+
+    def start(self) -> "DatabaseWriter":
+        """启动写线程"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+            logger.info("数据库写线程已启动")
+        return self
+
+    def stop(self, timeout: Optional[float] = 10):
+        """处理完已提交的写入后停止写线程"""
+        if self._thread is None:
+            return
+        self._queue.put((_STOP_PRIORITY, next(self._seq), None))
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        logger.info("数据库写线程已停止")
+
+    def in_writer_thread(self) -> bool:
+        """当前是否在写线程中（写线程内的写入直接执行，避免自我等待）"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, func: Callable[..., Any], *args, priority: int = WRITE_PRIORITY_NORMAL, **kwargs) -> Future:
+        """提交独立执行的写入（自行管理会话与提交），返回结果 Future"""
+        return self._put(WriteJob(func, args, kwargs, merge=False), priority)
+
+    def submit_in_session(self, func: Callable[..., Any], *args, priority: int = WRITE_PRIORITY_NORMAL,
+                          **kwargs) -> Future:
+        """提交可合并的写入：func(session, *args, **kwargs) 只修改会话，与相邻写入同一事务提交"""
+        return self._put(WriteJob(func, args, kwargs, merge=True), priority)
+
+    def _put(self, job: WriteJob, priority: int) -> Future:
+        self._queue.put((priority, next(self._seq), job))
+        return job.future
+
+    def stats(self) -> Dict[str, int]:
+        """写线程统计"""
+        return {**self._stats, "queued": self._queue.qsize()}
+
+    # ===== 写线程 =====
+
+    def _next_job(self, block: bool) -> Optional[WriteJob]:
+        if self._deferred is not None:
+            job, self._deferred = self._deferred, None
+            return job
+        _, _, job = self._queue.get(block=block)
+        return job
+
+    def _run(self):
+        while True:
+            job = self._next_job(block=True)
+            if job is None:
+                break
+            if not job.merge:
+                self._run_single(job)
+                continue
+
+            batch = [job]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self._next_job(block=False)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                if not nxt.merge:
+                    self._deferred = nxt
+                    break
+                batch.append(nxt)
+            self._run_batch(batch)
+            if stop:
+                break
+
+        # 停止后仍在队列中的写入（停止信号之后提交的）直接执行，不丢弃
+        while True:
+            try:
+                job = self._next_job(block=False)
+            except queue.Empty:
+                break
+            if job is None:
+                continue
+            if job.merge:
+                self._run_batch([job])
+            else:
+                self._run_single(job)
+
+    def _run_single(self, job: WriteJob):
+        if not job.future.set_running_or_notify_cancel():
+            return
+        self._stats["jobs"] += 1
+        try:
+            job.future.set_result(job.func(*job.args, **job.kwargs))
+        except BaseException as e:
+            self._stats["failed"] += 1
+            job.future.set_exception(e)
+
+    def _run_batch(self, batch: List[WriteJob]):
+        batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        self._stats["jobs"] += len(batch)
+        session = self._session_factory()
+        try:
+            results = []
+            for job in batch:
+                results.append(job.func(session, *job.args, **job.kwargs))
+                # 刷新到事务中，后续写入的查询可以看到前面写入的数据
+                session.flush()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(batch) == 1:
+                self._stats["failed"] += 1
+                batch[0].future.set_exception(e)
+                return
+            # 合并事务失败时逐个重试，只让出错的写入失败
+            logger.warning(f"合并写入失败，逐个重试 {len(batch)} 个写入: {e}")
+            for job in batch:
+                self._retry_alone(job)
+            return
+        finally:
+            session.close()
+
+        self._stats["transactions"] += 1
+        if len(batch) > 1:
+            self._stats["merged"] += len(batch)
+        for job, result in zip(batch, results):
+            job.future.set_result(result)
+
+    def _retry_alone(self, job: WriteJob):
+        session = self._session_factory()
+        try:
+            result = job.func(session, *job.args, **job.kwargs)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self._stats["failed"] += 1
+            job.future.set_exception(e)
+            return
+        finally:
+            session.close()
+        self._stats["transactions"] += 1
+        job.future.set_result(result)
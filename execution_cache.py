@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+SOAR 剧本执行缓存
+提供执行状态的短TTL缓存、终态执行结果的LRU缓存、并发请求合并（single-flight）
+以及剧本执行的幂等键存储
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from cache_backend import CacheBackend, CacheBackendError, CacheLockTimeout, cache_backend
+from logger_config import logger
+
+# 终态：一旦进入这些状态，执行状态不再变化，可永久缓存
+TERMINAL_STATUSES = frozenset({
+    "SUCCESS", "SUCCESS_RE", "FAIL", "FAILED", "FAIL_PARTLY", "STOP", "FINISH"
+})
+
+
+def is_terminal_status(status: Optional[str]) -> bool:
+    """判断执行状态是否为终态"""
+    return status in TERMINAL_STATUSES
+
+
+class SingleFlight:
+    """
+    并发请求合并器：相同 key 的并发调用只执行一次，其余调用等待同一结果。
+
+    实际执行放在独立 Task 中，某个等待者被取消不会影响其他等待者。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行或加入同 key 正在进行的调用"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 避免无人等待时出现 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def inflight_count(self) -> int:
+        """当前进行中的调用数"""
+        return len(self._inflight)
+
+
+class StatusCache:
+    """
+    执行状态缓存
+
+    - 非终态：短TTL缓存，吸收同一活动的突发重复查询
+    - 终态：永久缓存（LRU，受条目数上限约束）
+
+    配置了共享的缓存后端时，后端作为二级缓存：本地未命中先读取其他节点写入的状态，
+    从SOAR获取的状态同时写入后端（终态保留 shared_terminal_ttl 秒）
+    """
+
+    def __init__(self, ttl: float = 3.0, max_pending: int = 1000, max_terminal: int = 10000,
+                 clock: Callable[[], float] = time.monotonic, backend: Optional[CacheBackend] = None,
+                 shared_terminal_ttl: float = 86400.0):
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.max_terminal = max_terminal
+        self.backend = backend
+        self.shared_terminal_ttl = shared_terminal_ttl
+        self._clock = clock
+        self._pending: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._terminal: "OrderedDict[str, dict]" = OrderedDict()
+
+    def get(self, activity_id: str) -> Optional[dict]:
+        """获取缓存的状态数据，未命中或已过期返回 None"""
+        data = self._terminal.get(activity_id)
+        if data is not None:
+            self._terminal.move_to_end(activity_id)
+            return data
+
+        entry = self._pending.get(activity_id)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if self._clock() >= expires_at:
+            self._pending.pop(activity_id, None)
+            return None
+        return data
+
+    def put(self, activity_id: str, status: Optional[str], data: dict):
+        """写入状态数据，根据状态决定缓存策略"""
+        if is_terminal_status(status):
+            self._pending.pop(activity_id, None)
+            self._terminal[activity_id] = data
+            self._terminal.move_to_end(activity_id)
+            while len(self._terminal) > self.max_terminal:
+                self._terminal.popitem(last=False)
+        elif self.ttl > 0:
+            self._pending[activity_id] = (self._clock() + self.ttl, data)
+            self._pending.move_to_end(activity_id)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+
+    @property
+    def shared(self) -> bool:
+        """是否配置了多节点共享的二级缓存"""
+        return self.backend is not None and self.backend.shared
+
+    async def get_shared(self, activity_id: str) -> Optional[dict]:
+        """从共享后端读取状态数据，命中后写入本地缓存；未配置共享后端时返回 None"""
+        if not self.shared:
+            return None
+        entry = await self.backend.get(f"status:{activity_id}")
+        if entry is None:
+            return None
+        self.put(activity_id, entry.get("status"), entry["data"])
+        return entry["data"]
+
+    async def put_shared(self, activity_id: str, status: Optional[str], data: dict):
+        """将状态数据写入共享后端，供其他节点读取"""
+        if not self.shared:
+            return
+        ttl = self.shared_terminal_ttl if is_terminal_status(status) else self.ttl
+        if ttl > 0:
+            await self.backend.set(f"status:{activity_id}", {"status": status, "data": data}, ttl=ttl)
+
+    def invalidate(self, activity_id: str):
+        """移除单个活动的缓存"""
+        self._pending.pop(activity_id, None)
+        self._terminal.pop(activity_id, None)
+
+    def clear(self):
+        """清空缓存"""
+        self._pending.clear()
+        self._terminal.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计"""
+        return {"pending": len(self._pending), "terminal": len(self._terminal)}
+
+
+class ResultCache:
+    """
+    终态执行结果缓存（按总字节数约束的LRU）
+
+    终态执行结果不可变，缓存后重复读取无需再请求SOAR。
+    内存中保存序列化后的JSON字节；配置了 spill_dir 时，内存淘汰的条目
+    以 zlib 压缩形式落盘，磁盘占用同样按字节上限LRU淘汰。
+    所有方法线程安全，可通过 asyncio.to_thread 调用以避免阻塞事件循环。
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, spill_dir: Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024, compress_level: int = 6):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.compress_level = compress_level
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, Tuple[Path, int]]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            # 落盘索引仅存在于内存，清理上次进程遗留的文件以保证磁盘占用有界
+            for stale in self.spill_dir.glob("*.json.z"):
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+
+    def get(self, activity_id: str) -> Optional[Any]:
+        """获取缓存的执行结果，未命中返回 None"""
+        with self._lock:
+            raw = self._memory.get(activity_id)
+            if raw is not None:
+                self._memory.move_to_end(activity_id)
+            else:
+                raw = self._load_from_disk(activity_id)
+                if raw is None:
+                    return None
+                self._store_in_memory(activity_id, raw)
+        return json.loads(raw)
+
+    def put(self, activity_id: str, payload: Any):
+        """写入执行结果（调用方需保证执行已处于终态）"""
+        raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            self._discard_memory(activity_id)
+            self._store_in_memory(activity_id, raw)
+
+    def invalidate(self, activity_id: str):
+        """移除单个结果的缓存（内存与磁盘）"""
+        with self._lock:
+            self._discard_memory(activity_id)
+            self._discard_disk(activity_id)
+
+    def clear(self):
+        """清空缓存（内存与磁盘）"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for activity_id in list(self._disk):
+                self._discard_disk(activity_id)
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计"""
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    # ----- 内部方法（调用方需持有锁） -----
+
+    def _store_in_memory(self, activity_id: str, raw: bytes):
+        if len(raw) > self.max_bytes:
+            # 单条结果超过内存上限，直接落盘（未配置落盘则不缓存）
+            self._spill(activity_id, raw)
+            return
+        self._memory[activity_id] = raw
+        self._memory_bytes += len(raw)
+        while self._memory_bytes > self.max_bytes and self._memory:
+            evicted_id, evicted_raw = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted_raw)
+            self._spill(evicted_id, evicted_raw)
+
+    def _discard_memory(self, activity_id: str):
+        raw = self._memory.pop(activity_id, None)
+        if raw is not None:
+            self._memory_bytes -= len(raw)
+
+    def _spill_path(self, activity_id: str) -> Path:
+        digest = hashlib.sha1(activity_id.encode("utf-8")).hexdigest()
+        return self.spill_dir / f"{digest}.json.z"
+
+    def _spill(self, activity_id: str, raw: bytes):
+        if not self.spill_dir or activity_id in self._disk:
+            return
+        data = zlib.compress(raw, self.compress_level)
+        if len(data) > self.max_disk_bytes:
+            return
+        path = self._spill_path(activity_id)
+        try:
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"执行结果落盘失败 {activity_id}: {e}")
+            return
+        self._disk[activity_id] = (path, len(data))
+        self._disk_bytes += len(data)
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            self._discard_disk(next(iter(self._disk)))
+
+    def _load_from_disk(self, activity_id: str) -> Optional[bytes]:
+        entry = self._disk.get(activity_id)
+        if entry is None:
+            return None
+        path, _ = entry
+        try:
+            raw = zlib.decompress(path.read_bytes())
+        except (OSError, zlib.error) as e:
+            logger.warning(f"读取落盘执行结果失败 {activity_id}: {e}")
+            self._discard_disk(activity_id)
+            return None
+        self._disk.move_to_end(activity_id)
+        return raw
+
+    def _discard_disk(self, activity_id: str):
+        entry = self._disk.pop(activity_id, None)
+        if entry is None:
+            return
+        path, size = entry
+        self._disk_bytes -= size
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+class IdempotencyConflictError(ValueError):
+    """幂等键已用于参数不同的请求"""
+
+
+class IdempotencyInProgressError(RuntimeError):
+    """幂等键对应的首次调用仍在其他节点进行中"""
+
+
+class IdempotencyStore:
+    """
+    幂等键存储（TTL + 条目数上限）
+
+    同一幂等键在有效期内重复调用直接返回首次调用的结果；首次调用仍在进行时，
+    重复调用合并等待同一结果。调用失败不会记录，之后可以使用同一幂等键重试。
+    每个幂等键绑定请求指纹，指纹不同的重复调用视为冲突。
+
+    配置了共享的缓存后端时，首次调用在集群锁内执行并将结果写入后端，
+    其他节点上相同幂等键的调用等待锁释放后直接返回该结果；等待超时仍无结果时抛出
+    IdempotencyInProgressError，由调用方稍后重试，不会再次执行。只有后端不可用时才退化为本节点去重。
+    """
+
+    def __init__(self, ttl: float = 86400.0, max_entries: int = 10000,
+                 clock: Callable[[], float] = time.monotonic, backend: Optional[CacheBackend] = None,
+                 lock_ttl: float = 60.0, lock_timeout: Optional[float] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        self.lock_ttl = lock_ttl
+        self.lock_timeout = lock_ttl if lock_timeout is None else lock_timeout
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._pending: Dict[str, Tuple[str, asyncio.Task]] = {}
+
+    def get(self, key: str) -> Optional[Tuple[str, Any]]:
+        """获取幂等键记录的 (指纹, 结果)，未命中或已过期返回 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, fingerprint, value = entry
+        if self._clock() >= expires_at:
+            self._entries.pop(key, None)
+            return None
+        return fingerprint, value
+
+    def put(self, key: str, fingerprint: str, value: Any):
+        """记录幂等键对应的结果"""
+        self._entries[key] = (self._clock() + self.ttl, fingerprint, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def run(self, key: str, fingerprint: str,
+                  func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        按幂等键执行调用
+
+        Returns:
+            (结果, 是否为重复调用)
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self._check_fingerprint(key, cached[0], fingerprint)
+            return cached[1], True
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._check_fingerprint(key, pending[0], fingerprint)
+            value, _ = await asyncio.shield(pending[1])
+            return value, True
+
+        async def first_call():
+            try:
+                value, duplicate = await self._call(key, fingerprint, func)
+                self.put(key, fingerprint, value)
+                return value, duplicate
+            finally:
+                # 在任务完成前移除，之后的调用只会看到已记录的结果或重新执行
+                self._pending.pop(key, None)
+
+        task = asyncio.ensure_future(first_call())
+        self._pending[key] = (fingerprint, task)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(task)
+
+    async def _call(self, key: str, fingerprint: str,
+                    func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """执行本节点的首次调用；配置共享后端时先检查其他节点记录的结果"""
+        if self.backend is None or not self.backend.shared:
+            return await func(), False
+
+        name = f"idempotency:{key}"
+        called = False
+        try:
+            async with self.backend.lock(name, ttl=self.lock_ttl, timeout=self.lock_timeout):
+                stored = await self.backend.get(name)
+                if stored is not None:
+                    self._check_fingerprint(key, stored["fingerprint"], fingerprint)
+                    return stored["value"], True
+                called = True
+                value = await func()
+                await self.backend.set(name, {"fingerprint": fingerprint, "value": value}, ttl=self.ttl)
+                return value, False
+        except CacheLockTimeout:
+            # 其他节点持有锁超过等待时间：首次调用仍在进行，不能再次执行
+            stored = await self.backend.get(name)
+            if stored is None:
+                raise IdempotencyInProgressError(f"幂等键 {key} 对应的调用仍在进行中，请稍后重试")
+            self._check_fingerprint(key, stored["fingerprint"], fingerprint)
+            return stored["value"], True
+        except CacheBackendError as e:
+            if called:
+                raise
+            logger.warning(f"共享幂等键不可用，仅在本节点去重: {e}")
+            return await func(), False
+
+    @staticmethod
+    def _check_fingerprint(key: str, stored: str, fingerprint: str):
+        if stored != fingerprint:
+            raise IdempotencyConflictError(f"幂等键 {key} 已用于参数不同的请求")
+
+    def clear(self):
+        """清空全部记录（不影响进行中的调用）"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """存储统计"""
+        return {"entries": len(self._entries), "pending": len(self._pending)}
+
+
+def _create_result_cache() -> ResultCache:
+    """根据环境变量创建执行结果缓存"""
+    max_mb = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+    disk_max_mb = float(os.getenv("RESULT_CACHE_DISK_MAX_MB", "512"))
+    spill_dir = os.getenv("RESULT_CACHE_DIR") or None
+    return ResultCache(
+        max_bytes=int(max_mb * 1024 * 1024),
+        spill_dir=spill_dir,
+        max_disk_bytes=int(disk_max_mb * 1024 * 1024),
+    )
+
+
+# 全局执行状态缓存与请求合并器
+status_cache = StatusCache(backend=cache_backend)
+status_flight = SingleFlight()
+
+# 全局执行结果缓存与请求合并器
+result_cache = _create_result_cache()
+result_flight = SingleFlight()
+
+# 全局剧本执行幂等键存储
+idempotency_store = IdempotencyStore(ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+                                     backend=cache_backend)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+SOAR 剧本执行调度器
+SOAR 后端并发执行能力饱和时，对剧本启动请求按优先级排队，并在全局在途上限内依次派发
+
+- 在途执行：已启动且未进入终态的执行；进入终态或租约超时后释放名额
+- 优先级：数值越小越优先，同优先级按到达顺序
+- 排队的请求返回排队凭证（ticket），可查询排队位置、预计等待时间与最终的活动ID
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from execution_cache import is_terminal_status
+from logger_config import logger
+
+# 默认优先级
+DEFAULT_PRIORITY = 100
+
+# 凭证状态
+TICKET_QUEUED = "QUEUED"
+TICKET_LAUNCHING = "LAUNCHING"
+TICKET_LAUNCHED = "LAUNCHED"
+TICKET_FAILED = "FAILED"
+
+
+class ExecutionTicket:
+    """剧本启动请求的排队凭证"""
+
+    __slots__ = ("ticket_id", "priority", "seq", "factory", "context", "state",
+                 "activity_id", "error", "exception", "enqueued_at", "dispatched_at")
+
+    def __init__(self, priority: int, seq: int, factory: Callable[[], Awaitable[str]], now: float):
+        self.ticket_id = uuid.uuid4().hex
+        self.priority = priority
+        self.seq = seq
+        self.factory = factory
+        # 保留提交时的请求上下文（Token信息等），延迟派发时在同一上下文中启动
+        self.context = contextvars.copy_context()
+        self.state = TICKET_QUEUED
+        self.activity_id: Optional[str] = None
+        self.error: Optional[str] = None
+        self.exception: Optional[BaseException] = None
+        self.enqueued_at = now
+        self.dispatched_at: Optional[float] = None
+
+    def __lt__(self, other: "ExecutionTicket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class ExecutionDispatcher:
+    """
+    带全局在途上限的优先级执行调度器
+
+    所有方法在事件循环线程中调用，无需加锁。队列与在途计数保存在进程内，
+    多 worker 部署时每个 worker 各自限制，实际上限为 worker 数 × max_inflight。
+    """
+
+    def __init__(self, status_fetcher: Callable[[str], Awaitable[dict]],
+                 max_inflight: int = 0, lease_seconds: float = 3600.0,
+                 poll_interval: float = 5.0, initial_duration: float = 30.0,
+                 max_tickets: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.status_fetcher = status_fetcher
+        self._max_inflight = max_inflight  # 0 表示不启用调度
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_tickets = max_tickets
+        self._clock = clock
+        self._queue: List[ExecutionTicket] = []
+        self._inflight: Dict[str, float] = {}
+        self._launching = 0
+        self._tickets: "OrderedDict[str, ExecutionTicket]" = OrderedDict()
+        self._seq = itertools.count()
+        # 在途执行平均占用时长（指数移动平均），用于估算排队等待时间
+        self._avg_duration = initial_duration
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    @property
+    def max_inflight(self) -> int:
+        return self._max_inflight
+
+    @max_inflight.setter
+    def max_inflight(self, value: int):
+        """调整在途上限：上限提高或关闭调度（0）时立即派发可放行的排队请求"""
+        self._max_inflight = value
+        if self._queue:
+            self._pump()
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_inflight > 0
+
+    def _has_capacity(self) -> bool:
+        # 关闭调度后不再限制在途数，已排队的请求全部放行
+        return not self.enabled or len(self._inflight) + self._launching < self._max_inflight
+
+    async def submit(self, factory: Callable[[], Awaitable[str]],
+                     priority: int = DEFAULT_PRIORITY) -> ExecutionTicket:
+        """
+        提交启动请求：有空闲名额且无人排队时立即启动并等待结果，否则排队后立即返回凭证
+        """
+        ticket = ExecutionTicket(priority, next(self._seq), factory, self._clock())
+        self._remember(ticket)
+        if self._has_capacity() and not self._queue:
+            self._launching += 1
+            await self._launch(ticket)
+        else:
+            heapq.heappush(self._queue, ticket)
+            logger.info(f"剧本启动请求排队: ticket={ticket.ticket_id}, 优先级={priority}, "
+                        f"排队位置={self.position(ticket)}")
+        return ticket
+
+    async def _launch(self, ticket: ExecutionTicket):
+        # 调用方需在调用前占用 _launching 名额
+        ticket.state = TICKET_LAUNCHING
+        ticket.dispatched_at = self._clock()
+        try:
+            activity_id = await ticket.factory()
+        except Exception as e:
+            ticket.state = TICKET_FAILED
+            ticket.error = str(e)
+            ticket.exception = e
+            return
+        else:
+            ticket.state = TICKET_LAUNCHED
+            ticket.activity_id = activity_id
+            self._inflight.setdefault(activity_id, self._clock())
+            self._ensure_monitor()
+        finally:
+            ticket.factory = None
+            self._launching -= 1
+            self._pump()
+
+    def _pump(self):
+        """有空闲名额时按优先级派发排队的请求"""
+        while self._queue and self._has_capacity():
+            ticket = heapq.heappop(self._queue)
+            self._launching += 1
+            ticket.context.run(asyncio.ensure_future, self._launch(ticket))
+
+    def release(self, activity_id: str):
+        """释放执行占用的名额"""
+        started_at = self._inflight.pop(activity_id, None)
+        if started_at is None:
+            return
+        duration = max(0.0, self._clock() - started_at)
+        self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+        self._pump()
+
+    def observe_status(self, activity_id: str, status: Optional[str]):
+        """观察到执行状态变化时调用，进入终态即释放名额"""
+        if activity_id in self._inflight and is_terminal_status(status):
+            self.release(activity_id)
+
+    def _ensure_monitor(self):
+        if self._monitor_task is None or self._monitor_task.done():
+            self._monitor_task = asyncio.ensure_future(self._monitor())
+
+    async def _monitor(self):
+        """轮询在途执行状态，释放已进入终态或租约超时的名额"""
+        while self._inflight:
+            await asyncio.sleep(self.poll_interval)
+            now = self._clock()
+            for activity_id, started_at in list(self._inflight.items()):
+                if now - started_at >= self.lease_seconds:
+                    logger.warning(f"执行 {activity_id} 超过租约时间 {self.lease_seconds}s 未结束，释放调度名额")
+                    self.release(activity_id)
+                    continue
+                try:
+                    data = await self.status_fetcher(activity_id)
+                except Exception as e:
+                    logger.debug(f"调度器查询执行状态失败 {activity_id}: {e}")
+                    continue
+                self.observe_status(activity_id, data.get("executeStatus"))
+
+    def _remember(self, ticket: ExecutionTicket):
+        self._tickets[ticket.ticket_id] = ticket
+        while len(self._tickets) > self.max_tickets:
+            self._tickets.popitem(last=False)
+
+    def get_ticket(self, ticket_id: str) -> Optional[ExecutionTicket]:
+        return self._tickets.get(ticket_id)
+
+    def position(self, ticket: ExecutionTicket) -> int:
+        """排队位置（从1开始），不在队列中返回0"""
+        if ticket.state != TICKET_QUEUED:
+            return 0
+        return 1 + sum(1 for other in self._queue if other < ticket)
+
+    def estimated_wait(self, position: int) -> float:
+        """按在途执行的平均时长估算排队等待秒数"""
+        if position <= 0:
+            return 0.0
+        rounds = (position - 1) // max(1, self.max_inflight) + 1
+        return round(rounds * self._avg_duration, 1)
+
+    def describe(self, ticket: ExecutionTicket) -> Dict[str, Any]:
+        """凭证状态描述"""
+        info: Dict[str, Any] = {"ticketId": ticket.ticket_id, "state": ticket.state, "priority": ticket.priority}
+        if ticket.state == TICKET_QUEUED:
+            position = self.position(ticket)
+            info.update({"queuePosition": position, "estimatedWaitSeconds": self.estimated_wait(position)})
+        elif ticket.state == TICKET_LAUNCHED:
+            info["activity_id"] = ticket.activity_id
+        elif ticket.state == TICKET_FAILED:
+            info["error"] = ticket.error
+        return info
+
+    def stats(self) -> Dict[str, Any]:
+        """调度器统计"""
+        return {
+            "maxInflight": self.max_inflight,
+            "inflight": len(self._inflight),
+            "launching": self._launching,
+            "queued": len(self._queue),
+            "avgDurationSeconds": round(self._avg_duration, 1),
+        }
+
+
+def resolve_priority(category: Optional[str], token_info: Optional[Dict[str, Any]],
+                     category_priorities: Optional[Dict[str, Any]],
+                     token_priorities: Optional[Dict[str, Any]]) -> int:
+    """
+    计算启动请求的优先级：取剧本分类与Token对应优先级中最高（数值最小）的一个
+
+    token_priorities 的键可以是 Token ID 或 Token 名称。
+    """
+    candidates = []
+    if category and category_priorities and category in category_priorities:
+        candidates.append(category_priorities[category])
+    if token_info and token_priorities:
+        for key in (str(token_info.get("id")), token_info.get("name")):
+            if key in token_priorities:
+                candidates.append(token_priorities[key])
+    values = []
+    for value in candidates:
+        try:
+            values.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return min(values) if values else DEFAULT_PRIORITY
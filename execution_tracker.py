@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+SOAR 剧本执行跟踪器
+后台轮询执行状态并推送给订阅者，同一活动的多个订阅者共享一个轮询任务；
+状态未变化时逐步放慢轮询，状态变化后恢复初始间隔，进入终态后结束
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from execution_cache import is_terminal_status
+from logger_config import logger
+
+
+class ExecutionTracker:
+    """执行状态跟踪器，所有方法在事件循环线程中调用"""
+
+    def __init__(self, status_fetcher: Callable[[str], Awaitable[dict]],
+                 poll_interval: float = 2.0, max_poll_interval: float = 10.0, backoff: float = 1.5):
+        self.status_fetcher = status_fetcher
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pollers: Dict[str, asyncio.Task] = {}
+
+    def _subscribe(self, activity_id: str, poll_interval: Optional[float]) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(activity_id, set()).add(queue)
+        poller = self._pollers.get(activity_id)
+        if poller is None or poller.done():
+            self._pollers[activity_id] = asyncio.ensure_future(
+                self._poll(activity_id, poll_interval or self.poll_interval))
+        return queue
+
+    def _unsubscribe(self, activity_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(activity_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[activity_id]
+            poller = self._pollers.pop(activity_id, None)
+            if poller is not None and not poller.done():
+                poller.cancel()
+
+    def _publish(self, activity_id: str, event: Dict[str, Any]):
+        for queue in self._subscribers.get(activity_id, ()):
+            queue.put_nowait(event)
+
+    async def _poll(self, activity_id: str, poll_interval: float):
+        """轮询单个活动的状态并发布给所有订阅者"""
+        interval = poll_interval
+        last_status = None
+        while activity_id in self._subscribers:
+            try:
+                data = await self.status_fetcher(activity_id)
+            except Exception as e:
+                logger.debug(f"跟踪执行状态失败 {activity_id}: {e}")
+                data = None
+
+            if data is not None:
+                status = data.get("executeStatus", "UNKNOWN")
+                changed = status != last_status
+                last_status = status
+                self._publish(activity_id, {"status": status, "changed": changed, "data": data})
+                if is_terminal_status(status):
+                    break
+                interval = poll_interval if changed else min(interval * self.backoff, self.max_poll_interval)
+
+            await asyncio.sleep(interval)
+        self._pollers.pop(activity_id, None)
+
+    async def follow(self, activity_id: str, timeout: float,
+                     poll_interval: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        跟踪单个活动直到进入终态或超时，逐次产出状态事件
+
+        事件格式: {"status", "changed", "data", "elapsed"}，elapsed 为开始跟踪以来的秒数
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        queue = self._subscribe(activity_id, poll_interval)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    return
+                event = dict(event, elapsed=round(time.monotonic() - start, 1))
+                yield event
+                if is_terminal_status(event["status"]):
+                    return
+        finally:
+            self._unsubscribe(activity_id, queue)
+
+    async def wait(self, activity_ids: List[str], timeout: float, poll_interval: Optional[float] = None,
+                   on_update: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None) -> Dict[str, Optional[str]]:
+        """等待多个活动进入终态或超时，返回 {activity_id: 最后状态}"""
+        statuses: Dict[str, Optional[str]] = {activity_id: None for activity_id in activity_ids}
+
+        async def track(activity_id: str):
+            async for event in self.follow(activity_id, timeout, poll_interval):
+                statuses[activity_id] = event["status"]
+                if on_update is not None and event["changed"]:
+                    await on_update(activity_id, event)
+
+        await asyncio.gather(*[track(activity_id) for activity_id in statuses])
+        return statuses
+
+    def stats(self) -> Dict[str, int]:
+        """跟踪器统计"""
+        return {"tracked": len(self._pollers),
+                "subscribers": sum(len(s) for s in self._subscribers.values())}
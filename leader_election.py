@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+SOAR MCP 后台任务主节点选举
+多 worker 部署时各 worker 共享同一个 SQLite 数据库，通过数据库中的租约行选出唯一的主节点执行剧本同步等后台任务；
+主节点定期续约，进程退出时主动释放，异常退出时租约过期后由其他 worker 自动接管
+"""
+
+import os
+import secrets
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from logger_config import logger
+from models import DatabaseManager, db_manager
+
+# 主节点变化回调：(当前是否为主节点)
+LeadershipListener = Callable[[bool], None]
+
+
+class LeaderElector:
+    """基于数据库租约的主节点选举"""
+
+    def __init__(self, db: DatabaseManager, name: str = "background-jobs", ttl: float = 30.0,
+                 holder: Optional[str] = None, clock: Callable[[], float] = time.monotonic):
+        self._db = db
+        self.name = name
+        self.ttl = ttl
+        # 每个租约周期续约三次，单次续约失败不会丢失主节点身份
+        self.renew_interval = ttl / 3
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._clock = clock
+        self._leader_until = 0.0
+        # 最近一次通知订阅方的身份，本地有效期自然到期后由下一次续约补发通知
+        self._reported_leader = False
+        self._listeners: List[LeadershipListener] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def is_leader(self) -> bool:
+        """当前进程是否为主节点（本地有效期早于数据库中的租约过期时间）"""
+        return self._clock() < self._leader_until
+
+    def subscribe(self, listener: LeadershipListener) -> Callable[[], None]:
+        """订阅主节点身份变化，返回取消订阅函数"""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener) if listener in self._listeners else None
+
+    def try_acquire(self) -> bool:
+        """获取或续约租约，返回当前是否为主节点"""
+        started = self._clock()
+        acquired = self._db.acquire_lease(self.name, self.holder, self.ttl)
+        # 从发起续约的时刻起算并预留一个续约周期的余量，保证本地先于其他 worker 认定租约过期
+        self._leader_until = started + self.ttl - self.renew_interval if acquired else 0.0
+        if acquired != self._reported_leader:
+            self._notify(acquired)
+        return acquired
+
+    def _notify(self, is_leader: bool):
+        self._reported_leader = is_leader
+        if is_leader:
+            logger.info(f"当前 worker 成为后台任务主节点 ({self.holder})")
+        else:
+            logger.warning(f"当前 worker 不再是后台任务主节点 ({self.holder})")
+        for listener in list(self._listeners):
+            try:
+                listener(is_leader)
+            except Exception as e:
+                logger.error(f"主节点变化回调异常: {e}")
+
+    def start(self) -> bool:
+        """立即参与一次选举并启动续约线程，返回当前是否为主节点"""
+        is_leader = self.try_acquire()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="leader-election", daemon=True)
+            self._thread.start()
+        return is_leader
+
+    def _run(self):
+        while not self._stop_event.wait(self.renew_interval):
+            try:
+                self.try_acquire()
+            except Exception as e:
+                logger.error(f"主节点续约异常: {e}")
+
+    def stop(self):
+        """停止续约并释放租约"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.is_leader:
+            self._db.release_lease(self.name, self.holder)
+        self._leader_until = 0.0
+        if self._reported_leader:
+            self._notify(False)
+
+    def status(self) -> Dict[str, object]:
+        """选举状态"""
+        return {"name": self.name, "holder": self.holder, "leader": self.is_leader}
+
+
+# 全局后台任务选举器
+leader_elector = LeaderElector(db_manager, ttl=float(os.getenv("LEADER_LEASE_TTL", "30")))
@@ -10,6 +10,17 @@ from datetime import datetime
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
+from opentelemetry import trace
+
+
+class TraceContextFilter(logging.Filter):
+    """在日志末尾附加当前请求的链路ID（不在追踪链路中时为空）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span_context = trace.get_current_span().get_span_context()
+        record.trace = f" | trace_id={trace.format_trace_id(span_context.trace_id)}" if span_context.is_valid else ""
+        return True
+
 
 class SOARLogger:
     """SOAR日志管理器"""
@@ -17,7 +28,7 @@ class SOARLogger:
     def __init__(self, name: str = "SOAR_MCP", log_dir: str = "logs"):
         self.name = name
         self.log_dir = Path(log_dir)
-        self.log_dir.mkdir(exist_ok=True)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
         
         self.logger = logging.getLogger(name)
         self.logger.setLevel(logging.DEBUG)
@@ -28,7 +39,7 @@ class SOARLogger:
     def _setup_handlers(self):
         """设置日志处理器"""
         formatter = logging.Formatter(
-            '%(asctime)s | %(levelname)-8s | %(name)s | %(message)s',
+            '%(asctime)s | %(levelname)-8s | %(name)s | %(message)s%(trace)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         
@@ -50,8 +61,10 @@ class SOARLogger:
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(formatter)
         
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(file_handler)
+        trace_filter = TraceContextFilter()
+        for handler in (console_handler, file_handler):
+            handler.addFilter(trace_filter)
+            self.logger.addHandler(handler)
     
     def debug(self, message: str):
         self.logger.debug(message)
@@ -93,8 +106,8 @@ class SOARLogger:
         self.logger.info(f"🗄️  {message}")
 
 
-# 全局日志实例
-logger = SOARLogger()
+# 全局日志实例（日志目录可由环境变量 LOG_DIR 指定）
+logger = SOARLogger(log_dir=os.getenv("LOG_DIR", "logs"))
 
 
 def get_logger(name: str = None) -> SOARLogger:
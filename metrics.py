@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+SOAR MCP 运行指标
+进程内的计数器、直方图与仪表，按 Prometheus 文本格式（0.0.4）由 GET /metrics 输出。
+
+采集开销很小，可在生产环境常开：每次观测只做一次 bisect 与加锁累加；
+连接池等状态类指标只在抓取时读取
+"""
+
+import bisect
+import functools
+import inspect
+import re
+import threading
+import time
+import urllib.request
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+from opentelemetry.trace import SpanKind, StatusCode
+
+from tracing import start_span
+
+# 默认延迟分桶（秒），覆盖毫秒级数据库查询到数十秒的剧本同步
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """指标基类：名称、说明与标签名"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _check(self, labelvalues: Sequence[str]) -> LabelValues:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+        return tuple(str(v) for v in labelvalues)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """单调递增计数器"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        key = self._check(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, *labelvalues: str) -> float:
+        return self._values.get(self._check(labelvalues), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """累积分桶直方图"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：[各分桶计数..., +Inf 计数], 总和
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        key = self._check(labelvalues)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, *labelvalues: str) -> int:
+        entry = self._values.get(self._check(labelvalues))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class CallbackGauge(Metric):
+    """抓取时通过回调读取当前值的仪表，回调返回 [(标签值, 数值), ...]"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[Sequence[str], float]]]):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._callback():
+            yield f"{self.name}{_format_labels(self.labelnames, self._check(labels))} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str],
+              callback: Callable[[], Iterable[Tuple[Sequence[str], float]]]) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, labelnames, callback))
+
+    def render(self) -> str:
+        """按 Prometheus 文本格式输出全部指标；单个回调出错不影响其他指标"""
+        parts = []
+        for metric in list(self._metrics.values()):
+            try:
+                parts.append(metric.render())
+            except Exception as e:
+                parts.append(f"# {metric.name} 采集失败: {_escape(str(e))}")
+        return "\n".join(parts) + "\n"
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+# MCP 工具调用
+tool_duration = registry.histogram(
+    "soar_mcp_tool_duration_seconds", "MCP 工具调用耗时", ("tool",))
+tool_errors = registry.counter(
+    "soar_mcp_tool_errors_total", "MCP 工具调用失败次数（exception: 抛出异常，error: 返回错误结果）",
+    ("tool", "reason"))
+
+# 数据库
+db_query_duration = registry.histogram(
+    "soar_mcp_db_query_duration_seconds", "DatabaseManager 方法耗时（含等待写线程）", ("method",))
+db_errors = registry.counter(
+    "soar_mcp_db_errors_total", "DatabaseManager 方法异常次数", ("method",))
+
+# SOAR HTTP 请求
+soar_http_duration = registry.histogram(
+    "soar_mcp_soar_http_request_duration_seconds", "SOAR API 请求耗时（到收到响应头）",
+    ("client", "method", "endpoint", "status"))
+
+# 剧本与应用同步
+sync_duration = registry.histogram(
+    "soar_mcp_sync_duration_seconds", "同步任务耗时", ("kind", "result"),
+    buckets=(1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0))
+sync_items = registry.counter(
+    "soar_mcp_sync_items_total", "同步处理的条目数（synced: 已更新，ignored: 未变化，failed: 失败）",
+    ("kind", "outcome"))
+
+
+# ===== 数据库方法计时 =====
+
+def timed_methods(exclude: Iterable[str] = ()):
+    """类装饰器：为所有公开方法记录耗时与异常次数，方法名作为标签"""
+    excluded = set(exclude)
+
+    def decorator(cls):
+        for name, attr in list(vars(cls).items()):
+            if name.startswith("_") or name in excluded or not inspect.isfunction(attr):
+                continue
+            setattr(cls, name, _timed(name, attr))
+        return cls
+    return decorator
+
+
+def _timed(name: str, method: Callable) -> Callable:
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            db_errors.inc(name)
+            raise
+        finally:
+            db_query_duration.observe(time.perf_counter() - started, name)
+    return wrapper
+
+
+# ===== SOAR HTTP 请求计时 =====
+
+# 路径中的ID段（纯数字、UUID或长十六进制串）归并为 {id}，避免标签基数随活动ID增长
+_ID_SEGMENT = re.compile(r"^(?:\d+|[0-9a-fA-F-]{16,})$")
+
+
+def endpoint_label(path: str) -> str:
+    """将请求路径归一化为端点标签"""
+    return "/".join("{id}" if _ID_SEGMENT.match(segment) else segment for segment in path.split("/"))
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """记录请求耗时与在途请求数的 HTTP 传输层，连接池状态在抓取时读取
+
+    向 httpx.AsyncClient 传入 transport 后客户端不再读取代理环境变量，因此在创建时按
+    HTTP(S)_PROXY / ALL_PROXY / NO_PROXY 建立代理传输层，请求时按目标主机选择
+    """
+
+    def __init__(self, client: str, trust_env: bool = True, **transport_kwargs: Any):
+        self.client = client
+        self.inflight = 0
+        self._transport = httpx.AsyncHTTPTransport(**transport_kwargs)
+        self._env_proxies: Dict[str, str] = urllib.request.getproxies_environment() if trust_env else {}
+        self._proxy_transports: Dict[str, httpx.AsyncHTTPTransport] = {}
+        for scheme in ("http", "https"):
+            proxy = self._env_proxies.get(scheme) or self._env_proxies.get("all")
+            if proxy:
+                self._proxy_transports[scheme] = httpx.AsyncHTTPTransport(proxy=proxy, **transport_kwargs)
+        _transports[client] = self
+
+    def _transport_for(self, url: httpx.URL) -> httpx.AsyncBaseTransport:
+        transport = self._proxy_transports.get(url.scheme)
+        if transport is None or urllib.request.proxy_bypass_environment(url.host, self._env_proxies):
+            return self._transport
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = endpoint_label(request.url.path)
+        attributes = {"http.request.method": request.method, "server.address": request.url.host,
+                      "url.template": endpoint, "soar.client": self.client}
+        with start_span(f"{request.method} {endpoint}", SpanKind.CLIENT, attributes, child_only=True) as span:
+            started = time.perf_counter()
+            status = "error"
+            self.inflight += 1
+            try:
+                response = await self._transport_for(request.url).handle_async_request(request)
+                status = str(response.status_code)
+                span.set_attribute("http.response.status_code", response.status_code)
+                if response.status_code >= 400:
+                    span.set_status(StatusCode.ERROR)
+                return response
+            finally:
+                self.inflight -= 1
+                soar_http_duration.observe(time.perf_counter() - started, self.client,
+                                           request.method, endpoint, status)
+
+    async def aclose(self):
+        await self._transport.aclose()
+        for transport in self._proxy_transports.values():
+            await transport.aclose()
+
+    def pool_usage(self) -> Dict[str, int]:
+        """连接池中活跃与空闲的连接数（含代理传输层）"""
+        connections = []
+        for transport in (self._transport, *self._proxy_transports.values()):
+            pool = getattr(transport, "_pool", None)
+            connections.extend(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"active": len(connections) - idle, "idle": idle}
+
+
+# 每类客户端最近创建的传输层（客户端重建后旧传输层不再计入）
+_transports: Dict[str, InstrumentedTransport] = {}
+
+
+def _http_pool_samples():
+    for client, transport in sorted(_transports.items()):
+        for state, count in transport.pool_usage().items():
+            yield (client, state), count
+        yield (client, "inflight"), transport.inflight
+
+
+registry.gauge("soar_mcp_http_pool_connections",
+               "SOAR HTTP 客户端连接池状态（active/idle 连接数，inflight 在途请求数）",
+               ("client", "state"), _http_pool_samples)
+
+
+# ===== 同步统计 =====
+
+def record_sync(kind: str, elapsed: float, result: Optional[Dict[str, Any]]):
+    """记录一次同步的耗时与条目数，result 为同步服务 full_sync 的返回值"""
+    failed = not result or "error" in result
+    sync_duration.observe(elapsed, kind, "failed" if failed else "success")
+    counts = (result or {}).get("sync_result") or {}
+    # 同步服务统计的成功数包含未变化而忽略的条目
+    ignored = counts.get("ignored", 0)
+    for outcome, count in (("synced", counts.get("success", 0) - ignored), ("ignored", ignored),
+                           ("failed", counts.get("failed", 0))):
+        if count:
+            sync_items.inc(kind, outcome, amount=count)
+
+
+def timed_sync(kind: str):
+    """同步方法装饰器：记录 full_sync 的耗时与条目数"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = None
+            try:
+                result = await func(*args, **kwargs)
+                return result
+            finally:
+                record_sync(kind, time.perf_counter() - started, result)
+        return wrapper
+    return decorator
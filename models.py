@@ -4,16 +4,23 @@ SOAR MCP 数据模型
 使用SQLAlchemy + Pydantic实现
 """
 
+import functools
 import json
+import os
+import threading
+import time
 from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Optional, Dict, Any, Union
 
-from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, Boolean, create_engine
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, Boolean, Float, Index, create_engine, inspect, text
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pydantic import BaseModel, Field, ConfigDict
 from logger_config import logger
+from db_writer import DatabaseWriter, WRITE_PRIORITY_BULK, WRITE_PRIORITY_INTERACTIVE, WRITE_PRIORITY_NORMAL
+from metrics import timed_methods
+from tracing import traced_methods
 
 Base = declarative_base()
 
@@ -125,6 +132,8 @@ class UserTokenModel(Base):
     created_at = Column(DateTime, default=datetime.now)
     expires_at = Column(DateTime)
     last_used_at = Column(DateTime)
+    execute_rate_limit = Column(Integer)  # 每分钟剧本执行调用上限，为空使用系统配置，0表示不限
+    status_rate_limit = Column(Integer)  # 每分钟状态/结果查询调用上限，为空使用系统配置，0表示不限
 
     def __repr__(self):
         return f"<UserToken(id={self.id}, name='{self.name}', active={self.is_active})>"
@@ -150,6 +159,62 @@ class AuditLogModel(Base):
         return f"<AuditLog(id={self.id}, action='{self.action}', result='{self.result}')>"
 
 
+class ExecutionModel(Base):
+    """剧本执行记录数据库模型"""
+    __tablename__ = "executions"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    activity_id = Column(String(100), unique=True, nullable=False, index=True)
+    playbook_id = Column(BigInteger)
+    token_id = Column(Integer)
+    event_id = Column(BigInteger)
+    status = Column(String(50), index=True)
+    created_time = Column(DateTime, default=datetime.now, index=True)
+    updated_time = Column(DateTime, default=datetime.now)
+    finished_time = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_executions_playbook_created", "playbook_id", "created_time"),
+        Index("ix_executions_token_created", "token_id", "created_time"),
+    )
+
+    def __repr__(self):
+        return f"<Execution(activity_id='{self.activity_id}', status='{self.status}')>"
+
+
+class ConfigVersionModel(Base):
+    """系统配置版本号（单行），system_config 任何变化时由触发器递增"""
+    __tablename__ = "config_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class PlaybookVersionModel(Base):
+    """剧本数据版本号（单行），playbooks 任何变化时由触发器递增"""
+    __tablename__ = "playbook_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class TokenVersionModel(Base):
+    """Token数据版本号（单行），user_tokens 影响验证结果的变化由触发器递增"""
+    __tablename__ = "token_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class LeaderLeaseModel(Base):
+    """后台任务租约：多 worker 部署时只有持有未过期租约的 worker 执行同步等后台任务"""
+    __tablename__ = "leader_lease"
+
+    name = Column(String(64), primary_key=True)
+    holder = Column(String(128), nullable=True)
+    expires_at = Column(Float, nullable=False, default=0)  # Unix 时间戳
+
+
 # ===== Pydantic 模型 =====
 
 class PlaybookParam(BaseModel):
@@ -263,19 +328,150 @@ class SystemConfigData(BaseModel):
 
 # ===== 数据库管理器 =====
 
+def serialized_write(priority: int = WRITE_PRIORITY_NORMAL):
+    """变更方法装饰器：启用写线程后转交写线程按优先级串行执行，并等待结果"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            writer = self.writer
+            if writer is None or writer.in_writer_thread():
+                return method(self, *args, **kwargs)
+            return writer.submit(method, self, *args, priority=priority, **kwargs).result()
+        return wrapper
+    return decorator
+
+
+# 不计时、不追踪的生命周期方法
+_UNINSTRUMENTED_METHODS = ("get_session", "start_writer", "stop_writer")
+
+
+# 只在指定列被修改时递增数据版本号：每次验证都会更新 Token 的使用统计，不应使验证缓存失效
+_DATA_VERSION_UPDATE_COLUMNS = {
+    "user_tokens": ("token", "name", "is_active", "permissions", "expires_at",
+                    "execute_rate_limit", "status_rate_limit"),
+}
+
+
+@timed_methods(exclude=_UNINSTRUMENTED_METHODS)
+@traced_methods("db", exclude=_UNINSTRUMENTED_METHODS)
 class DatabaseManager:
     """数据库管理器"""
     
     def __init__(self, db_path: str = "soar_mcp.db"):
         self.db_path = db_path
-        self.engine = create_engine(f"sqlite:///{db_path}")
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        
+        # 引擎在首次使用时创建，导入模块不会创建数据库连接
+        self._engine = None
+        self._session_factory = None
+        self._engine_lock = threading.Lock()
+        # 单写线程，start_writer 后所有变更经由写线程执行
+        self.writer: Optional[DatabaseWriter] = None
+
+    @property
+    def engine(self):
+        """SQLAlchemy 引擎（首次访问时创建）"""
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    engine = create_engine(f"sqlite:///{self.db_path}")
+                    self._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+                    self._engine = engine
+        return self._engine
+
+    @property
+    def SessionLocal(self):
+        """会话工厂（与引擎一同创建）"""
+        self.engine
+        return self._session_factory
+
+    # 已有数据库需要补充的新增列：{表名: {列名: 列类型}}
+    _COLUMN_MIGRATIONS = {
+        "user_tokens": {
+            "execute_rate_limit": "INTEGER",
+            "status_rate_limit": "INTEGER",
+        },
+    }
+
+    # 表数据变化时递增对应的版本号：{数据表: 版本号表}
+    # 在数据库层维护，其他进程及直接写表的修改同样生效
+    _DATA_VERSION_TABLES = {
+        "system_config": "config_version",
+        "playbooks": "playbook_version",
+        "user_tokens": "token_version",
+    }
+    _DATA_VERSION_TRIGGERS = {
+        f"trg_{table}_{event.lower()}_version": (
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version "
+            f"AFTER {event}"
+            + (f" OF {', '.join(_DATA_VERSION_UPDATE_COLUMNS[table])}"
+               if event == "UPDATE" and table in _DATA_VERSION_UPDATE_COLUMNS else "")
+            + f" ON {table} BEGIN "
+            f"UPDATE {version_table} SET version = version + 1 WHERE id = 1; END"
+        )
+        for table, version_table in _DATA_VERSION_TABLES.items()
+        for event in ("INSERT", "UPDATE", "DELETE")
+    }
+
     def init_db(self):
         """初始化数据库表"""
         Base.metadata.create_all(bind=self.engine)
+        self._migrate_columns()
+        self._init_data_versions()
         logger.database_info(f"数据库初始化完成: {self.db_path}")
+
+    def _migrate_columns(self):
+        """为旧版本数据库补充新增的可空列（create_all 不会修改已存在的表）"""
+        inspector = inspect(self.engine)
+        with self.engine.begin() as conn:
+            for table, columns in self._COLUMN_MIGRATIONS.items():
+                existing = {c["name"] for c in inspector.get_columns(table)}
+                for column, column_type in columns.items():
+                    if column not in existing:
+                        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+                        logger.database_info(f"数据库迁移: {table} 新增列 {column}")
+
+    def _init_data_versions(self):
+        """创建数据版本号行与维护它们的触发器"""
+        with self.engine.begin() as conn:
+            for version_table in self._DATA_VERSION_TABLES.values():
+                conn.execute(text(f"INSERT OR IGNORE INTO {version_table} (id, version) VALUES (1, 0)"))
+            for ddl in self._DATA_VERSION_TRIGGERS.values():
+                conn.execute(text(ddl))
+
+    def enable_wal(self):
+        """切换为 WAL 日志模式（持久化到数据库文件），多进程读取不再被写事务阻塞"""
+        with self.engine.connect() as conn:
+            mode = conn.exec_driver_sql("PRAGMA journal_mode=WAL").scalar()
+        logger.database_info(f"数据库日志模式: {mode}")
     
+    def start_writer(self) -> DatabaseWriter:
+        """启动单写线程"""
+        if self.writer is None:
+            self.writer = DatabaseWriter(self.SessionLocal).start()
+        return self.writer
+
+    def stop_writer(self):
+        """停止单写线程，之后的写入恢复在调用线程中直接执行"""
+        writer, self.writer = self.writer, None
+        if writer is not None:
+            writer.stop()
+
+    def _merged_write(self, func, *args, priority: int = WRITE_PRIORITY_NORMAL, **kwargs):
+        """
+        执行可与相邻写入合并提交的小写入：func(session, ...) 只修改会话、不提交。
+        启用写线程时与队列中相邻的小写入同一事务提交，否则单独提交；失败时抛出异常
+        """
+        writer = self.writer
+        if writer is not None and not writer.in_writer_thread():
+            return writer.submit_in_session(func, *args, priority=priority, **kwargs).result()
+        with self.get_session() as session:
+            try:
+                result = func(session, *args, **kwargs)
+                session.commit()
+                return result
+            except Exception:
+                session.rollback()
+                raise
+
     @contextmanager
     def get_session(self):
         """获取数据库会话（上下文管理器，自动关闭）"""
@@ -322,6 +518,7 @@ class DatabaseManager:
 
     # ===== 剧本操作 =====
     
+    @serialized_write(WRITE_PRIORITY_BULK)
     def save_playbook(self, playbook_data: PlaybookData, force_update: bool = False) -> Union[bool, str]:
         """保存剧本数据"""
         with self.get_session() as session:
@@ -403,6 +600,12 @@ class DatabaseManager:
                 logger.error(f"获取剧本列表失败: {e}")
                 return []
     
+    def get_all_playbooks_with_status(self) -> List[tuple]:
+        """获取全部剧本及其启用状态（按ID排序），用于构建内存剧本目录"""
+        with self.get_session() as session:
+            playbooks = session.query(PlaybookModel).order_by(PlaybookModel.id).all()
+            return [(self._playbook_to_data(p), bool(p.enabled)) for p in playbooks]
+
     def get_sync_stats(self) -> Dict[str, Any]:
         """获取同步统计信息"""
         with self.get_session() as session:
@@ -419,6 +622,7 @@ class DatabaseManager:
                 logger.error(f"获取同步统计失败: {e}")
                 return {"total_playbooks": 0, "latest_sync_time": None}
     
+    @serialized_write(WRITE_PRIORITY_BULK)
     def save_app(self, app_data: AppData, force_update: bool = False) -> Union[bool, str]:
         """保存应用数据"""
         with self.get_session() as session:
@@ -484,6 +688,7 @@ class DatabaseManager:
                 logger.sync_error(f"保存应用失败 {app_data.id}: {e}")
                 return False
     
+    @serialized_write(WRITE_PRIORITY_BULK)
     def delete_actions_by_app_id(self, app_id: int) -> int:
         """删除指定应用的所有动作"""
         with self.get_session() as session:
@@ -496,6 +701,7 @@ class DatabaseManager:
                 logger.sync_error(f"删除应用动作失败 {app_id}: {e}")
                 return 0
     
+    @serialized_write(WRITE_PRIORITY_BULK)
     def batch_save_actions(self, actions_data: List[ActionData]) -> int:
         """批量保存动作数据"""
         with self.get_session() as session:
@@ -611,6 +817,7 @@ class DatabaseManager:
             logger.error(f"获取最后同步时间失败: {e}")
             return None
 
+    @serialized_write(WRITE_PRIORITY_BULK)
     def update_last_sync_time(self) -> bool:
         """更新最后同步时间"""
         try:
@@ -672,6 +879,7 @@ class DatabaseManager:
                 logger.error(f"获取剧本详情失败 {playbook_id}: {e}")
                 return None
 
+    @serialized_write(WRITE_PRIORITY_INTERACTIVE)
     def update_playbook_status(self, playbook_id: int, enabled: bool) -> bool:
         """更新剧本启用状态"""
         with self.get_session() as session:
@@ -706,6 +914,7 @@ class DatabaseManager:
                 logger.error(f"获取系统配置失败 {key}: {e}")
                 return default_value
     
+    @serialized_write(WRITE_PRIORITY_INTERACTIVE)
     def set_system_config(self, key: str, value: Any, description: str = None) -> bool:
         """设置系统配置值"""
         with self.get_session() as session:
@@ -742,6 +951,67 @@ class DatabaseManager:
                 session.rollback()
                 return False
     
+    def get_config_version(self) -> Optional[int]:
+        """获取系统配置版本号（单行主键查询），数据库未初始化时返回 None"""
+        return self._get_data_version("config_version")
+
+    def get_playbook_version(self) -> Optional[int]:
+        """获取剧本数据版本号（单行主键查询），数据库未初始化时返回 None"""
+        return self._get_data_version("playbook_version")
+
+    def get_token_version(self) -> Optional[int]:
+        """获取Token数据版本号（单行主键查询），数据库未初始化时返回 None"""
+        return self._get_data_version("token_version")
+
+    def _get_data_version(self, version_table: str) -> Optional[int]:
+        try:
+            with self.engine.connect() as conn:
+                return conn.execute(text(f"SELECT version FROM {version_table} WHERE id = 1")).scalar()
+        except Exception as e:
+            logger.debug(f"读取数据版本号失败({version_table}): {e}")
+            return None
+
+    # ===== 后台任务租约 =====
+
+    @serialized_write(WRITE_PRIORITY_INTERACTIVE)
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """获取或续约租约：租约空闲、已过期或本来就由 holder 持有时成功，有效期从现在起 ttl 秒"""
+        now = time.time()
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text("INSERT OR IGNORE INTO leader_lease (name, holder, expires_at) "
+                                  "VALUES (:name, NULL, 0)"), {"name": name})
+                result = conn.execute(
+                    text("UPDATE leader_lease SET holder = :holder, expires_at = :expires_at "
+                         "WHERE name = :name AND (holder = :holder OR holder IS NULL OR expires_at < :now)"),
+                    {"name": name, "holder": holder, "expires_at": now + ttl, "now": now})
+                return result.rowcount == 1
+        except Exception as e:
+            logger.error(f"获取租约失败: {e}")
+            return False
+
+    @serialized_write(WRITE_PRIORITY_INTERACTIVE)
+    def release_lease(self, name: str, holder: str) -> bool:
+        """释放 holder 持有的租约，其他 worker 无需等待过期即可接管"""
+        try:
+            with self.engine.begin() as conn:
+                result = conn.execute(
+                    text("UPDATE leader_lease SET holder = NULL, expires_at = 0 "
+                         "WHERE name = :name AND holder = :holder"),
+                    {"name": name, "holder": holder})
+                return result.rowcount == 1
+        except Exception as e:
+            logger.error(f"释放租约失败: {e}")
+            return False
+
+    def get_lease(self, name: str) -> Optional[Dict[str, Any]]:
+        """获取租约当前持有者与过期时间"""
+        with self.get_session() as session:
+            lease = session.get(LeaderLeaseModel, name)
+            if lease is None:
+                return None
+            return {"name": lease.name, "holder": lease.holder, "expires_at": lease.expires_at}
+
     def get_all_system_configs(self) -> Dict[str, Any]:
         """获取所有系统配置"""
         with self.get_session() as session:
@@ -760,6 +1030,7 @@ class DatabaseManager:
 
     # ===== 认证操作 =====
 
+    @serialized_write(WRITE_PRIORITY_INTERACTIVE)
     def create_admin_password(self, password_hash: str, description: str = None) -> bool:
         """创建管理员密码"""
         with self.get_session() as session:
@@ -806,7 +1077,6 @@ class DatabaseManager:
             existing_configs = self.get_all_system_configs()
             if not existing_configs:
                 logger.info("初始化默认系统配置...")
-                import os
                 from dotenv import load_dotenv
                 env_path = ".env"
                 if os.path.exists(env_path):
@@ -831,6 +1101,7 @@ class DatabaseManager:
 
     # ===== Token 操作 =====
 
+    @serialized_write(WRITE_PRIORITY_INTERACTIVE)
     def create_user_token(self, name: str, expires_in_days: int = None) -> Optional[str]:
         """创建用户Token"""
         with self.get_session() as session:
@@ -866,37 +1137,42 @@ class DatabaseManager:
                     "usage_count": t.usage_count or 0,
                     "created_at": t.created_at.isoformat() if t.created_at else None,
                     "expires_at": t.expires_at.isoformat() if t.expires_at else None,
-                    "last_used_at": t.last_used_at.isoformat() if t.last_used_at else None
+                    "last_used_at": t.last_used_at.isoformat() if t.last_used_at else None,
+                    "execute_rate_limit": t.execute_rate_limit,
+                    "status_rate_limit": t.status_rate_limit
                 } for t in tokens]
             except Exception as e:
                 logger.error(f"获取用户Token列表失败: {e}")
                 return []
 
     def verify_token(self, token: str) -> bool:
-        """验证Token是否有效"""
-        with self.get_session() as session:
-            try:
-                token_obj = session.query(UserTokenModel).filter(
-                    UserTokenModel.token == token,
-                    UserTokenModel.is_active == True
-                ).first()
+        """验证Token是否有效（同时更新使用统计）"""
+        try:
+            return self._merged_write(self._verify_and_touch_token, token)
+        except Exception as e:
+            logger.error(f"验证Token失败: {e}")
+            return False
 
-                if not token_obj:
-                    return False
-                if token_obj.expires_at and datetime.now() > token_obj.expires_at:
-                    return False
+    @staticmethod
+    def _verify_and_touch_token(session, token: str) -> bool:
+        token_obj = session.query(UserTokenModel).filter(
+            UserTokenModel.token == token,
+            UserTokenModel.is_active == True
+        ).first()
 
-                token_obj.last_used_at = datetime.now()
-                if token_obj.usage_count is None:
-                    token_obj.usage_count = 1
-                else:
-                    token_obj.usage_count += 1
-                session.commit()
-                return True
-            except Exception as e:
-                logger.error(f"验证Token失败: {e}")
-                return False
+        if not token_obj:
+            return False
+        if token_obj.expires_at and datetime.now() > token_obj.expires_at:
+            return False
 
+        token_obj.last_used_at = datetime.now()
+        if token_obj.usage_count is None:
+            token_obj.usage_count = 1
+        else:
+            token_obj.usage_count += 1
+        return True
+
+    @serialized_write(WRITE_PRIORITY_INTERACTIVE)
     def delete_user_token(self, token_id: int) -> bool:
         """删除用户Token"""
         with self.get_session() as session:
@@ -913,6 +1189,7 @@ class DatabaseManager:
                 logger.error(f"删除用户Token失败: {e}")
                 return False
 
+    @serialized_write(WRITE_PRIORITY_INTERACTIVE)
     def update_token_status(self, token_id: int, is_active: bool) -> bool:
         """更新Token启用状态"""
         with self.get_session() as session:
@@ -929,35 +1206,132 @@ class DatabaseManager:
                 logger.error(f"更新Token状态失败: {e}")
                 return False
 
-    # ===== 审计日志 =====
-
-    def log_audit_event(self, action: str, resource: str = None, parameters: dict = None,
-                       result: str = "success", error_message: str = None,
-                       token_info: dict = None, ip_address: str = None, user_agent: str = None) -> bool:
-        """记录审计日志"""
+    @serialized_write(WRITE_PRIORITY_INTERACTIVE)
+    def update_token_rate_limits(self, token_id: int, execute_rate_limit: Optional[int],
+                                 status_rate_limit: Optional[int]) -> bool:
+        """更新Token的速率限制（每分钟调用数，None 表示使用系统配置）"""
         with self.get_session() as session:
             try:
-                params_json = json.dumps(parameters, ensure_ascii=False) if parameters else None
-                audit_log = AuditLogModel(
-                    action=action,
-                    resource=resource,
-                    parameters=params_json,
-                    result=result,
-                    error_message=error_message,
-                    token_id=token_info.get('id') if token_info else None,
-                    token_name=token_info.get('name') if token_info else None,
-                    ip_address=ip_address,
-                    user_agent=user_agent
-                )
-                session.add(audit_log)
+                token = session.query(UserTokenModel).filter_by(id=token_id).first()
+                if not token:
+                    return False
+                token.execute_rate_limit = execute_rate_limit
+                token.status_rate_limit = status_rate_limit
                 session.commit()
-                logger.debug(f"审计日志: {action} -> {result}")
+                logger.info(f"Token速率限制更新: {token.name} -> 执行 {execute_rate_limit}, 查询 {status_rate_limit}")
                 return True
             except Exception as e:
                 session.rollback()
-                logger.error(f"记录审计日志失败: {e}")
+                logger.error(f"更新Token速率限制失败: {e}")
                 return False
 
+    # ===== 执行记录 =====
+
+    def record_execution(self, activity_id: str, playbook_id: int, token_id: int = None,
+                         event_id: int = 0, status: str = "NEW") -> bool:
+        """记录新启动的剧本执行"""
+        try:
+            return self._merged_write(self._add_execution, activity_id, playbook_id, token_id, event_id, status)
+        except Exception as e:
+            logger.error(f"记录剧本执行失败 {activity_id}: {e}")
+            return False
+
+    @staticmethod
+    def _add_execution(session, activity_id: str, playbook_id: int, token_id: Optional[int],
+                       event_id: int, status: str) -> bool:
+        if session.query(ExecutionModel).filter_by(activity_id=activity_id).first():
+            return True
+        now = datetime.now()
+        session.add(ExecutionModel(
+            activity_id=activity_id,
+            playbook_id=playbook_id,
+            token_id=token_id,
+            event_id=event_id,
+            status=status,
+            created_time=now,
+            updated_time=now
+        ))
+        return True
+
+    def update_execution_status(self, activity_id: str, status: str, finished: bool = False) -> bool:
+        """更新剧本执行状态"""
+        try:
+            return self._merged_write(self._set_execution_status, activity_id, status, finished)
+        except Exception as e:
+            logger.error(f"更新剧本执行状态失败 {activity_id}: {e}")
+            return False
+
+    @staticmethod
+    def _set_execution_status(session, activity_id: str, status: str, finished: bool) -> bool:
+        execution = session.query(ExecutionModel).filter_by(activity_id=activity_id).first()
+        if not execution:
+            return False
+        if execution.status == status:
+            return True
+        now = datetime.now()
+        execution.status = status
+        execution.updated_time = now
+        if finished and not execution.finished_time:
+            execution.finished_time = now
+        return True
+
+    def get_executions(self, limit: int = 50, offset: int = 0, playbook_id: int = None,
+                       token_id: int = None) -> Dict[str, Any]:
+        """分页获取剧本执行记录（按启动时间倒序）"""
+        with self.get_session() as session:
+            try:
+                query = session.query(ExecutionModel)
+                if playbook_id is not None:
+                    query = query.filter(ExecutionModel.playbook_id == playbook_id)
+                if token_id is not None:
+                    query = query.filter(ExecutionModel.token_id == token_id)
+                total = query.count()
+                executions = query.order_by(
+                    ExecutionModel.created_time.desc(), ExecutionModel.id.desc()
+                ).offset(offset).limit(limit).all()
+                return {
+                    "total": total,
+                    "items": [{
+                        "activity_id": e.activity_id,
+                        "playbook_id": str(e.playbook_id) if e.playbook_id is not None else None,
+                        "token_id": e.token_id,
+                        "event_id": e.event_id,
+                        "status": e.status,
+                        "created_time": e.created_time.isoformat() if e.created_time else None,
+                        "updated_time": e.updated_time.isoformat() if e.updated_time else None,
+                        "finished_time": e.finished_time.isoformat() if e.finished_time else None
+                    } for e in executions]
+                }
+            except Exception as e:
+                logger.error(f"获取剧本执行记录失败: {e}")
+                return {"total": 0, "items": []}
+
+    # ===== 审计日志 =====
+
+    def log_audit_event(self, action: str, resource: str = None, parameters: dict = None,
+                       result: str = "success", error_message: str = None,
+                       token_info: dict = None, ip_address: str = None, user_agent: str = None) -> bool:
+        """记录审计日志"""
+        try:
+            params_json = json.dumps(parameters, ensure_ascii=False) if parameters else None
+            audit_log = AuditLogModel(
+                action=action,
+                resource=resource,
+                parameters=params_json,
+                result=result,
+                error_message=error_message,
+                token_id=token_info.get('id') if token_info else None,
+                token_name=token_info.get('name') if token_info else None,
+                ip_address=ip_address,
+                user_agent=user_agent
+            )
+            self._merged_write(lambda session: session.add(audit_log))
+            logger.debug(f"审计日志: {action} -> {result}")
+            return True
+        except Exception as e:
+            logger.error(f"记录审计日志失败: {e}")
+            return False
+
     def get_audit_logs(self, limit: int = 100, token_id: int = None, action: str = None) -> List[Dict]:
         """获取审计日志列表"""
         with self.get_session() as session:
@@ -1015,12 +1389,14 @@ class DatabaseManager:
                     "usage_count": token_obj.usage_count or 0,
                     "created_at": token_obj.created_at.isoformat() if token_obj.created_at else None,
                     "expires_at": token_obj.expires_at.isoformat() if token_obj.expires_at else None,
-                    "last_used_at": token_obj.last_used_at.isoformat() if token_obj.last_used_at else None
+                    "last_used_at": token_obj.last_used_at.isoformat() if token_obj.last_used_at else None,
+                    "execute_rate_limit": token_obj.execute_rate_limit,
+                    "status_rate_limit": token_obj.status_rate_limit
                 }
             except Exception as e:
                 logger.error(f"获取Token信息失败: {e}")
                 return None
 
 
-# 全局数据库管理器实例
-db_manager = DatabaseManager()
+# 全局数据库管理器实例（数据库路径可由环境变量 DB_PATH 指定）
+db_manager = DatabaseManager(os.getenv("DB_PATH", "soar_mcp.db"))
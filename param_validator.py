@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+SOAR 剧本执行参数本地校验
+根据已同步的剧本参数定义（cefColumn、valueType、required）在调用SOAR API前校验执行参数，
+校验器按剧本预编译并缓存，剧本重新同步后自动重建
+"""
+
+import re
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from models import PlaybookData
+
+_INTEGER_RE = re.compile(r"^[+-]?\d+$")
+_NUMBER_RE = re.compile(r"^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$")
+_BOOLEAN_STRINGS = frozenset({"true", "false"})
+
+
+class ParamValidationError(ValueError):
+    """执行参数校验失败"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("参数校验失败: " + "; ".join(errors))
+
+
+def _is_scalar(value: Any) -> bool:
+    # 参数以字符串形式提交给SOAR，嵌套对象或数组无法正确传递
+    return isinstance(value, (str, int, float, bool))
+
+
+def _check_string(value: Any) -> bool:
+    return _is_scalar(value)
+
+
+def _check_integer(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return True
+    if isinstance(value, float):
+        return value.is_integer()
+    return isinstance(value, str) and bool(_INTEGER_RE.match(value.strip()))
+
+
+def _check_number(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    return isinstance(value, str) and bool(_NUMBER_RE.match(value.strip()))
+
+
+def _check_boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return True
+    return isinstance(value, str) and value.strip().lower() in _BOOLEAN_STRINGS
+
+
+# valueType（不区分大小写）到校验函数的映射，未知类型仅要求为标量
+_TYPE_CHECKERS: Dict[str, Tuple[str, Callable[[Any], bool]]] = {
+    "string": ("字符串", _check_string),
+    "integer": ("整数", _check_integer),
+    "int": ("整数", _check_integer),
+    "long": ("整数", _check_integer),
+    "float": ("数字", _check_number),
+    "double": ("数字", _check_number),
+    "number": ("数字", _check_number),
+    "decimal": ("数字", _check_number),
+    "boolean": ("布尔值", _check_boolean),
+    "bool": ("布尔值", _check_boolean),
+}
+_DEFAULT_CHECKER = ("标量值", _is_scalar)
+
+
+def _is_blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class PlaybookParamValidator:
+    """单个剧本的预编译参数校验器"""
+
+    def __init__(self, playbook: PlaybookData):
+        self.playbook_id = playbook.id
+        self.required = tuple(p.cef_column for p in playbook.playbook_params if p.required)
+        self.checkers: Dict[str, Tuple[str, Callable[[Any], bool]]] = {
+            p.cef_column: _TYPE_CHECKERS.get((p.value_type or "").strip().lower(), _DEFAULT_CHECKER)
+            for p in playbook.playbook_params if p.cef_column
+        }
+
+    def validate(self, parameters: Optional[Dict[str, Any]]) -> List[str]:
+        """校验执行参数，返回错误列表（为空表示通过）"""
+        parameters = parameters or {}
+        if not isinstance(parameters, dict):
+            return ["parameters 必须是对象，格式 {\"参数名\": \"参数值\"}"]
+
+        errors = [f"缺少必填参数: {name}" for name in self.required
+                  if _is_blank(parameters.get(name))]
+
+        for name, value in parameters.items():
+            checker = self.checkers.get(name)
+            if checker is None:
+                # 剧本未同步到参数定义时无法判断未知参数，交由SOAR处理
+                if self.checkers:
+                    errors.append(f"未知参数: {name}，可用参数: {', '.join(self.checkers)}")
+                continue
+            if value is None:
+                continue
+            type_name, check = checker
+            if not check(value):
+                errors.append(f"参数 {name} 类型错误，应为{type_name}，实际值: {value!r}")
+
+        return errors
+
+
+class ParamValidatorRegistry:
+    """按剧本缓存的参数校验器，剧本同步时间变化后自动重建"""
+
+    def __init__(self):
+        self._validators: Dict[int, Tuple[Optional[datetime], PlaybookParamValidator]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, playbook: PlaybookData) -> PlaybookParamValidator:
+        """获取剧本的校验器，缓存不存在或剧本已重新同步时重建"""
+        cached = self._validators.get(playbook.id)
+        if cached is not None and cached[0] == playbook.sync_time:
+            return cached[1]
+        validator = PlaybookParamValidator(playbook)
+        with self._lock:
+            self._validators[playbook.id] = (playbook.sync_time, validator)
+        return validator
+
+    def validate(self, playbook: PlaybookData, parameters: Optional[Dict[str, Any]]):
+        """校验执行参数，不通过时抛出 ParamValidationError"""
+        errors = self.get(playbook).validate(parameters)
+        if errors:
+            raise ParamValidationError(errors)
+
+    def clear(self):
+        """清空全部校验器（剧本同步后调用）"""
+        with self._lock:
+            self._validators.clear()
+
+    def __len__(self) -> int:
+        return len(self._validators)
+
+
+# 全局校验器缓存
+param_validators = ParamValidatorRegistry()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+SOAR 剧本内存目录
+将数据库中的剧本构建为带版本号的不可变快照，读取类工具直接从快照读取，无需访问数据库；
+剧本同步或启用/禁用后整体重建并原子替换，读取方始终看到完整一致的某个版本；
+多 worker 部署时各 worker 轮询数据库中的剧本版本号，其他进程修改剧本后自动重建
+"""
+
+import itertools
+import threading
+from datetime import datetime
+from types import MappingProxyType
+from typing import Callable, Hashable, Iterable, List, Mapping, Optional, Tuple
+
+from models import DatabaseManager, PlaybookData, db_manager
+from logger_config import logger
+
+_versions = itertools.count(1)
+
+
+class PlaybookCatalog:
+    """
+    剧本目录快照（构建后不再修改）
+
+    - by_id: 全部剧本（含已禁用，按ID查询参数与执行时使用）
+    - enabled: 已启用剧本，按ID排序
+    - by_category: 已启用剧本按分类分组
+    """
+
+    __slots__ = ("version", "built_at", "data_version", "by_id", "enabled", "by_category", "_responses")
+
+    def __init__(self, entries: Iterable[Tuple[PlaybookData, bool]], version: Optional[int] = None,
+                 data_version: Optional[int] = None):
+        by_id = {}
+        enabled: List[PlaybookData] = []
+        by_category = {}
+        for playbook, is_enabled in sorted(entries, key=lambda e: e[0].id):
+            by_id[playbook.id] = playbook
+            if is_enabled:
+                enabled.append(playbook)
+                by_category.setdefault(playbook.playbook_category, []).append(playbook)
+
+        self.version = version if version is not None else next(_versions)
+        self.built_at = datetime.now()
+        # 构建时数据库中的剧本版本号，用于检测其他进程的修改
+        self.data_version = data_version
+        self.by_id: Mapping[int, PlaybookData] = MappingProxyType(by_id)
+        self.enabled: Tuple[PlaybookData, ...] = tuple(enabled)
+        self.by_category: Mapping[Optional[str], Tuple[PlaybookData, ...]] = MappingProxyType(
+            {category: tuple(items) for category, items in by_category.items()})
+        # 预渲染的响应字符串，随快照一起被替换，无需单独失效
+        self._responses = {}
+
+    @classmethod
+    def from_playbooks(cls, playbooks: Iterable[PlaybookData], disabled_ids: Iterable[int] = ()) -> "PlaybookCatalog":
+        """由剧本列表直接构建目录"""
+        disabled = set(disabled_ids)
+        return cls((p, p.id not in disabled) for p in playbooks)
+
+    def get(self, playbook_id: int) -> Optional[PlaybookData]:
+        """按ID获取剧本"""
+        return self.by_id.get(playbook_id)
+
+    def list(self, category: Optional[str] = None, limit: int = 100) -> Tuple[PlaybookData, ...]:
+        """获取已启用剧本列表，可按分类筛选"""
+        items = self.by_category.get(category, ()) if category else self.enabled
+        return items[:max(0, limit)]
+
+    def categories(self) -> List[str]:
+        """已启用剧本的分类列表"""
+        return [c for c in self.by_category if c]
+
+    def cached_response(self, key: Hashable, render: Callable[[], str]) -> str:
+        """获取本版本下已渲染的响应，未渲染时调用 render 生成并缓存"""
+        response = self._responses.get(key)
+        if response is None:
+            response = self._responses[key] = render()
+        return response
+
+    def cached_count(self) -> int:
+        """已缓存的响应数量"""
+        return len(self._responses)
+
+
+class PlaybookCatalogStore:
+    """持有当前剧本目录快照，重建时原子替换"""
+
+    def __init__(self, db: DatabaseManager):
+        self._db = db
+        self._current: Optional[PlaybookCatalog] = None
+        self._rebuild_lock = threading.Lock()
+        self._warmers: List[Callable[[PlaybookCatalog], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_stop = threading.Event()
+
+    def add_warmer(self, warmer: Callable[[PlaybookCatalog], None]):
+        """注册预热函数，新快照发布前调用（用于预渲染常用响应）"""
+        self._warmers.append(warmer)
+
+    def _warm(self, catalog: PlaybookCatalog):
+        for warmer in self._warmers:
+            try:
+                warmer(catalog)
+            except Exception as e:
+                logger.warning(f"剧本目录预热失败: {e}")
+
+    @property
+    def loaded(self) -> bool:
+        """是否已构建过目录快照"""
+        return self._current is not None
+
+    @property
+    def current(self) -> PlaybookCatalog:
+        """当前快照，首次访问时从数据库构建"""
+        catalog = self._current
+        if catalog is None:
+            catalog = self.rebuild()
+        return catalog
+
+    def rebuild(self) -> PlaybookCatalog:
+        """从数据库重建目录并替换当前快照"""
+        with self._rebuild_lock:
+            # 先读版本号再读数据：期间发生的修改会在下一次检查时再次触发重建，不会遗漏
+            data_version = self._db.get_playbook_version()
+            catalog = PlaybookCatalog(self._db.get_all_playbooks_with_status(), data_version=data_version)
+            self._warm(catalog)
+            self._current = catalog
+        logger.info(f"剧本目录已重建: 版本 {catalog.version}, 共 {len(catalog.by_id)} 个剧本, "
+                    f"启用 {len(catalog.enabled)} 个, 预渲染响应 {catalog.cached_count()} 个")
+        return catalog
+
+    def replace(self, catalog: PlaybookCatalog):
+        """直接替换当前快照"""
+        self._warm(catalog)
+        self._current = catalog
+
+    def refresh_if_changed(self) -> bool:
+        """数据库中的剧本版本号与当前快照不一致时重建，返回是否重建"""
+        catalog = self._current
+        data_version = self._db.get_playbook_version()
+        if data_version is None or (catalog is not None and catalog.data_version == data_version):
+            return False
+        self.rebuild()
+        return True
+
+    def start_watcher(self, interval: float = 2.0):
+        """启动后台线程定期检查剧本版本号（多 worker 部署时感知其他 worker 的同步与启停）"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watcher_stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """停止版本号检查线程"""
+        self._watcher_stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def _watch(self, interval: float):
+        while not self._watcher_stop.wait(interval):
+            try:
+                self.refresh_if_changed()
+            except Exception as e:
+                logger.warning(f"检查剧本版本号失败: {e}")
+
+
+# 全局剧本目录
+playbook_catalog = PlaybookCatalogStore(db_manager)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+SOAR MCP 在线采样分析器
+按固定间隔读取所有线程（事件循环、同步线程、数据库线程、写线程等）的 Python 调用栈，
+汇总为折叠栈格式（每行 `线程;帧;帧;... 次数`），可直接交给 flamegraph.pl、speedscope 等工具生成火焰图。
+
+采样在独立线程中进行，只读取调用栈而不注入被分析的代码，对运行中的服务影响很小
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 栈顶为这些函数的线程视为空闲等待（事件循环等待 IO、线程池与队列等待任务）
+IDLE_FRAMES = frozenset({
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+})
+
+# 单次采样的最长时长（秒）
+MAX_DURATION = 60.0
+
+
+class ProfilerBusy(RuntimeError):
+    """已有采样在进行"""
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(PROJECT_DIR + os.sep):
+        return os.path.relpath(filename, PROJECT_DIR)
+    _, sep, tail = filename.rpartition("site-packages" + os.sep)
+    return tail if sep else os.path.basename(filename)
+
+
+class SamplingProfiler:
+    """
+    线程调用栈采样器
+
+    Args:
+        interval: 采样间隔（秒）
+        include_idle: 是否保留空闲等待中的线程栈
+        thread_filter: 只采样名称包含该字符串的线程
+    """
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False, thread_filter: Optional[str] = None):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.thread_filter = thread_filter
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._labels: Dict[object, Tuple[str, Tuple[str, str]]] = {}
+
+    def _frame_label(self, code) -> Tuple[str, Tuple[str, str]]:
+        # 按代码对象缓存帧标签；使用函数首行号，同一函数的不同执行行合并为一帧
+        label = self._labels.get(code)
+        if label is None:
+            path = _short_path(code.co_filename)
+            label = self._labels[code] = (f"{code.co_name} ({path}:{code.co_firstlineno})",
+                                          (os.path.basename(path), code.co_name))
+        return label
+
+    def sample(self, exclude_ident: Optional[int] = None):
+        """采集一次所有线程的调用栈"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == exclude_ident:
+                continue
+            name = names.get(ident, f"thread-{ident}")
+            if self.thread_filter and self.thread_filter not in name:
+                continue
+            frames = []
+            top = None
+            while frame is not None:
+                label, key = self._frame_label(frame.f_code)
+                if top is None:
+                    top = key
+                frames.append(label)
+                frame = frame.f_back
+            if not self.include_idle and top in IDLE_FRAMES:
+                continue
+            frames.append(name)
+            self._stacks[";".join(reversed(frames))] += 1
+        self.samples += 1
+
+    def run(self, duration: float) -> str:
+        """在当前线程中采样 duration 秒，返回折叠栈文本"""
+        me = threading.get_ident()
+        deadline = time.monotonic() + duration
+        next_at = time.monotonic()
+        while next_at < deadline:
+            self.sample(exclude_ident=me)
+            next_at += self.interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # 采样本身耗时超过间隔时不追赶，避免连续采样占满CPU
+                next_at = time.monotonic()
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        """折叠栈文本（按次数降序）"""
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+
+_profile_lock = threading.Lock()
+
+
+def profile(duration: float, interval: float = 0.01, include_idle: bool = False,
+            thread_filter: Optional[str] = None) -> Tuple[str, int]:
+    """
+    对当前进程采样 duration 秒（阻塞调用方线程），同一时刻只允许一次采样
+
+    Returns:
+        (折叠栈文本, 采样次数)
+
+    Raises:
+        ProfilerBusy: 已有采样在进行
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("已有采样在进行，请稍后重试")
+    try:
+        profiler = SamplingProfiler(interval, include_idle, thread_filter)
+        return profiler.run(min(duration, MAX_DURATION)), profiler.samples
+    finally:
+        _profile_lock.release()
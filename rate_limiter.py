@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+SOAR MCP 按Token速率限制
+基于令牌桶对剧本执行与状态查询调用做准入控制，超出速率的调用在有限时间内排队等待，
+等待时间超过上限时快速拒绝并返回建议重试时间
+
+限流器只在事件循环线程中使用，令牌桶状态的读写之间没有 await，因此热路径无需加锁；
+配置了共享的缓存后端时，令牌桶状态保存在后端，由后端原子地完成补充与扣减（Redis 为一次
+Lua 脚本调用，无需集群锁），多个节点共同执行同一限额
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cache_backend import CacheBackend, CacheBackendError, cache_backend
+from config_manager import config_manager
+from logger_config import logger
+
+# 调用类别
+KIND_EXECUTE = "execute"
+KIND_STATUS = "status"
+
+# 默认策略：每分钟调用数与突发容量
+DEFAULT_POLICY = {
+    "rate_limit_execute_per_minute": 60,
+    "rate_limit_execute_burst": 10,
+    "rate_limit_status_per_minute": 600,
+    "rate_limit_status_burst": 60,
+    # 超出速率时最多排队等待的秒数，超过则直接拒绝
+    "rate_limit_max_wait": 2.0,
+}
+
+# 策略从系统配置刷新的间隔（秒）；限流配置变化时会立即失效
+POLICY_REFRESH_INTERVAL = 5.0
+
+
+class RateLimitExceeded(Exception):
+    """调用超出速率限制"""
+
+    def __init__(self, kind: str, retry_after: float, limit_per_minute: float):
+        self.kind = kind
+        self.retry_after = retry_after
+        self.limit_per_minute = limit_per_minute
+        super().__init__(f"请求过于频繁，已超出速率限制（{kind}: 每分钟 {limit_per_minute:g} 次），"
+                         f"请在 {retry_after:.1f} 秒后重试")
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    允许令牌数为负表示预约：调用先扣减令牌，令牌不足时按欠缺量计算需要等待的时间，
+    排队的调用因此天然按到达顺序间隔放行，排队长度受最大等待时间约束。
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate  # 每秒补充的令牌数
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def reserve(self, now: float, max_wait: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        预约令牌
+
+        Returns:
+            (是否准入, 需要等待的秒数)；未准入时第二项为建议重试时间
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        remaining = self.tokens - cost
+        # 单次消耗超过突发容量时等到令牌补满即可准入，超出部分记为欠额，由后续调用等待偿还
+        wait = max(0.0, (min(cost, self.capacity) - self.tokens) / self.rate)
+        if wait > max_wait:
+            return False, wait
+        self.tokens = remaining
+        return True, wait
+
+
+class RateLimiter:
+    """
+    按Token与调用类别维护令牌桶的限流器
+
+    backend 为共享的缓存后端时令牌桶状态跨节点共享，按墙上时间（shared_clock）计算令牌补充；
+    后端不可用时回退到本节点的令牌桶
+    """
+
+    def __init__(self, policy_loader: Optional[Callable[[], Dict[str, Any]]] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Any] = asyncio.sleep,
+                 backend: Optional[CacheBackend] = None,
+                 shared_clock: Callable[[], float] = time.time):
+        self._policy_loader = policy_loader or _load_policy
+        self._clock = clock
+        self._sleep = sleep
+        self._backend = backend
+        self._shared_clock = shared_clock
+        self._buckets: Dict[Tuple[Any, str], TokenBucket] = {}
+        self._policy: Dict[str, Any] = dict(DEFAULT_POLICY)
+        self._policy_loaded_at: Optional[float] = None
+
+    def _current_policy(self, now: float) -> Dict[str, Any]:
+        if self._policy_loaded_at is None or now - self._policy_loaded_at >= POLICY_REFRESH_INTERVAL:
+            self._policy_loaded_at = now
+            self._policy = self._policy_loader()
+        return self._policy
+
+    def invalidate_policy(self):
+        """丢弃已加载的策略，下次调用时重新读取"""
+        self._policy_loaded_at = None
+
+    def limit_for(self, kind: str, token_info: Dict[str, Any], now: Optional[float] = None) -> Tuple[float, float]:
+        """返回 (每分钟调用数, 突发容量)，每分钟调用数 <= 0 表示不限"""
+        policy = self._current_policy(self._clock() if now is None else now)
+        per_minute = token_info.get(f"{kind}_rate_limit")
+        if per_minute is None:
+            per_minute = policy.get(f"rate_limit_{kind}_per_minute", 0)
+        burst = policy.get(f"rate_limit_{kind}_burst") or 1
+        return float(per_minute or 0), max(1.0, float(burst))
+
+    async def acquire(self, kind: str, token_info: Optional[Dict[str, Any]], cost: float = 1.0):
+        """
+        为当前Token申请 cost 次调用配额，必要时排队等待
+
+        Raises:
+            RateLimitExceeded: 需要等待的时间超过 rate_limit_max_wait
+        """
+        if not token_info:
+            return
+        now = self._clock()
+        per_minute, burst = self.limit_for(kind, token_info, now)
+        if per_minute <= 0:
+            return
+
+        rate = per_minute / 60.0
+        key = (token_info.get("id"), kind)
+        max_wait = float(self._policy.get("rate_limit_max_wait", 0) or 0)
+        reserved = None
+        if self._backend is not None and self._backend.shared:
+            reserved = await self._reserve_shared(key, rate, burst, max_wait, cost)
+        admitted, wait = reserved or self._reserve_local(key, rate, burst, max_wait, now, cost)
+        if not admitted:
+            raise RateLimitExceeded(kind, round(wait, 3), per_minute)
+        if wait > 0:
+            await self._sleep(wait)
+
+    def _reserve_local(self, key: Tuple[Any, str], rate: float, burst: float,
+                       max_wait: float, now: float, cost: float) -> Tuple[bool, float]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+        elif bucket.rate != rate or bucket.capacity != burst:
+            # 配置变更后按新速率继续计算，不重置已有欠额
+            bucket.reserve(now, float("inf"), cost=0)
+            bucket.rate, bucket.capacity = rate, burst
+        return bucket.reserve(now, max_wait, cost)
+
+    async def _reserve_shared(self, key: Tuple[Any, str], rate: float, burst: float,
+                              max_wait: float, cost: float) -> Optional[Tuple[bool, float]]:
+        """在共享后端中预约令牌，后端不可用时返回 None"""
+        name = f"tokenbucket:{key[0]}:{key[1]}"
+        try:
+            return await self._backend.reserve_tokens(name, rate, burst, cost, max_wait, self._shared_clock())
+        except CacheBackendError as e:
+            logger.warning(f"共享限流不可用，使用本节点令牌桶: {e}")
+            return None
+
+    def reset(self):
+        """清空所有令牌桶"""
+        self._buckets.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """限流器统计"""
+        return {"buckets": len(self._buckets)}
+
+
+def _load_policy() -> Dict[str, Any]:
+    """从系统配置读取限流策略"""
+    return {key: config_manager.get(key, default) for key, default in DEFAULT_POLICY.items()}
+
+
+# 全局限流器
+rate_limiter = RateLimiter(backend=cache_backend)
+config_manager.subscribe(lambda changed, snapshot: rate_limiter.invalidate_policy(), keys=DEFAULT_POLICY)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+请求上下文 - 使用 contextvars 保存当前请求的调用方Token信息
+认证后端写入，MCP 工具读取；独立成模块，避免以 `python soar_mcp_server.py` 启动时
+认证模块再次导入 soar_mcp_server 得到另一份上下文变量
+"""
+
+from contextvars import ContextVar
+from typing import Optional
+
+_ctx_token = ContextVar('_ctx_token', default=None)
+_ctx_token_info = ContextVar('_ctx_token_info', default=None)
+_ctx_user_id = ContextVar('_ctx_user_id', default=None)
+_ctx_username = ContextVar('_ctx_username', default=None)
+
+
+def set_current_user_info(token: str, token_info: dict):
+    """设置当前请求的用户信息到上下文"""
+    _ctx_token.set(token)
+    _ctx_token_info.set(token_info)
+    _ctx_user_id.set(token_info.get('id') if token_info else None)
+    _ctx_username.set(token_info.get('name') if token_info else None)
+
+
+def get_current_user_info() -> dict:
+    """获取当前请求的用户信息"""
+    return {
+        'token': _ctx_token.get(),
+        'token_info': _ctx_token_info.get(),
+        'user_id': _ctx_user_id.get(),
+        'username': _ctx_username.get()
+    }
+
+
+def clear_current_user_info():
+    """清理当前请求的用户信息"""
+    _ctx_token.set(None)
+    _ctx_token_info.set(None)
+    _ctx_user_id.set(None)
+    _ctx_username.set(None)
+
+
+def current_token_info() -> Optional[dict]:
+    """当前请求的Token信息，无认证上下文时为 None"""
+    return _ctx_token_info.get()
+
+
+def current_user_id() -> Optional[int]:
+    """当前请求的Token ID，无认证上下文时为 None"""
+    return _ctx_user_id.get()
@@ -156,7 +156,7 @@ do_reset() {
         echo "======================================"
         echo
         print_info "密码立即生效，无需重启服务"
-        print_info "管理后台: http://127.0.0.1:12346/admin"
+        print_info "管理后台: http://127.0.0.1:12345/admin"
         echo
     else
         error_msg=${result#ERROR|}
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+SOAR 执行结果投影与分页
+支持 JSON 路径风格的字段选择、大数组分页以及按响应大小截断（返回续取游标）
+
+路径语法：以 "." 分隔的键，数组使用 [N] 取下标、[*] 取全部元素，例如：
+    result.activity.executeStatus
+    result.nodeResults[*].nodeResultModel.displayName
+    result.nodeResults[0]
+"""
+
+import base64
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# 路径中的单个片段：普通键、[N] 或 [*]
+_TOKEN_RE = re.compile(r"([^.\[\]]+)|\[(\d+|\*)\]")
+
+# 投影树中表示"选中整个子树"的标记
+_LEAF = object()
+# 投影中表示"路径不存在"的标记
+_MISSING = object()
+
+WILDCARD = "*"
+
+
+class ProjectionError(ValueError):
+    """路径或游标格式错误"""
+
+
+def parse_path(path: str) -> List[Any]:
+    """将路径解析为片段列表，数组下标解析为 int，通配符为 "*" """
+    if not path or not isinstance(path, str):
+        raise ProjectionError("路径不能为空")
+    tokens: List[Any] = []
+    pos = 0
+    path = path.strip()
+    while pos < len(path):
+        if path[pos] == ".":
+            pos += 1
+            continue
+        match = _TOKEN_RE.match(path, pos)
+        if not match:
+            raise ProjectionError(f"无法解析路径: {path}")
+        key, index = match.groups()
+        if key is not None:
+            tokens.append(WILDCARD if key == WILDCARD else key)
+        elif index == WILDCARD:
+            tokens.append(WILDCARD)
+        else:
+            tokens.append(int(index))
+        pos = match.end()
+    if not tokens:
+        raise ProjectionError(f"无法解析路径: {path}")
+    return tokens
+
+
+def _build_trie(paths: List[str]) -> dict:
+    """将多个路径合并为投影树，便于一次遍历完成多字段选择"""
+    trie: dict = {}
+    for path in paths:
+        node = trie
+        tokens = parse_path(path)
+        for token in tokens[:-1]:
+            child = node.get(token)
+            if child is _LEAF:
+                break
+            node = node.setdefault(token, {})
+        else:
+            node[tokens[-1]] = _LEAF
+    return trie
+
+
+def _project(value: Any, trie: Any) -> Any:
+    if trie is _LEAF:
+        return value
+
+    if isinstance(value, dict):
+        result = {}
+        for token, sub in trie.items():
+            if token == WILDCARD:
+                keys = value.keys()
+            elif isinstance(token, str) and token in value:
+                keys = (token,)
+            else:
+                continue
+            for key in keys:
+                projected = _project(value[key], sub)
+                if projected is not _MISSING:
+                    result[key] = projected
+        return result if result else _MISSING
+
+    if isinstance(value, list):
+        if WILDCARD in trie:
+            sub = trie[WILDCARD]
+            items = (_project(item, sub) for item in value)
+            return [item for item in items if item is not _MISSING]
+        result = []
+        for token, sub in trie.items():
+            if isinstance(token, int) and -len(value) <= token < len(value):
+                projected = _project(value[token], sub)
+                if projected is not _MISSING:
+                    result.append(projected)
+        return result if result else _MISSING
+
+    return _MISSING
+
+
+def select_fields(document: Any, fields: Optional[List[str]]) -> Any:
+    """按字段路径列表投影文档，保留原有层级结构；不修改原文档"""
+    if not fields:
+        return document
+    projected = _project(document, _build_trie(fields))
+    return {} if projected is _MISSING else projected
+
+
+def get_path(document: Any, path: str) -> Any:
+    """读取路径上的值（不支持通配符），不存在时返回 None"""
+    value = document
+    for token in parse_path(path):
+        if token == WILDCARD:
+            raise ProjectionError("分页路径不支持通配符")
+        if isinstance(token, int):
+            if not isinstance(value, list) or not (-len(value) <= token < len(value)):
+                return None
+            value = value[token]
+        else:
+            if not isinstance(value, dict) or token not in value:
+                return None
+            value = value[token]
+    return value
+
+
+def _replace_path(document: Any, tokens: List[Any], new_value: Any) -> Any:
+    """返回替换了路径上值的新文档，沿途容器做浅拷贝，原文档不变"""
+    if not tokens:
+        return new_value
+    token, rest = tokens[0], tokens[1:]
+    if isinstance(document, dict):
+        copied = dict(document)
+    else:
+        copied = list(document)
+    copied[token] = _replace_path(document[token], rest, new_value)
+    return copied
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """编码续取游标"""
+    return base64.urlsafe_b64encode(_dumps(state).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """解码续取游标"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ProjectionError(f"无效的游标: {e}")
+    if not isinstance(state, dict):
+        raise ProjectionError("无效的游标")
+    return state
+
+
+def build_result_view(envelope: Dict[str, Any], payload: Any, fields: Optional[List[str]] = None,
+                      page_path: Optional[str] = None, offset: int = 0, limit: Optional[int] = None,
+                      max_bytes: Optional[int] = None,
+                      cursor_state: Optional[Dict[str, Any]] = None,
+                      default_page_path: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    构造投影/分页后的响应字符串。
+
+    Args:
+        envelope: 响应外层字段（activityId、queryTime 等），结果放在 executionResult 字段
+        payload: 原始执行结果
+        fields: 字段路径列表，为空表示全部字段
+        page_path: 需要分页的数组路径（基于投影后的文档）
+        offset / limit: 分页起点与最大条数
+        max_bytes: 响应最大字节数，超出时缩小当前页并返回续取游标
+        cursor_state: 写入续取游标的额外状态（如 activityId）
+        default_page_path: 指定 max_bytes 但未指定 page_path 时，投影后该路径为数组则对其分页
+
+    Returns:
+        (响应JSON字符串, 分页信息)
+    """
+    if offset < 0:
+        raise ProjectionError("offset 不能为负数")
+    if limit is not None and limit <= 0:
+        raise ProjectionError("limit 必须大于0")
+    if max_bytes is not None and max_bytes <= 0:
+        raise ProjectionError("max_bytes 必须大于0")
+
+    view = select_fields(payload, fields)
+    if max_bytes is not None and not page_path and default_page_path \
+            and isinstance(get_path(view, default_page_path), list):
+        page_path = default_page_path
+
+    if not page_path:
+        rendered = _dumps(dict(envelope, executionResult=view))
+        if max_bytes is not None and len(rendered.encode("utf-8")) > max_bytes:
+            rendered = _dumps(dict(
+                envelope,
+                truncated=True,
+                executionResultBytes=len(_dumps(view).encode("utf-8")),
+                hint="结果超过 max_bytes，请使用 fields 选择字段或 page_path 分页获取",
+            ))
+        return rendered, {}
+
+    page_tokens = parse_path(page_path)
+    items = get_path(view, page_path)
+    if not isinstance(items, list):
+        raise ProjectionError(f"分页路径不是数组: {page_path}")
+    end = len(items) if limit is None else min(len(items), offset + limit)
+    page_items = items[offset:end]
+
+    def page_meta(count: int) -> Dict[str, Any]:
+        next_offset = offset + count
+        meta = {"path": page_path, "offset": offset, "count": count, "total": len(items),
+                "hasMore": next_offset < len(items)}
+        if meta["hasMore"]:
+            state = dict(cursor_state or {})
+            state.update({"fields": fields, "page_path": page_path, "offset": next_offset,
+                          "limit": limit, "max_bytes": max_bytes})
+            meta["nextOffset"] = next_offset
+            meta["nextCursor"] = encode_cursor(state)
+        return meta
+
+    def render(count: int, meta: Dict[str, Any]) -> str:
+        result = _replace_path(view, page_tokens, page_items[:count])
+        return _dumps(dict(envelope, executionResult=result, page=meta))
+
+    count = len(page_items)
+    meta = page_meta(count)
+    rendered = render(count, meta)
+
+    if max_bytes is not None and len(rendered.encode("utf-8")) > max_bytes:
+        # 逐条累加元素大小，保留能放下的最大前缀；至少保留1条以保证续取能前进。
+        # 预留少量字节应对游标中 offset 位数变化。
+        budget = max_bytes - len(render(0, page_meta(0)).encode("utf-8")) - 16
+        count = 0
+        for item in page_items:
+            item_bytes = len(_dumps(item).encode("utf-8")) + (1 if count else 0)
+            if item_bytes > budget and count > 0:
+                break
+            budget -= item_bytes
+            count += 1
+        meta = page_meta(count)
+        if budget < 0:
+            meta["itemTooLarge"] = True
+        rendered = render(count, meta)
+
+    return rendered, meta
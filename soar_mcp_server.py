@@ -3,29 +3,52 @@
 SOAR MCP服务器 - 使用FastMCP简化版本
 """
 
+import hmac
 import json
 import os
 import asyncio
 import threading
 import time
 from collections import OrderedDict
-from contextvars import ContextVar
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional, Union
+from typing import List, Optional, Tuple, Union
 
 import httpx
-from flask import Flask, jsonify, request, send_file
-from threading import Thread
 
-from fastmcp import FastMCP
+from fastmcp import Context, FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from version import __version__
 from models import db_manager
+from async_db import async_db, db_executor
 from sync_service import PlaybookSyncService
 from logger_config import logger
-from auth_utils import jwt_required
 from config_manager import config_manager
 from auth_provider import soar_auth_provider
+from auth_utils import get_auth_manager, jwt_required
+from admin_server import register_admin_routes
+from result_projection import (
+    ProjectionError, build_result_view, decode_cursor
+)
+from cache_backend import cache_backend
+from metrics import InstrumentedTransport, registry as metrics_registry, tool_duration, tool_errors
+from tracing import configure_from_env as configure_tracing, shutdown_tracing, start_span
+from execution_cache import (
+    IdempotencyInProgressError, status_cache, status_flight, result_cache, result_flight, idempotency_store,
+    is_terminal_status
+)
+from param_validator import ParamValidationError, param_validators
+from playbook_catalog import PlaybookCatalog, playbook_catalog
+from leader_election import leader_elector
+from request_context import current_token_info, current_user_id, get_current_user_info
+from rate_limiter import KIND_EXECUTE, KIND_STATUS, RateLimitExceeded, rate_limiter
+from execution_tracker import ExecutionTracker
+from execution_dispatcher import (
+    TICKET_FAILED, TICKET_QUEUED, ExecutionDispatcher, resolve_priority
+)
 
 # 加载环境变量
 load_dotenv()
@@ -39,7 +62,7 @@ mcp = FastMCP(
 )
 
 
-# ===== 有界执行记录存储 =====
+# ===== 执行记录持久化 =====
 
 class BoundedDict(OrderedDict):
     """有最大容量限制的有序字典，超出时淘汰最早的条目"""
@@ -52,41 +75,60 @@ class BoundedDict(OrderedDict):
         if len(self) > self.max_size:
             self.popitem(last=False)
 
-EXECUTIONS = BoundedDict(max_size=1000)
 
+# 最近写入的执行状态，避免轮询时重复写入相同状态
+_recorded_status = BoundedDict(max_size=10000)
 
-# ===== 请求上下文 - 使用 contextvars 支持异步 =====
+# soar://executions 资源分页大小
+EXECUTIONS_PAGE_SIZE = 50
 
-_ctx_token = ContextVar('_ctx_token', default=None)
-_ctx_token_info = ContextVar('_ctx_token_info', default=None)
-_ctx_user_id = ContextVar('_ctx_user_id', default=None)
-_ctx_username = ContextVar('_ctx_username', default=None)
 
+def _submit_history_write(func, *args, **kwargs):
+    """
+    提交执行记录写入（不等待结果，写入方法自行记录异常）
 
-def set_current_user_info(token: str, token_info: dict):
-    """设置当前请求的用户信息到上下文"""
-    _ctx_token.set(token)
-    _ctx_token_info.set(token_info)
-    _ctx_user_id.set(token_info.get('id') if token_info else None)
-    _ctx_username.set(token_info.get('name') if token_info else None)
+    直接排入单写线程的队列，同一执行的写入按提交顺序执行；未启动写线程时（测试与脚本）交给数据库线程池
+    """
+    writer = db_manager.writer
+    if writer is not None:
+        writer.submit(func, *args, **kwargs)
+    else:
+        db_executor.submit(func, *args, **kwargs)
 
 
-def get_current_user_info() -> dict:
-    """获取当前请求的用户信息"""
-    return {
-        'token': _ctx_token.get(),
-        'token_info': _ctx_token_info.get(),
-        'user_id': _ctx_user_id.get(),
-        'username': _ctx_username.get()
-    }
+def record_execution_started(activity_id: str, playbook_id: int, event_id: int = 0):
+    """记录新启动的执行"""
+    token_id = current_user_id()
+    _recorded_status[activity_id] = "NEW"
+    _submit_history_write(db_manager.record_execution, activity_id, playbook_id,
+                          token_id=token_id, event_id=event_id, status="NEW")
+
+
+def record_execution_status(activity_id: str, status: Optional[str]):
+    """记录执行状态变化（状态未变化时不写库）"""
+    execution_dispatcher.observe_status(activity_id, status)
+    if not status or _recorded_status.get(activity_id) == status:
+        return
+    _recorded_status[activity_id] = status
+    _submit_history_write(db_manager.update_execution_status, activity_id, status,
+                          finished=is_terminal_status(status))
+
 
+# ===== 速率限制 =====
 
-def clear_current_user_info():
-    """清理当前请求的用户信息"""
-    _ctx_token.set(None)
-    _ctx_token_info.set(None)
-    _ctx_user_id.set(None)
-    _ctx_username.set(None)
+async def admit_call(kind: str, cost: int = 1):
+    """按当前Token做速率限制准入（无Token上下文的本地调用不限流），超限时抛出 RateLimitExceeded"""
+    await rate_limiter.acquire(kind, current_token_info(), cost)
+
+
+def rate_limited_response(e: RateLimitExceeded) -> str:
+    """超出速率限制时的响应"""
+    return json.dumps({
+        "success": False,
+        "error": str(e),
+        "rateLimited": True,
+        "retryAfter": e.retry_after
+    }, ensure_ascii=False, indent=2)
 
 
 # ===== 审计日志 =====
@@ -94,411 +136,239 @@ def clear_current_user_info():
 def audit_mcp_access(action: str = "unknown", resource: str = None, parameters: dict = None) -> None:
     """
     记录MCP工具访问的审计日志。
-    注意：此函数仅做审计记录，不做认证验证。
+    注意：此函数仅做审计记录，不做认证验证；写入在数据库线程中异步完成，不阻塞调用方。
     """
-    try:
-        user_info = get_current_user_info()
-        token_info = user_info['token_info']
+    with start_span("audit_mcp_access", attributes={"soar.audit.action": action}):
+        try:
+            user_info = get_current_user_info()
+            db_executor.submit(_write_audit_event, action, resource, parameters,
+                               user_info['token'], user_info['token_info'])
+        except Exception as e:
+            logger.error(f"记录审计日志异常: {e}")
 
-        if not token_info:
-            try:
-                token = _ctx_token.get()
-                if token:
-                    token_info = db_manager.get_token_by_value(token)
-            except Exception:
-                pass
-
-        db_manager.log_audit_event(
-            action=action,
-            resource=resource,
-            parameters=parameters,
-            result="success",
-            token_info=token_info
-        )
-    except Exception as e:
-        logger.error(f"记录审计日志异常: {e}")
+
+def _write_audit_event(action: str, resource: Optional[str], parameters: Optional[dict],
+                       token: Optional[str], token_info: Optional[dict]):
+    """写入审计日志（在数据库线程中执行）"""
+    if not token_info and token:
+        try:
+            token_info = db_manager.get_token_by_value(token)
+        except Exception:
+            pass
+
+    db_manager.log_audit_event(
+        action=action,
+        resource=resource,
+        parameters=parameters,
+        result="success",
+        token_info=token_info
+    )
 
 
 # ===== 共享异步 HTTP 客户端 =====
 
 _soar_http_client: Optional[httpx.AsyncClient] = None
+_soar_http_client_outdated = False
+
+# 影响 HTTP 客户端构造的配置项
+HTTP_CLIENT_CONFIG_KEYS = ("ssl_verify", "soar_timeout")
+
+
+def _on_http_client_config_change(changed, snapshot):
+    """SSL 或超时配置变化后，下次请求时重建客户端"""
+    global _soar_http_client_outdated
+    _soar_http_client_outdated = True
+    logger.info(f"HTTP客户端配置已变化({', '.join(sorted(changed))})，将重建SOAR客户端")
+
+
+config_manager.subscribe(_on_http_client_config_change, keys=HTTP_CLIENT_CONFIG_KEYS)
 
 
 async def get_soar_client() -> httpx.AsyncClient:
     """获取或创建共享的异步 SOAR API 客户端"""
-    global _soar_http_client
+    global _soar_http_client, _soar_http_client_outdated
+    if _soar_http_client_outdated and _soar_http_client is not None:
+        # 旧客户端上可能仍有进行中的请求，超时后再关闭
+        old_client, _soar_http_client = _soar_http_client, None
+        asyncio.get_running_loop().call_later(
+            float(old_client.timeout.read or 30) + 1, lambda: asyncio.ensure_future(old_client.aclose()))
+    _soar_http_client_outdated = False
     if _soar_http_client is None or _soar_http_client.is_closed:
         ssl_verify = config_manager.get_ssl_verify()
         timeout = config_manager.get_timeout()
         _soar_http_client = httpx.AsyncClient(
-            verify=ssl_verify,
+            transport=InstrumentedTransport("api", verify=ssl_verify),
             timeout=float(timeout)
         )
     return _soar_http_client
 
 
-# ===== ID转换工具函数 =====
-
-def parse_playbook_id(playbook_id) -> int:
-    """解析剧本ID，支持 int 和 str 格式"""
-    if isinstance(playbook_id, int):
-        return playbook_id
-    elif isinstance(playbook_id, str):
-        return int(playbook_id)
-    else:
-        raise ValueError(f"不支持的剧本ID格式: {type(playbook_id)} - {playbook_id}")
-
-
-# ===== Flask 管理后台 =====
+# ===== 执行状态查询（缓存 + 并发合并） =====
 
-admin_app = Flask(__name__)
+async def _request_execution_status(activity_id: str) -> dict:
+    """请求SOAR API获取执行状态，并写入状态缓存"""
+    base_url = config_manager.get_api_url()
+    api_token = config_manager.get_api_token()
+    api_url = f"{base_url.rstrip('/')}/odp/core/v1/api/activity/{activity_id}"
+    headers = {'hg-token': api_token, 'Content-Type': 'application/json'}
 
+    client = await get_soar_client()
+    response = await client.get(api_url, headers=headers)
 
-@admin_app.route('/login')
-def login_page():
-    """登录页面"""
-    try:
-        return send_file('templates/login.html')
-    except FileNotFoundError:
-        return jsonify({"error": "登录页面未找到"}), 404
-
+    if response.status_code != 200:
+        raise Exception(f"API调用失败: {response.status_code}")
 
-@admin_app.route('/api/admin/login', methods=['POST'])
-def admin_login():
-    """管理员登录"""
-    try:
-        data = request.get_json()
-        if not data or 'adminPassword' not in data:
-            return jsonify({"success": False, "error": "请提供管理员密码"}), 400
+    api_result = response.json()
+    if api_result.get('code') != 200:
+        raise Exception(f"API返回错误: {api_result.get('message', '未知错误')}")
 
-        admin_password = data['adminPassword'].strip()
-        if not admin_password:
-            return jsonify({"success": False, "error": "管理员密码不能为空"}), 400
+    result_data = api_result.get('result') or {}
+    status_cache.put(activity_id, result_data.get('executeStatus'), result_data)
+    await status_cache.put_shared(activity_id, result_data.get('executeStatus'), result_data)
+    record_execution_status(activity_id, result_data.get('executeStatus'))
+    return result_data
 
-        auth_manager = admin_app.auth_manager
-        jwt_token = auth_manager.login_with_password(admin_password)
-
-        if jwt_token:
-            return jsonify({"success": True, "jwt": jwt_token, "message": "登录成功"})
-        else:
-            return jsonify({"success": False, "error": "密码无效，请检查后重试"}), 401
 
-    except Exception as e:
-        logger.error(f"管理员登录失败: {e}")
-        return jsonify({"success": False, "error": "登录过程中发生错误"}), 500
+async def fetch_execution_status(activity_id: str) -> dict:
+    """
+    获取执行状态数据。
+    终态永久缓存、非终态短TTL缓存；同一活动的并发查询只发起一次后端请求。
+    多节点部署时优先读取其他节点写入共享缓存的状态。
+    """
+    cached = status_cache.get(activity_id)
+    if cached is not None:
+        return cached
+    return await status_flight.do(activity_id, lambda: _load_execution_status(activity_id))
 
 
-@admin_app.route('/api/admin/verify', methods=['GET'])
-def verify_token():
-    """验证JWT Token"""
-    try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return jsonify({"valid": False}), 401
-        try:
-            token = auth_header.split(' ')[1]
-        except IndexError:
-            return jsonify({"valid": False}), 401
-
-        auth_manager = admin_app.auth_manager
-        payload = auth_manager.verify_jwt(token)
-        if payload:
-            return jsonify({"valid": True, "user": payload})
-        else:
-            return jsonify({"valid": False}), 401
-    except Exception as e:
-        logger.error(f"Token验证失败: {e}")
-        return jsonify({"valid": False}), 401
+async def _load_execution_status(activity_id: str) -> dict:
+    """本地缓存未命中：先读取共享缓存，仍未命中再请求SOAR"""
+    shared = await status_cache.get_shared(activity_id)
+    if shared is not None:
+        return shared
+    return await _request_execution_status(activity_id)
 
 
-@admin_app.route('/admin')
-def admin_page():
-    """管理后台首页"""
-    try:
-        return send_file('templates/admin.html')
-    except FileNotFoundError:
-        return jsonify({"error": "管理页面未找到"}), 404
+# ===== 执行结果查询（终态结果缓存） =====
 
+# 指定 max_bytes 但未指定分页路径时默认分页的数组
+DEFAULT_RESULT_PAGE_PATH = "result.nodeResults"
 
-@admin_app.route('/static/<path:filename>')
-def serve_static(filename):
-    """提供静态文件服务"""
-    try:
-        return send_file(f'static/{filename}')
-    except FileNotFoundError:
-        return jsonify({"error": "文件未找到"}), 404
 
+def _result_execute_status(api_result: dict) -> Optional[str]:
+    """从执行结果中提取活动的执行状态"""
+    result = api_result.get('result') or {}
+    activity = result.get('activity') if isinstance(result, dict) else None
+    return (activity or {}).get('executeStatus')
 
-@admin_app.route('/api/admin/playbooks')
-@jwt_required
-def get_admin_playbooks():
-    """获取所有剧本（管理界面）"""
-    try:
-        playbooks = db_manager.get_playbooks_admin()
-        return jsonify({"success": True, "data": playbooks, "total": len(playbooks)})
-    except Exception as e:
-        logger.error(f"获取管理剧本列表失败: {e}")
-        return jsonify({"success": False, "error": "获取剧本列表时发生内部错误"}), 500
 
+async def _request_execution_result(activity_id: str) -> dict:
+    """请求SOAR API获取执行结果，终态结果写入结果缓存"""
+    base_url = config_manager.get_api_url()
+    api_token = config_manager.get_api_token()
+    api_url = f"{base_url.rstrip('/')}/odp/core/v1/api/event/activity?activityId={activity_id}"
+    headers = {'hg-token': api_token, 'Content-Type': 'application/json'}
 
-@admin_app.route('/api/admin/playbooks/<string:playbook_id>')
-@jwt_required
-def get_playbook_detail(playbook_id):
-    """获取单个剧本详情"""
-    try:
-        if playbook_id.startswith('id_'):
-            playbook_id_int = int(playbook_id[3:])
-        else:
-            playbook_id_int = int(playbook_id)
-        playbook = db_manager.get_playbook_by_id(playbook_id_int)
-        if playbook:
-            return jsonify({"success": True, "data": playbook})
-        else:
-            return jsonify({"success": False, "error": "剧本未找到"}), 404
-    except Exception as e:
-        logger.error(f"获取剧本详情失败: {e}")
-        return jsonify({"success": False, "error": "获取剧本详情时发生内部错误"}), 500
+    client = await get_soar_client()
+    response = await client.get(api_url, headers=headers)
 
+    if response.status_code != 200:
+        raise Exception(f"API调用失败: {response.status_code}")
 
-@admin_app.route('/api/admin/playbooks/<string:playbook_id>/toggle', methods=['POST'])
-@jwt_required
-def toggle_playbook(playbook_id):
-    """切换剧本启用状态"""
-    try:
-        if playbook_id.startswith('id_'):
-            playbook_id_int = int(playbook_id[3:])
-        else:
-            playbook_id_int = int(playbook_id)
-        data = request.get_json()
-        enabled = data.get('enabled', True)
-        success = db_manager.update_playbook_status(playbook_id_int, enabled)
-        if success:
-            return jsonify({"success": True, "message": f"剧本 {playbook_id} 已{'启用' if enabled else '禁用'}"})
-        else:
-            return jsonify({"success": False, "error": f"未找到剧本 {playbook_id}"}), 404
-    except Exception as e:
-        logger.error(f"切换剧本状态失败: {e}")
-        return jsonify({"success": False, "error": "切换剧本状态时发生内部错误"}), 500
+    api_result = response.json()
+    if api_result.get('code') != 200:
+        raise Exception(f"API返回错误: {api_result.get('message', '未知错误')}")
 
+    if is_terminal_status(_result_execute_status(api_result)):
+        await asyncio.to_thread(result_cache.put, activity_id, api_result)
+    return api_result
 
-@admin_app.route('/api/admin/config', methods=['GET'])
-@jwt_required
-def get_system_config():
-    """获取系统配置"""
-    try:
-        config = config_manager.get_soar_config()
-        config_dict = config.model_dump()
-        if config_dict.get('soar_api_token'):
-            token = config_dict['soar_api_token']
-            if len(token) > 10:
-                config_dict['soar_api_token'] = token[:6] + '****' + token[-4:]
-        return jsonify({"success": True, "data": config_dict})
-    except Exception as e:
-        logger.error(f"获取系统配置失败: {e}")
-        return jsonify({"success": False, "error": "获取配置时发生内部错误"}), 500
 
-
-@admin_app.route('/api/admin/config', methods=['POST'])
-@jwt_required
-def update_system_config():
-    """更新系统配置"""
-    try:
-        from models import SystemConfigData
-
-        data = request.get_json()
-        old_config = config_manager.get_soar_config()
-
-        if 'soar_api_token' not in data:
-            data['soar_api_token'] = old_config.soar_api_token
-
-        try:
-            config_data = SystemConfigData(**data)
-        except Exception as e:
-            return jsonify({"success": False, "error": f"配置数据格式错误: {e}"}), 400
-
-        # 检查影响同步的字段变化
-        sync_affecting_fields = []
-        if old_config.soar_api_url != config_data.soar_api_url:
-            sync_affecting_fields.append("API地址")
-        if 'soar_api_token' in data and not data['soar_api_token'].startswith('***'):
-            if old_config.soar_api_token != config_data.soar_api_token:
-                sync_affecting_fields.append("API Token")
-        if set(old_config.soar_labels or []) != set(config_data.soar_labels or []):
-            sync_affecting_fields.append("标签配置")
-        if old_config.soar_timeout != config_data.soar_timeout:
-            sync_affecting_fields.append("超时设置")
-
-        success = config_manager.update_soar_config(config_data)
-
-        if success and sync_affecting_fields:
-            logger.info(f"检测到影响同步的配置变化: {', '.join(sync_affecting_fields)}")
-
-            def trigger_immediate_sync():
-                try:
-                    if not config_manager.is_first_run():
-                        logger.sync_start(f"配置变化触发立即同步...")
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        try:
-                            playbook_sync_service = PlaybookSyncService(db_manager)
-                            result = loop.run_until_complete(playbook_sync_service.full_sync())
-                            if "error" in result:
-                                logger.sync_warning(f"配置变化触发的同步失败: {result['error']}")
-                            else:
-                                logger.sync_success("配置变化触发的同步完成!")
-                        except Exception as e:
-                            logger.sync_error(f"配置变化触发的同步异常: {e}")
-                        finally:
-                            loop.close()
-                except Exception as e:
-                    logger.error(f"触发立即同步失败: {e}")
-
-            sync_thread = threading.Thread(target=trigger_immediate_sync, daemon=True)
-            sync_thread.start()
-            return jsonify({"success": True, "message": "系统配置已更新，正在触发数据同步..."})
-        elif success:
-            return jsonify({"success": True, "message": "系统配置已更新"})
-        else:
-            return jsonify({"success": False, "error": "配置更新失败"}), 500
-
-    except Exception as e:
-        logger.error(f"更新系统配置失败: {e}")
-        return jsonify({"success": False, "error": "更新配置时发生内部错误"}), 500
+async def fetch_execution_result(activity_id: str) -> dict:
+    """
+    获取执行结果。
+    终态结果不可变，命中缓存时直接本地返回；同一活动的并发查询只发起一次后端请求。
+    """
+    cached = await asyncio.to_thread(result_cache.get, activity_id)
+    if cached is not None:
+        return cached
+    return await result_flight.do(activity_id, lambda: _request_execution_result(activity_id))
 
 
-@admin_app.route('/api/admin/config/validate', methods=['POST'])
-@jwt_required
-def validate_system_config():
-    """验证系统配置"""
-    try:
-        config_data = None
-        if request.is_json:
-            data = request.get_json()
-            if data:
-                from models import SystemConfigData
-                try:
-                    config_data = SystemConfigData(**data)
-                except Exception as e:
-                    return jsonify({"success": False, "error": f"配置数据格式错误: {e}"}), 400
-        validation_result = config_manager.validate_config(config_data)
-        return jsonify({"success": True, "data": validation_result})
-    except Exception as e:
-        logger.error(f"验证系统配置失败: {e}")
-        return jsonify({"success": False, "error": "验证配置时发生内部错误"}), 500
+# ===== ID转换工具函数 =====
 
+def parse_playbook_id(playbook_id) -> int:
+    """解析剧本ID，支持 int 和 str 格式"""
+    if isinstance(playbook_id, int):
+        return playbook_id
+    elif isinstance(playbook_id, str):
+        return int(playbook_id)
+    else:
+        raise ValueError(f"不支持的剧本ID格式: {type(playbook_id)} - {playbook_id}")
 
-@admin_app.route('/api/admin/config/test', methods=['POST'])
-@jwt_required
-def test_connection():
-    """测试API连接"""
-    try:
-        config_data = None
-        if request.is_json:
-            data = request.get_json()
-            if data:
-                from models import SystemConfigData
-                try:
-                    config_data = SystemConfigData(**data)
-                except Exception as e:
-                    return jsonify({"success": False, "error": f"配置数据格式错误: {e}"}), 400
-        test_result = config_manager.test_connection(config_data)
-        return jsonify({"success": True, "data": test_result})
-    except Exception as e:
-        logger.error(f"测试连接失败: {e}")
-        return jsonify({"success": False, "error": "测试连接时发生内部错误"}), 500
 
+# ===== MCP 工具定义 =====
 
-@admin_app.route('/api/admin/tokens', methods=['GET'])
-@jwt_required
-def get_tokens():
-    """获取所有Token列表"""
-    try:
-        tokens = db_manager.get_user_tokens()
-        return jsonify({"success": True, "data": tokens})
-    except Exception as e:
-        logger.error(f"获取Token列表失败: {e}")
-        return jsonify({"success": False, "error": "获取Token列表时发生内部错误"}), 500
+DEFAULT_PLAYBOOK_LIST_LIMIT = 100
 
 
-@admin_app.route('/api/admin/tokens', methods=['POST'])
-@jwt_required
-def create_token():
-    """创建新Token"""
-    try:
-        data = request.get_json()
-        if not data or 'name' not in data:
-            return jsonify({"success": False, "error": "请提供Token名称"}), 400
-        name = data['name'].strip()
-        expires_in_days = data.get('expires_in_days')
-        if not name:
-            return jsonify({"success": False, "error": "Token名称不能为空"}), 400
-        token = db_manager.create_user_token(name, expires_in_days)
-        if token:
-            return jsonify({"success": True, "token": token, "message": "Token创建成功"})
-        else:
-            return jsonify({"success": False, "error": "Token创建失败"}), 500
-    except Exception as e:
-        logger.error(f"创建Token失败: {e}")
-        return jsonify({"success": False, "error": "创建Token时发生内部错误"}), 500
+def render_playbook_list(catalog: PlaybookCatalog, category: Optional[str] = None,
+                         limit: int = DEFAULT_PLAYBOOK_LIST_LIMIT) -> str:
+    """渲染剧本列表响应；全部剧本、已知分类的默认或完整列表按目录版本缓存"""
+    playbooks = catalog.list(category=category, limit=limit)
 
+    def render() -> str:
+        result = {
+            "total": len(playbooks),
+            "playbooks": [{"id": p.id, "name": p.name, "displayName": p.display_name} for p in playbooks]
+        }
+        return json.dumps(result, ensure_ascii=False, indent=2)
 
-@admin_app.route('/api/admin/tokens/<int:token_id>', methods=['DELETE'])
-@jwt_required
-def delete_token(token_id):
-    """删除Token"""
-    try:
-        success = db_manager.delete_user_token(token_id)
-        if success:
-            return jsonify({"success": True, "message": "Token删除成功"})
-        else:
-            return jsonify({"success": False, "error": "Token删除失败或不存在"}), 404
-    except Exception as e:
-        logger.error(f"删除Token失败: {e}")
-        return jsonify({"success": False, "error": "删除Token时发生内部错误"}), 500
+    # 只缓存有限的组合，避免任意分类名或 limit 值让缓存无限增长
+    if category and category not in catalog.by_category:
+        return render()
+    available = catalog.by_category[category] if category else catalog.enabled
+    if limit == DEFAULT_PLAYBOOK_LIST_LIMIT or len(playbooks) == len(available):
+        return catalog.cached_response(("list", category or None, len(playbooks)), render)
+    return render()
 
 
-@admin_app.route('/api/admin/tokens/<int:token_id>/toggle', methods=['POST'])
-@jwt_required
-def toggle_token_status(token_id):
-    """切换Token启用状态"""
-    try:
-        data = request.get_json()
-        if not data or 'is_active' not in data:
-            return jsonify({"success": False, "error": "请提供is_active参数"}), 400
-        is_active = data['is_active']
-        success = db_manager.update_token_status(token_id, is_active)
-        if success:
-            return jsonify({"success": True, "message": f"Token已{'启用' if is_active else '禁用'}"})
-        else:
-            return jsonify({"success": False, "error": "Token状态更新失败或不存在"}), 404
-    except Exception as e:
-        logger.error(f"更新Token状态失败: {e}")
-        return jsonify({"success": False, "error": "更新Token状态时发生内部错误"}), 500
+def render_playbook_params(catalog: PlaybookCatalog, playbook_id: int) -> str:
+    """渲染剧本参数响应，按目录版本缓存"""
+    def render() -> str:
+        playbook = catalog.get(playbook_id)
+        result = {
+            "playbookId": playbook.id,
+            "playbookName": playbook.name,
+            "playbookDisplayName": playbook.display_name,
+            "requiredParams": [
+                {
+                    "paramName": param.cef_column,
+                    "paramDesc": param.cef_desc,
+                    "paramType": param.value_type,
+                    "required": bool(param.required)
+                } for param in playbook.playbook_params
+            ]
+        }
+        return json.dumps(result, ensure_ascii=False, indent=2)
 
+    return catalog.cached_response(("params", playbook_id), render)
 
-@admin_app.route('/api/admin/stats', methods=['GET'])
-@jwt_required
-def get_system_stats():
-    """获取系统统计信息"""
-    try:
-        playbooks_stats = db_manager.get_playbooks_stats()
-        apps_stats = db_manager.get_apps_stats()
-        stats = {**playbooks_stats, **apps_stats, "last_sync_time": db_manager.get_last_sync_time()}
-        return jsonify({"success": True, "stats": stats})
-    except Exception as e:
-        logger.error(f"获取系统统计失败: {e}")
-        return jsonify({"success": False, "error": "获取统计信息时发生内部错误"}), 500
 
+def prerender_playbook_responses(catalog: PlaybookCatalog):
+    """预渲染常用响应：全部剧本列表、各分类列表、各剧本参数"""
+    render_playbook_list(catalog)
+    for category in catalog.categories():
+        render_playbook_list(catalog, category)
+    for playbook_id in catalog.by_id:
+        render_playbook_params(catalog, playbook_id)
 
-def start_admin_server(port, host='127.0.0.1'):
-    """启动管理后台服务器"""
-    admin_app.run(host=host, port=port, debug=False, use_reloader=False)
 
+playbook_catalog.add_warmer(prerender_playbook_responses)
 
-# ===== MCP 工具定义 =====
 
 @mcp.tool
-def list_playbooks_quick(category: Optional[str] = None, limit: int = 100) -> str:
+def list_playbooks_quick(category: Optional[str] = None, limit: int = DEFAULT_PLAYBOOK_LIST_LIMIT) -> str:
     """
     获取简洁的剧本列表 - 只包含基本信息(ID, name, displayName)
 
@@ -512,12 +382,7 @@ def list_playbooks_quick(category: Optional[str] = None, limit: int = 100) -> st
     audit_mcp_access(action="list_playbooks_quick", resource="soar://playbooks",
                      parameters={"category": category, "limit": limit})
     try:
-        playbooks = db_manager.get_playbooks(category=category, limit=limit)
-        result = {
-            "total": len(playbooks),
-            "playbooks": [{"id": p.id, "name": p.name, "displayName": p.display_name} for p in playbooks]
-        }
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_playbook_list(playbook_catalog.current, category, limit)
     except Exception as e:
         return json.dumps({"error": f"获取剧本列表失败: {str(e)}"}, ensure_ascii=False, indent=2)
 
@@ -538,29 +403,164 @@ def query_playbook_execution_params(playbook_id: Union[int, str]) -> str:
                      parameters={"playbook_id": playbook_id})
     try:
         playbook_id_int = parse_playbook_id(playbook_id)
-        playbook = db_manager.get_playbook(playbook_id_int)
-        if not playbook:
+        catalog = playbook_catalog.current
+        if not catalog.get(playbook_id_int):
             return json.dumps({"error": f"未找到剧本 ID: {playbook_id}"}, ensure_ascii=False, indent=2)
-        result = {
-            "playbookId": playbook.id,
-            "playbookName": playbook.name,
-            "playbookDisplayName": playbook.display_name,
-            "requiredParams": [
-                {
-                    "paramName": param.cef_column,
-                    "paramDesc": param.cef_desc,
-                    "paramType": param.value_type,
-                    "required": True
-                } for param in playbook.playbook_params
-            ]
-        }
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_playbook_params(catalog, playbook_id_int)
     except Exception as e:
         return json.dumps({"error": f"查询剧本参数失败: {str(e)}"}, ensure_ascii=False, indent=2)
 
 
+class PlaybookNotFoundError(ValueError):
+    """剧本不存在"""
+
+
+def resolve_playbook(playbook_id: Union[int, str], parameters: Optional[dict] = None):
+    """查找剧本并校验执行参数，剧本不存在或参数不合法时抛出异常"""
+    playbook = playbook_catalog.current.get(parse_playbook_id(playbook_id))
+    if not playbook:
+        raise PlaybookNotFoundError(f"未找到剧本 ID: {playbook_id}")
+
+    # 在发起网络请求前按剧本参数定义校验，避免缺参或错参的执行
+    param_validators.validate(playbook, parameters)
+    return playbook
+
+
+async def launch_playbook(playbook_id: Union[int, str], parameters: Optional[dict] = None,
+                          event_id: int = 0) -> str:
+    """调用SOAR API启动剧本执行，返回活动ID；失败时抛出异常"""
+    playbook_id_int = resolve_playbook(playbook_id, parameters).id
+
+    api_params = [{"key": key, "value": str(value)} for key, value in parameters.items()] if parameters else []
+
+    api_request = {
+        "eventId": event_id,
+        "executorInstanceId": playbook_id_int,
+        "executorInstanceType": "PLAYBOOK",
+        "params": api_params
+    }
+
+    base_url = config_manager.get_api_url()
+    api_token = config_manager.get_api_token()
+    api_url = f"{base_url.rstrip('/')}/api/event/execution"
+    headers = {'hg-token': api_token, 'Content-Type': 'application/json'}
+
+    logger.info(f"调用SOAR API执行剧本 ID: {playbook_id_int}")
+
+    client = await get_soar_client()
+    response = await client.post(api_url, headers=headers, json=api_request)
+
+    if response.status_code != 200:
+        raise Exception(f"API调用失败: {response.status_code}")
+
+    api_result = response.json()
+    if api_result.get('code') != 200:
+        raise Exception(f"API返回错误: {api_result.get('message', '未知错误')}")
+
+    activity_id = api_result.get('result')
+    if not activity_id:
+        raise Exception("API未返回活动ID")
+
+    logger.info(f"剧本执行启动成功，活动ID: {activity_id}")
+    record_execution_started(activity_id, playbook_id_int, event_id)
+    return activity_id
+
+
+async def launch_playbook_once(idempotency_key: Optional[str], playbook_id: Union[int, str],
+                               parameters: Optional[dict] = None, event_id: int = 0) -> Tuple[str, bool]:
+    """
+    按幂等键启动剧本执行，返回 (活动ID, 是否为重复调用)
+
+    幂等键按调用方Token隔离；有效期内重复的幂等键直接返回首次启动的活动ID，
+    不会再次调用SOAR API，首次调用进行中的重复调用会合并等待。
+    """
+    if not idempotency_key:
+        return await launch_playbook(playbook_id, parameters, event_id), False
+
+    scoped_key = f"{current_user_id() or 'anonymous'}:{idempotency_key}"
+    fingerprint = json.dumps([str(playbook_id), parameters or {}, event_id],
+                             sort_keys=True, ensure_ascii=False, default=str)
+    return await idempotency_store.run(
+        scoped_key, fingerprint, lambda: launch_playbook(playbook_id, parameters, event_id))
+
+
+# 执行状态跟踪器：等待执行完成时在后台轮询状态并推送给等待者
+execution_tracker = ExecutionTracker(status_fetcher=lambda activity_id: fetch_execution_status(activity_id))
+
+# 剧本执行调度器：系统配置 dispatcher_max_inflight > 0 时启用，限制本进程同时在途的执行数
+# （多 worker 模式下每个 worker 各自限制，总上限为 worker 数 × dispatcher_max_inflight）
+execution_dispatcher = ExecutionDispatcher(status_fetcher=lambda activity_id: fetch_execution_status(activity_id))
+
+
+async def dispatch_playbook(idempotency_key: Optional[str], playbook_id: Union[int, str],
+                            parameters: Optional[dict] = None, event_id: int = 0) -> dict:
+    """通过调度器启动剧本：有空闲名额时立即启动，否则排队并返回排队凭证"""
+    playbook = resolve_playbook(playbook_id, parameters)
+    priority = resolve_priority(
+        playbook.playbook_category, current_token_info(),
+        config_manager.get("dispatcher_category_priorities"),
+        config_manager.get("dispatcher_token_priorities"),
+    )
+    replayed = []
+
+    async def launch() -> str:
+        activity_id, is_replay = await launch_playbook_once(idempotency_key, playbook_id, parameters, event_id)
+        replayed.append(is_replay)
+        return activity_id
+
+    ticket = await execution_dispatcher.submit(launch, priority)
+    if ticket.state == TICKET_FAILED:
+        raise ticket.exception
+    if ticket.state == TICKET_QUEUED:
+        result = execution_dispatcher.describe(ticket)
+        result.update({
+            "success": True,
+            "queued": True,
+            "hint": "SOAR执行并发已满，请求已排队；使用 query_execution_ticket 查询排队状态并获取 activity_id"
+        })
+        return result
+
+    result = {"success": True, "activity_id": ticket.activity_id}
+    if replayed and replayed[0]:
+        result["idempotentReplay"] = True
+    return result
+
+
+async def start_playbook(idempotency_key: Optional[str], playbook_id: Union[int, str],
+                         parameters: Optional[dict] = None, event_id: int = 0) -> dict:
+    """启动剧本：启用执行调度时经调度器（名额已满时排队），否则直接启动"""
+    execution_dispatcher.max_inflight = int(config_manager.get("dispatcher_max_inflight", 0) or 0)
+    if execution_dispatcher.enabled:
+        return await dispatch_playbook(idempotency_key, playbook_id, parameters, event_id)
+    activity_id, replayed = await launch_playbook_once(idempotency_key, playbook_id, parameters, event_id)
+    result = {"success": True, "activity_id": activity_id}
+    if replayed:
+        result["idempotentReplay"] = True
+    return result
+
+
+async def follow_execution(activity_id: str, timeout: float, ctx: Optional[Context] = None) -> dict:
+    """跟踪执行直到进入终态或超时，期间通过 MCP 进度通知推送状态变化与已耗时间"""
+    status, elapsed = None, 0.0
+    async for event in execution_tracker.follow(activity_id, timeout):
+        status, elapsed = event["status"], event["elapsed"]
+        if ctx is not None:
+            try:
+                await ctx.report_progress(progress=elapsed, total=timeout,
+                                          message=f"执行状态: {status}，已耗时 {elapsed:g} 秒")
+            except Exception as e:
+                logger.debug(f"发送进度通知失败 {activity_id}: {e}")
+    return {
+        "status": status or "UNKNOWN",
+        "completed": is_terminal_status(status),
+        "elapsedSeconds": elapsed,
+    }
+
+
 @mcp.tool
-async def execute_playbook(playbook_id: Union[int, str], parameters: Optional[dict] = None, event_id: int = 0) -> str:
+async def execute_playbook(playbook_id: Union[int, str], parameters: Optional[dict] = None, event_id: int = 0,
+                           idempotency_key: Optional[str] = None, wait_for_completion: bool = False,
+                           wait_timeout: int = 600, ctx: Optional[Context] = None) -> str:
     """
     执行SOAR剧本
 
@@ -568,66 +568,189 @@ async def execute_playbook(playbook_id: Union[int, str], parameters: Optional[di
         playbook_id: 剧本ID，支持整数或字符串格式
         parameters: 执行参数字典（可选），格式 {"参数名": "参数值"}
         event_id: 事件ID（默认0）
+        idempotency_key: 幂等键（可选），超时重试时传入相同的值可避免重复执行，
+                         重复调用返回首次执行的activity_id
+        wait_for_completion: 是否等待执行结束后再返回（默认 False）；等待期间通过 MCP 进度通知推送
+                             状态变化与已耗时间，无需轮询状态
+        wait_timeout: 等待执行结束的最长时间（秒），默认600，超时后返回当前状态
 
     Returns:
-        返回包含activity_id的JSON，用此ID查询状态和结果
+        返回包含activity_id的JSON，用此ID查询状态和结果；等待完成时同时包含最终 status
     """
     audit_mcp_access(action="execute_playbook",
                      resource=f"soar://playbooks/{playbook_id}/execute",
-                     parameters={"playbook_id": playbook_id, "parameters": parameters, "event_id": event_id})
+                     parameters={"playbook_id": playbook_id, "parameters": parameters, "event_id": event_id,
+                                 "idempotency_key": idempotency_key, "wait_for_completion": wait_for_completion})
 
-    if parameters is None:
-        parameters = {}
+    try:
+        await admit_call(KIND_EXECUTE)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
 
     try:
-        playbook_id_int = parse_playbook_id(playbook_id)
-        playbook = db_manager.get_playbook(playbook_id_int)
-        if not playbook:
-            return json.dumps({"error": f"未找到剧本 ID: {playbook_id}"}, ensure_ascii=False, indent=2)
+        result = await start_playbook(idempotency_key, playbook_id, parameters, event_id)
 
-        api_params = [{"key": key, "value": str(value)} for key, value in parameters.items()] if parameters else []
+        if wait_for_completion and result.get("activity_id"):
+            result.update(await follow_execution(result["activity_id"], max(0, wait_timeout), ctx))
+        return json.dumps(result, ensure_ascii=False, indent=2)
 
-        api_request = {
-            "eventId": event_id,
-            "executorInstanceId": playbook_id_int,
-            "executorInstanceType": "PLAYBOOK",
-            "params": api_params
-        }
+    except PlaybookNotFoundError as e:
+        return json.dumps({"error": str(e)}, ensure_ascii=False, indent=2)
+    except ParamValidationError as e:
+        return json.dumps({
+            "success": False,
+            "error": "参数校验失败",
+            "details": e.errors,
+            "playbookId": playbook_id,
+            "hint": "请先调用 query_playbook_execution_params 查看剧本参数定义"
+        }, ensure_ascii=False, indent=2)
+    except IdempotencyInProgressError as e:
+        return json.dumps({
+            "success": False,
+            "error": str(e),
+            "playbookId": playbook_id,
+            "hint": "使用相同的 idempotency_key 稍后重试，将返回首次启动的 activity_id"
+        }, ensure_ascii=False, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "success": False,
+            "error": f"执行剧本失败: {str(e)}",
+            "playbookId": playbook_id,
+            "timestamp": datetime.now().isoformat()
+        }, ensure_ascii=False, indent=2)
 
-        base_url = config_manager.get_api_url()
-        api_token = config_manager.get_api_token()
-        api_url = f"{base_url.rstrip('/')}/api/event/execution"
-        headers = {'hg-token': api_token, 'Content-Type': 'application/json'}
 
-        logger.info(f"调用SOAR API执行剧本 ID: {playbook_id_int}")
+# 批量执行的条目数与并发上限
+BATCH_MAX_ITEMS = 100
+BATCH_MAX_CONCURRENCY = 20
+# 批量执行等待完成时的状态轮询间隔（秒）
+BATCH_POLL_INTERVAL = 2.0
 
-        client = await get_soar_client()
-        response = await client.post(api_url, headers=headers, json=api_request)
 
-        if response.status_code != 200:
-            raise Exception(f"API调用失败: {response.status_code}")
+async def wait_for_executions(activity_ids: List[str], timeout: float,
+                              poll_interval: Optional[float] = None, on_update=None) -> dict:
+    """等待执行全部进入终态或超时，返回 {activity_id: status}"""
+    return await execution_tracker.wait(activity_ids, timeout=timeout,
+                                        poll_interval=poll_interval or BATCH_POLL_INTERVAL,
+                                        on_update=on_update)
 
-        api_result = response.json()
-        if api_result.get('code') != 200:
-            raise Exception(f"API返回错误: {api_result.get('message', '未知错误')}")
 
-        activity_id = api_result.get('result')
-        if not activity_id:
-            raise Exception("API未返回活动ID")
+@mcp.tool
+async def execute_playbooks_batch(items: List[dict], max_concurrency: Optional[int] = None,
+                                  wait_for_completion: bool = False, wait_timeout: int = 300,
+                                  ctx: Optional[Context] = None) -> str:
+    """
+    批量执行SOAR剧本 - 适用于对多个IOC运行同一剧本等场景，一次调用并发启动多个执行
 
-        logger.info(f"剧本执行启动成功，活动ID: {activity_id}")
-        execution_result = {"success": True, "activity_id": activity_id}
-        EXECUTIONS[activity_id] = execution_result
-        return json.dumps(execution_result, ensure_ascii=False, indent=2)
+    Args:
+        items: 执行条目列表，每项格式 {"playbook_id": 剧本ID, "parameters": {"参数名": "参数值"}, "event_id": 0,
+               "idempotency_key": "幂等键"}，parameters、event_id 与 idempotency_key 可选
+        max_concurrency: 最大并发启动数（可选），默认取系统配置 batch_max_concurrency（默认5）
+        wait_for_completion: 是否等待全部执行进入终态后再返回，默认 False；等待期间通过 MCP 进度通知推送完成数量
+        wait_timeout: 等待完成的最长时间（秒），默认300
 
-    except Exception as e:
+    Returns:
+        包含每个条目的 activity_id 或错误信息的JSON
+    """
+    audit_mcp_access(action="execute_playbooks_batch",
+                     resource="soar://playbooks/batch/execute",
+                     parameters={"items": items, "max_concurrency": max_concurrency,
+                                 "wait_for_completion": wait_for_completion})
+
+    if not items:
+        return json.dumps({"success": False, "error": "items 不能为空"}, ensure_ascii=False, indent=2)
+    if len(items) > BATCH_MAX_ITEMS:
         return json.dumps({
             "success": False,
-            "error": f"执行剧本失败: {str(e)}",
-            "playbookId": playbook_id,
-            "timestamp": datetime.now().isoformat()
+            "error": f"单次批量执行最多 {BATCH_MAX_ITEMS} 个条目，当前 {len(items)} 个"
         }, ensure_ascii=False, indent=2)
 
+    concurrency = max_concurrency or config_manager.get("batch_max_concurrency", 5)
+    concurrency = max(1, min(int(concurrency), BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def launch_item(index: int, item) -> dict:
+        entry = {"index": index}
+        try:
+            if not isinstance(item, dict) or "playbook_id" not in item:
+                raise ValueError("条目格式错误，需包含 playbook_id")
+            entry["playbookId"] = item["playbook_id"]
+            await admit_call(KIND_EXECUTE)
+            async with semaphore:
+                # 与单次执行一样经执行调度器，批量启动同样受全局在途上限约束
+                result = await start_playbook(
+                    item.get("idempotency_key"), item["playbook_id"], item.get("parameters"),
+                    item.get("event_id", 0))
+            result.pop("hint", None)
+            entry.update(result)
+        except RateLimitExceeded as e:
+            entry.update({"success": False, "error": str(e), "retryAfter": e.retry_after})
+        except Exception as e:
+            entry.update({"success": False, "error": f"执行剧本失败: {str(e)}"})
+        return entry
+
+    start_time = time.monotonic()
+    results = await asyncio.gather(*[launch_item(i, item) for i, item in enumerate(items)])
+    launched = [r["activity_id"] for r in results if r.get("activity_id")]
+    queued = sum(1 for r in results if r.get("queued"))
+
+    response = {
+        "success": True,
+        "total": len(results),
+        "launched": len(launched),
+        "failed": sum(1 for r in results if not r["success"]),
+        "maxConcurrency": concurrency,
+        "results": results,
+    }
+    if queued:
+        response["queued"] = queued
+        response["hint"] = "SOAR执行并发已满，部分条目已排队；使用 query_execution_ticket 查询排队状态并获取 activity_id"
+
+    if wait_for_completion and launched:
+        finished = set()
+
+        async def report(activity_id: str, event: dict):
+            if ctx is None or not is_terminal_status(event["status"]):
+                return
+            finished.add(activity_id)
+            try:
+                await ctx.report_progress(progress=len(finished), total=len(launched),
+                                          message=f"已完成 {len(finished)}/{len(launched)}")
+            except Exception as e:
+                logger.debug(f"发送进度通知失败: {e}")
+
+        statuses = await wait_for_executions(launched, timeout=max(0, wait_timeout), on_update=report)
+        for entry in results:
+            if entry.get("activity_id"):
+                entry["status"] = statuses.get(entry["activity_id"]) or "UNKNOWN"
+        response["allCompleted"] = all(is_terminal_status(s) for s in statuses.values())
+
+    response["elapsedSeconds"] = round(time.monotonic() - start_time, 3)
+    return json.dumps(response, ensure_ascii=False, indent=2)
+
+
+@mcp.tool
+def query_execution_ticket(ticket_id: str) -> str:
+    """
+    查询排队中的剧本执行请求 - execute_playbook 返回 queued=true 时使用
+
+    Args:
+        ticket_id: 排队凭证ID，从 execute_playbook 返回的 ticketId 字段获取
+
+    Returns:
+        排队状态JSON：QUEUED 时包含排队位置与预计等待秒数，LAUNCHED 时包含 activity_id，FAILED 时包含错误信息
+    """
+    audit_mcp_access(action="query_execution_ticket",
+                     resource=f"soar://executions/tickets/{ticket_id}",
+                     parameters={"ticket_id": ticket_id})
+
+    ticket = execution_dispatcher.get_ticket(ticket_id)
+    if not ticket:
+        return json.dumps({"success": False, "error": f"未找到排队凭证: {ticket_id}"}, ensure_ascii=False, indent=2)
+    result = {"success": True}
+    result.update(execution_dispatcher.describe(ticket))
+    return json.dumps(result, ensure_ascii=False, indent=2)
+
 
 @mcp.tool
 async def query_playbook_execution_status_by_activity_id(activity_id: str) -> str:
@@ -652,22 +775,12 @@ async def query_playbook_execution_status_by_activity_id(activity_id: str) -> st
                      parameters={"activity_id": activity_id})
 
     try:
-        base_url = config_manager.get_api_url()
-        api_token = config_manager.get_api_token()
-        api_url = f"{base_url.rstrip('/')}/odp/core/v1/api/activity/{activity_id}"
-        headers = {'hg-token': api_token, 'Content-Type': 'application/json'}
-
-        client = await get_soar_client()
-        response = await client.get(api_url, headers=headers)
-
-        if response.status_code != 200:
-            raise Exception(f"API调用失败: {response.status_code}")
+        await admit_call(KIND_STATUS)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
 
-        api_result = response.json()
-        if api_result.get('code') != 200:
-            raise Exception(f"API返回错误: {api_result.get('message', '未知错误')}")
-
-        result_data = api_result.get('result', {})
+    try:
+        result_data = await fetch_execution_status(activity_id)
         execution_status = result_data.get('executeStatus', 'UNKNOWN')
 
         status_result = {
@@ -700,16 +813,98 @@ async def query_playbook_execution_status_by_activity_id(activity_id: str) -> st
         }, ensure_ascii=False, indent=2)
 
 
+# 多活动状态查询的条目数与并发上限
+STATUS_QUERY_MAX_IDS = 200
+STATUS_QUERY_CONCURRENCY = 10
+
+
 @mcp.tool
-async def query_playbook_execution_result_by_activity_id(activity_id: str) -> str:
+async def query_execution_statuses(activity_ids: List[str]) -> str:
+    """
+    批量查询多个剧本执行的状态 - 一次调用返回所有活动的状态表
+
+    Args:
+        activity_ids: 活动ID列表，从 execute_playbook / execute_playbooks_batch 返回
+
+    Returns:
+        紧凑的状态表JSON：columns 为列名，rows 每行对应一个活动；查询失败的活动列在 errors 中
+    """
+    audit_mcp_access(action="query_execution_statuses",
+                     resource="soar://executions/status",
+                     parameters={"activity_ids": activity_ids})
+
+    ids = list(dict.fromkeys(a.strip() for a in (activity_ids or []) if a and a.strip()))
+    if not ids:
+        return json.dumps({"success": False, "error": "activity_ids 不能为空"}, ensure_ascii=False, indent=2)
+    if len(ids) > STATUS_QUERY_MAX_IDS:
+        return json.dumps({
+            "success": False,
+            "error": f"单次最多查询 {STATUS_QUERY_MAX_IDS} 个活动，当前 {len(ids)} 个"
+        }, ensure_ascii=False, indent=2)
+
+    # 每个活动计一次状态查询，批量查询不能绕过状态查询限额
+    try:
+        await admit_call(KIND_STATUS, cost=len(ids))
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+
+    semaphore = asyncio.Semaphore(STATUS_QUERY_CONCURRENCY)
+
+    async def fetch(activity_id: str):
+        async with semaphore:
+            return await fetch_execution_status(activity_id)
+
+    results = await asyncio.gather(*[fetch(a) for a in ids], return_exceptions=True)
+
+    rows = []
+    errors = {}
+    summary = {}
+    for activity_id, result in zip(ids, results):
+        if isinstance(result, Exception):
+            errors[activity_id] = str(result)
+            continue
+        status = result.get('executeStatus', 'UNKNOWN')
+        summary[status] = summary.get(status, 0) + 1
+        rows.append([activity_id, status, result.get('executorInstanceName'), result.get('updateTime')])
+
+    return json.dumps({
+        "success": True,
+        "total": len(ids),
+        "summary": summary,
+        "allCompleted": not errors and all(is_terminal_status(row[1]) for row in rows),
+        "columns": ["activityId", "status", "executorInstanceName", "updateTime"],
+        "rows": rows,
+        "errors": errors,
+        "queryTime": datetime.now().isoformat(),
+    }, ensure_ascii=False, separators=(",", ":"))
+
+
+@mcp.tool
+async def query_playbook_execution_result_by_activity_id(
+    activity_id: str,
+    fields: Optional[List[str]] = None,
+    page_path: Optional[str] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> str:
     """
     查询剧本执行详细结果
 
     Args:
         activity_id: 活动ID，从execute_playbook返回
+        fields: 只返回指定字段（可选），JSON路径列表，如 ["result.activity.executeStatus",
+                "result.nodeResults[*].nodeResultModel.displayName"]
+        page_path: 对指定数组分页（可选），如 "result.nodeResults"
+        offset: 分页起始位置，默认0
+        limit: 每页最大条数（可选）
+        max_bytes: 响应最大字节数（可选），超出时自动缩小当前页并返回 nextCursor；
+                   未指定 page_path 时默认对 result.nodeResults 分页
+        cursor: 续取游标（可选），传入上次返回的 page.nextCursor 获取下一页，其余参数沿用游标中的设置
 
     Returns:
-        返回详细执行结果，建议先确认status为SUCCESS后调用
+        返回详细执行结果，建议先确认status为SUCCESS后调用；使用上述可选参数时以紧凑JSON返回
     """
     if not activity_id or activity_id.strip() == "":
         return json.dumps({
@@ -720,30 +915,43 @@ async def query_playbook_execution_result_by_activity_id(activity_id: str) -> st
 
     audit_mcp_access(action="query_playbook_execution_result_by_activity_id",
                      resource=f"soar://executions/{activity_id}/result",
-                     parameters={"activity_id": activity_id})
+                     parameters={"activity_id": activity_id, "fields": fields, "page_path": page_path,
+                                 "offset": offset, "limit": limit, "max_bytes": max_bytes,
+                                 "cursor": cursor})
 
     try:
-        base_url = config_manager.get_api_url()
-        api_token = config_manager.get_api_token()
-        api_url = f"{base_url.rstrip('/')}/odp/core/v1/api/event/activity?activityId={activity_id}"
-        headers = {'hg-token': api_token, 'Content-Type': 'application/json'}
-
-        client = await get_soar_client()
-        response = await client.get(api_url, headers=headers)
-
-        if response.status_code != 200:
-            raise Exception(f"API调用失败: {response.status_code}")
+        await admit_call(KIND_STATUS)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
 
-        api_result = response.json()
-        if api_result.get('code') != 200:
-            raise Exception(f"API返回错误: {api_result.get('message', '未知错误')}")
-
-        return json.dumps({
+    try:
+        if cursor:
+            state = decode_cursor(cursor)
+            if state.get("activityId") != activity_id:
+                raise ProjectionError("游标与 activity_id 不匹配")
+            fields = state.get("fields")
+            page_path = state.get("page_path")
+            offset = state.get("offset", 0)
+            limit = state.get("limit")
+            max_bytes = state.get("max_bytes")
+
+        api_result = await fetch_execution_result(activity_id)
+
+        envelope = {
             "success": True,
             "activityId": activity_id,
             "queryTime": datetime.now().isoformat(),
-            "executionResult": api_result
-        }, ensure_ascii=False, indent=2)
+        }
+
+        if not (fields or page_path or limit or max_bytes or offset):
+            return json.dumps(dict(envelope, executionResult=api_result), ensure_ascii=False, indent=2)
+
+        rendered, _ = await asyncio.to_thread(
+            build_result_view, envelope, api_result, fields=fields, page_path=page_path,
+            offset=offset, limit=limit, max_bytes=max_bytes,
+            cursor_state={"activityId": activity_id}, default_page_path=DEFAULT_RESULT_PAGE_PATH,
+        )
+        return rendered
 
     except Exception as e:
         return json.dumps({
@@ -775,7 +983,7 @@ def get_playbooks_resource() -> str:
     """获取SOAR剧本资源"""
     audit_mcp_access(action="get_playbooks_resource", resource="soar://playbooks")
     try:
-        playbooks = db_manager.get_playbooks(limit=10)
+        playbooks = playbook_catalog.current.list(limit=10)
         return json.dumps([{
             "id": p.id, "name": p.name, "displayName": p.display_name,
             "category": p.playbook_category
@@ -784,21 +992,63 @@ def get_playbooks_resource() -> str:
         return json.dumps({"message": "剧本资源暂不可用"}, ensure_ascii=False, indent=2)
 
 
+async def _render_executions_page(page: int) -> str:
+    """渲染执行记录分页（按启动时间倒序）"""
+    page = max(1, page)
+    data = await async_db.get_executions(limit=EXECUTIONS_PAGE_SIZE, offset=(page - 1) * EXECUTIONS_PAGE_SIZE)
+    total_pages = max(1, -(-data["total"] // EXECUTIONS_PAGE_SIZE))
+    result = {
+        "page": page,
+        "pageSize": EXECUTIONS_PAGE_SIZE,
+        "total": data["total"],
+        "totalPages": total_pages,
+        "items": data["items"],
+    }
+    if page < total_pages:
+        result["nextPage"] = f"soar://executions/page/{page + 1}"
+    return json.dumps(result, ensure_ascii=False, indent=2)
+
+
 @mcp.resource("soar://executions")
-def get_executions_resource() -> str:
-    """获取执行活动资源"""
+async def get_executions_resource() -> str:
+    """获取执行活动资源（最新一页）"""
     audit_mcp_access(action="get_executions_resource", resource="soar://executions")
-    return json.dumps(list(EXECUTIONS.values()), ensure_ascii=False, indent=2)
+    return await _render_executions_page(1)
+
+
+@mcp.resource("soar://executions/page/{page}")
+async def get_executions_page_resource(page: int) -> str:
+    """获取执行活动资源（指定页）"""
+    audit_mcp_access(action="get_executions_resource", resource=f"soar://executions/page/{page}")
+    return await _render_executions_page(int(page))
 
 
 # ===== 启动同步 =====
 
+# 启动同步状态：pending / running / succeeded / failed / skipped
+initial_sync_state = {"state": "pending", "startedAt": None, "finishedAt": None, "error": None}
+
+
+def _set_initial_sync_state(state: str, error: Optional[str] = None):
+    initial_sync_state["state"] = state
+    initial_sync_state["error"] = error
+    if state == "running":
+        initial_sync_state["startedAt"] = datetime.now().isoformat()
+    elif state != "pending":
+        initial_sync_state["finishedAt"] = datetime.now().isoformat()
+
+
+# 同一进程内的剧本同步串行执行（启动同步与定时/配置变化触发的同步可能同时到来）
+sync_lock = threading.Lock()
+
+
 async def startup_sync():
     """服务器启动时执行初始同步"""
     try:
         skip_sync = os.getenv("SKIP_SYNC", "false").lower() == "true"
         if skip_sync:
             logger.sync_warning("跳过启动同步 (SKIP_SYNC=true)")
+            _set_initial_sync_state("skipped")
             return
 
         if config_manager.is_first_run():
@@ -806,47 +1056,231 @@ async def startup_sync():
             logger.info("=" * 60)
             logger.info("检测到首次运行，跳过数据同步")
             logger.info(f"缺少必需配置: {', '.join(missing_configs)}")
-            admin_port = int(os.getenv("ADMIN_PORT", str(int(os.getenv("MCP_PORT", os.getenv("SSE_PORT", "12345"))) + 1)))
-            logger.info(f"请访问管理后台完成SOAR服务配置: http://127.0.0.1:{admin_port}/admin")
+            port = int(os.getenv("MCP_PORT", os.getenv("SSE_PORT", "12345")))
+            logger.info(f"请访问管理后台完成SOAR服务配置: http://127.0.0.1:{port}/admin")
             logger.info("=" * 60)
+            _set_initial_sync_state("skipped")
+            return
+
+        if not leader_elector.is_leader:
+            logger.info("启动同步由后台任务主节点执行，当前 worker 跳过")
+            _set_initial_sync_state("skipped")
             return
 
         logger.sync_start("执行启动同步...")
+        _set_initial_sync_state("running")
         playbook_sync_service = PlaybookSyncService(db_manager)
-        playbook_result = await playbook_sync_service.full_sync()
+        with sync_lock:
+            playbook_result = await playbook_sync_service.full_sync()
 
         if "error" in playbook_result:
             logger.sync_warning(f"剧本同步失败: {playbook_result['error']}")
+            _set_initial_sync_state("failed", str(playbook_result["error"]))
         else:
             logger.sync_success("剧本同步完成!")
+            _set_initial_sync_state("succeeded")
 
     except Exception as e:
         logger.sync_error(f"启动同步异常: {e}")
+        _set_initial_sync_state("failed", str(e))
+
+
+def start_background_startup_sync() -> threading.Thread:
+    """在后台线程执行启动同步，服务使用数据库中已有的剧本目录立即开始响应"""
+    thread = threading.Thread(target=lambda: asyncio.run(startup_sync()), name="startup-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+def _parse_sync_time(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+        except ValueError:
+            return None
+    return None
+
+
+def readiness_report() -> Tuple[bool, dict]:
+    """服务就绪状态：剧本目录已加载即可提供服务，同时报告目录新鲜度与启动同步进度"""
+    sync_interval = config_manager.get("sync_interval", 14400)
+    report = {"initialSync": dict(initial_sync_state), "worker": {"pid": os.getpid(), **leader_elector.status()},
+              "cache": cache_backend.stats()}
+    if not playbook_catalog.loaded:
+        report.update({"ready": False, "catalog": None})
+        return False, report
+
+    catalog = playbook_catalog.current
+    synced_at = _parse_sync_time(config_manager.get("last_sync_time"))
+    if synced_at is None:
+        sync_times = [p.sync_time for p in catalog.by_id.values() if p.sync_time]
+        synced_at = max(sync_times) if sync_times else None
+    age = (datetime.now() - synced_at).total_seconds() if synced_at else None
+
+    report.update({
+        "ready": True,
+        "catalog": {
+            "version": catalog.version,
+            "builtAt": catalog.built_at.isoformat(),
+            "playbooks": len(catalog.by_id),
+            "enabledPlaybooks": len(catalog.enabled),
+            "lastSyncTime": synced_at.isoformat() if synced_at else None,
+            "ageSeconds": round(age, 1) if age is not None else None,
+            # 从未同步或超过一个同步周期未同步时视为过期
+            "stale": age is None or age > sync_interval,
+        },
+    })
+    return True, report
+
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def readiness(request: Request) -> JSONResponse:
+    """就绪检查（无需认证，只返回是否就绪）：剧本目录未加载时返回 503"""
+    ready = playbook_catalog.loaded
+    return JSONResponse({"ready": ready}, status_code=200 if ready else 503)
+
+
+@mcp.custom_route("/api/admin/ready", methods=["GET"])
+@jwt_required
+async def readiness_details(request: Request) -> JSONResponse:
+    """详细就绪报告（目录新鲜度、启动同步进度、worker 与缓存状态），需要管理员 JWT"""
+    ready, report = readiness_report()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
+
+# ===== 运行指标 =====
+
+class ToolMetricsMiddleware(Middleware):
+    """记录每个 MCP 工具调用的耗时与失败次数
+
+    工具名来自客户端请求，未注册的名称统一记为 "unknown"，避免任意名称产生无限多的指标序列
+    """
+
+    def __init__(self):
+        self._tool_names: Optional[frozenset] = None
+
+    async def _metric_tool_name(self, name: str) -> str:
+        if self._tool_names is None:
+            # 工具在模块导入时全部注册，首次调用时读取一次
+            self._tool_names = frozenset(tool.name for tool in await mcp.list_tools(run_middleware=False))
+        return name if name in self._tool_names else "unknown"
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        tool = await self._metric_tool_name(context.message.name)
+        started = time.perf_counter()
+        try:
+            result = await call_next(context)
+        except Exception:
+            tool_errors.inc(tool, "exception")
+            raise
+        finally:
+            tool_duration.observe(time.perf_counter() - started, tool)
+        if _is_error_result(result):
+            tool_errors.inc(tool, "error")
+        return result
+
+
+def _is_error_result(result) -> bool:
+    """工具以JSON返回错误（首个字段为 "error" 或 "success": false），只检查开头避免解析大结果"""
+    content = getattr(result, "content", None) or []
+    text = getattr(content[0], "text", "") if content else ""
+    head = text[:64]
+    return '"error":' in head or '"success": false' in head
+
+
+mcp.add_middleware(ToolMetricsMiddleware())
+
+
+def _db_pool_samples():
+    pool = db_manager.engine.pool
+    if hasattr(pool, "checkedout"):
+        yield ("checked_out",), pool.checkedout()
+        yield ("idle",), pool.checkedin()
+    yield ("executor_pending",), db_executor.stats()["pending"]
+    if db_manager.writer is not None:
+        yield ("writer_queued",), db_manager.writer.stats()["queued"]
+
+
+metrics_registry.gauge("soar_mcp_db_pool_connections",
+                       "数据库连接池与数据库线程状态（checked_out/idle 连接数，executor_pending 数据库线程池未完成的调用数、含后台写入，"
+                       "writer_queued 写线程队列长度）",
+                       ("state",), _db_pool_samples)
+
+
+# Prometheus 抓取 /metrics 使用的静态 Bearer Token；未设置时只接受管理员 JWT
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+async def _render_metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+_render_metrics_for_admin = jwt_required(_render_metrics)
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Prometheus 指标（当前进程），需要 Authorization: Bearer <METRICS_TOKEN> 或管理员 JWT"""
+    auth_header = request.headers.get("Authorization", "")
+    if METRICS_TOKEN and hmac.compare_digest(auth_header.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        return await _render_metrics(request)
+    return await _render_metrics_for_admin(request)
+
+
+# 管理后台页面与 API 挂载在同一 ASGI 应用上
+register_admin_routes(mcp, get_soar_client)
+
+
+# 影响剧本同步结果的配置项，变化后由主节点立即重新同步
+SYNC_CONFIG_KEYS = ("soar_api_url", "soar_api_token", "soar_labels", "soar_timeout")
 
 
 class PeriodicSyncService:
-    """定时同步服务"""
+    """定时同步服务（多 worker 部署时只在后台任务主节点上执行）"""
+
+    # 检查周期：其他 worker 修改的配置与主节点切换最迟在一个检查周期内生效
+    CHECK_INTERVAL = 5
 
     def __init__(self):
         self.sync_thread = None
         self.stop_event = None
+        self.wakeup_event = threading.Event()
+        self.sync_requested = threading.Event()
+        self._unsubscribers = []
 
     def start_periodic_sync(self):
         """启动定时同步服务"""
         try:
             self.stop_event = threading.Event()
-            self.sync_thread = threading.Thread(target=self._sync_worker, daemon=True)
+            # 同步周期修改或主节点切换后立即唤醒工作线程，无需等待下一次检查
+            self._unsubscribers = [
+                config_manager.subscribe(
+                    lambda changed, snapshot: self.wakeup_event.set(), keys=["sync_interval"]),
+                config_manager.subscribe(self._on_sync_config_change, keys=SYNC_CONFIG_KEYS),
+                leader_elector.subscribe(lambda is_leader: self.wakeup_event.set()),
+            ]
+            self.sync_thread = threading.Thread(target=self._sync_worker, name="periodic-sync", daemon=True)
             self.sync_thread.start()
             logger.info("定时同步服务已启动")
         except Exception as e:
             logger.error(f"启动定时同步服务失败: {e}")
 
+    def _on_sync_config_change(self, changed, snapshot):
+        """SOAR 连接或标签配置变化后请求立即同步（任一 worker 修改，主节点都会在检查时感知）"""
+        logger.info(f"检测到影响同步的配置变化: {', '.join(sorted(changed))}")
+        self.sync_requested.set()
+        self.wakeup_event.set()
+
     def _sync_worker(self):
         """同步工作线程（使用持久化事件循环）"""
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
+        # 启动时刚执行过启动同步，从当前时间开始计时
         last_sync_time = time.time()
+        was_leader = leader_elector.is_leader
         current_interval = None
 
         try:
@@ -858,21 +1292,40 @@ class PeriodicSyncService:
                         current_interval = sync_interval
                         logger.info(f"同步周期: {sync_interval}秒 ({sync_interval // 3600}小时)")
 
-                    current_time = time.time()
-                    if current_time - last_sync_time >= sync_interval:
-                        logger.sync_start("执行定时同步...")
-                        loop.run_until_complete(self._perform_sync())
-                        last_sync_time = current_time
+                    is_leader = leader_elector.is_leader
+                    if is_leader and not was_leader:
+                        # 接管主节点后按数据库记录的最后同步时间继续计时
+                        synced_at = _parse_sync_time(config_manager.get("last_sync_time"))
+                        last_sync_time = synced_at.timestamp() if synced_at else 0
+                    was_leader = is_leader
+
+                    if not is_leader:
+                        # 配置变化触发的同步同样由主节点执行
+                        self.sync_requested.clear()
+                    elif self.sync_requested.is_set() or time.time() - last_sync_time >= sync_interval:
+                        if self.sync_requested.is_set():
+                            logger.sync_start("配置变化触发立即同步...")
+                        else:
+                            logger.sync_start("执行定时同步...")
+                        self.sync_requested.clear()
+                        with sync_lock:
+                            loop.run_until_complete(self._perform_sync())
+                        last_sync_time = time.time()
                         logger.info(f"下次同步将在 {sync_interval} 秒后执行")
 
-                    self.stop_event.wait(timeout=60)
+                    self._wait(self.CHECK_INTERVAL)
 
                 except Exception as e:
                     logger.sync_error(f"定时同步异常: {e}")
-                    self.stop_event.wait(timeout=60)
+                    self._wait(self.CHECK_INTERVAL)
         finally:
             loop.close()
 
+    def _wait(self, timeout: float):
+        """等待下一次检查，停止或配置变化时提前返回"""
+        self.wakeup_event.wait(timeout=timeout)
+        self.wakeup_event.clear()
+
     async def _perform_sync(self):
         """执行同步操作"""
         try:
@@ -892,8 +1345,12 @@ class PeriodicSyncService:
 
     def stop(self):
         """停止定时同步服务"""
+        for unsubscribe in self._unsubscribers:
+            unsubscribe()
+        self._unsubscribers = []
         if self.stop_event:
             self.stop_event.set()
+            self.wakeup_event.set()
         if self.sync_thread and self.sync_thread.is_alive():
             self.sync_thread.join(timeout=5)
         logger.info("定时同步服务已停止")
@@ -902,44 +1359,91 @@ class PeriodicSyncService:
 periodic_sync_service = PeriodicSyncService()
 
 
+# ===== 进程初始化 =====
+
+def start_worker_services():
+    """启动当前进程的服务组件（单进程模式在主进程调用，多 worker 模式在每个 worker 中调用）"""
+    configure_tracing()
+    db_manager.start_writer()
+
+    # 先用数据库中已有的剧本目录提供服务，初始同步在后台进行
+    logger.info("加载剧本目录...")
+    playbook_catalog.rebuild()
+    playbook_catalog.start_watcher()
+    # 配置版本号在后台线程中检查，事件循环中读取配置不访问数据库
+    config_manager.start_watcher()
+
+    # 只有后台任务主节点执行启动同步与定时同步
+    logger.info("参与后台任务主节点选举...")
+    leader_elector.start()
+
+    logger.info("启动后台同步任务...")
+    start_background_startup_sync()
+
+    logger.info("启动定时同步服务...")
+    periodic_sync_service.start_periodic_sync()
+
+
+def stop_worker_services():
+    """停止当前进程的服务组件，主节点释放租约以便其他 worker 立即接管"""
+    periodic_sync_service.stop()
+    playbook_catalog.stop_watcher()
+    config_manager.stop_watcher()
+    leader_elector.stop()
+    db_manager.stop_writer()
+    shutdown_tracing()
+
+
+def create_worker_app():
+    """多 worker 模式下 uvicorn 每个 worker 进程的应用工厂，服务组件随应用生命周期启停"""
+    app = mcp.http_app(path="/mcp", transport="streamable-http", stateless_http=True)
+    mcp_lifespan = app.router.lifespan_context
+
+    # worker 由 multiprocessing 启动，退出时不会执行 atexit，需在应用关闭阶段释放租约并停止写线程
+    @asynccontextmanager
+    async def worker_lifespan(asgi_app):
+        config_manager.init()
+        start_worker_services()
+        try:
+            async with mcp_lifespan(asgi_app) as state:
+                yield state
+        finally:
+            stop_worker_services()
+            await cache_backend.close()
+
+    app.router.lifespan_context = worker_lifespan
+    return app
+
+
 # ===== 入口点 =====
 
 if __name__ == "__main__":
     port = int(os.getenv("MCP_PORT", os.getenv("SSE_PORT", "12345")))
-    admin_port = int(os.getenv("ADMIN_PORT", str(port + 1)))
     bind_host = os.getenv("BIND_HOST", "127.0.0.1")
+    # worker 进程数：大于 1 时由 uvicorn 启动多个 worker 共享同一个 SQLite 数据库
+    workers = int(os.getenv("MCP_WORKERS", "1"))
 
     logger.server_info(f"启动 SOAR MCP 服务器 v{__version__}")
     logger.info(f"📊 MCP服务: http://{bind_host}:{port}/mcp")
-    logger.info(f"🎛️  管理后台: http://{bind_host}:{admin_port}/admin")
+    logger.info(f"🎛️  管理后台: http://{bind_host}:{port}/admin")
 
     # 初始化
     logger.database_info("初始化数据库...")
     db_manager.init_db()
+    if workers > 1:
+        db_manager.enable_wal()
 
     logger.info("初始化系统配置...")
     config_manager.init()
 
     logger.info("初始化认证系统...")
-    from auth_utils import create_auth_manager
-    auth_manager = create_auth_manager()
-    admin_password = auth_manager.init_admin_password()
-    admin_app.auth_manager = auth_manager
-
-    # 同步
-    logger.info("启动同步任务...")
-    asyncio.run(startup_sync())
+    admin_password = get_auth_manager().init_admin_password()
 
-    logger.info("启动定时同步服务...")
-    periodic_sync_service.start_periodic_sync()
-
-    # 启动管理后台
-    logger.info(f"启动管理后台服务器 ({bind_host}:{admin_port})...")
-    admin_thread = Thread(target=start_admin_server, args=(admin_port, bind_host), daemon=True)
-    admin_thread.start()
+    if workers == 1:
+        start_worker_services()
 
     # 启动 MCP 服务器
-    logger.server_info("启动MCP服务器...")
+    logger.server_info("启动MCP服务器..." if workers == 1 else f"启动MCP服务器 ({workers} 个 worker)...")
 
     try:
         def print_startup_info():
@@ -950,7 +1454,7 @@ if __name__ == "__main__":
             logger.info(f"📊 MCP服务: http://{bind_host}:{port}/mcp")
             logger.info(f"   认证方式1: Authorization: Bearer <token> (推荐)")
             logger.info(f"   认证方式2: http://{bind_host}:{port}/mcp?token=<token> (兼容)")
-            logger.info(f"🎛️  管理后台: http://{bind_host}:{admin_port}/admin")
+            logger.info(f"🎛️  管理后台: http://{bind_host}:{port}/admin")
             logger.info("=" * 80)
             if admin_password:
                 print(f"\n{'=' * 60}")
@@ -964,12 +1468,26 @@ if __name__ == "__main__":
         startup_thread.start()
 
         logger.info("🔐 认证系统已就绪")
-        mcp.run(
-            transport="streamable-http",
-            host=bind_host,
-            port=port,
-            stateless_http=True,
-            path="/mcp",
-        )
+        if workers > 1:
+            import uvicorn
+            uvicorn.run(
+                "soar_mcp_server:create_worker_app",
+                factory=True,
+                host=bind_host,
+                port=port,
+                workers=workers,
+                timeout_graceful_shutdown=2,
+            )
+        else:
+            mcp.run(
+                transport="streamable-http",
+                host=bind_host,
+                port=port,
+                stateless_http=True,
+                path="/mcp",
+            )
     except KeyboardInterrupt:
         logger.info("服务器已停止")
+    finally:
+        if workers == 1:
+            stop_worker_services()
@@ -94,11 +94,6 @@ if lsof -i :12345 &> /dev/null; then
     print_info "您可能需要停止其他服务或修改端口"
 fi
 
-if lsof -i :12346 &> /dev/null; then
-    print_warning "端口 12346 已被占用"
-    print_info "您可能需要停止其他服务或修改端口"
-fi
-
 # 清除代理环境变量（避免连接问题）
 unset https_proxy http_proxy HTTPS_PROXY HTTP_PROXY
 
@@ -106,7 +101,7 @@ echo ""
 print_header "🎯 服务信息"
 echo "┌────────────────────────────────────────────────────────────────────────────────┐"
 echo "│  MCP 服务器: http://127.0.0.1:12345/mcp                                        │"
-echo "│  Web 管理后台: http://127.0.0.1:12346/admin                                     │"
+echo "│  Web 管理后台: http://127.0.0.1:12345/admin                                     │"
 echo "│  传输协议: Streamable HTTP                                                      │"
 echo "│  SSL 验证: 默认关闭（开箱即用）                                                  │"
 echo "└────────────────────────────────────────────────────────────────────────────────┘"
@@ -124,7 +119,7 @@ if [ "$DB_EXISTS" = false ]; then
     echo "│  🎯 下一步操作：                                                               │"
     echo "│     1. 等待服务启动完成                                                        │"
     echo "│     2. 记录控制台显示的管理员密码                                               │"
-    echo "│     3. 访问 http://127.0.0.1:12346/admin                                      │"
+    echo "│     3. 访问 http://127.0.0.1:12345/admin                                      │"
     echo "│     4. 使用密码登录并配置 SOAR 连接信息                                         │"
     echo "│     5. 在 MCP 客户端中添加服务器                                               │"
     echo "└────────────────────────────────────────────────────────────────────────────────┘"
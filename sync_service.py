@@ -18,6 +18,9 @@ import os
 from models import DatabaseManager, PlaybookData, PlaybookParam, AppData, ActionData, ActionParam, ActionResult
 from logger_config import logger
 from config_manager import config_manager
+from metrics import InstrumentedTransport, timed_sync
+from param_validator import param_validators
+from playbook_catalog import playbook_catalog
 
 # 加载环境变量
 load_dotenv()
@@ -61,7 +64,7 @@ class SOARAPIClient:
         
         self.client = httpx.AsyncClient(
             headers=self.headers,
-            verify=verify_setting,
+            transport=InstrumentedTransport("sync", verify=verify_setting),
             timeout=float(self.timeout)
         )
         
@@ -304,6 +307,7 @@ class PlaybookSyncService:
             "elapsed_time": elapsed_time
         }
     
+    @timed_sync("playbooks")
     async def full_sync(self) -> Dict[str, Any]:
         """执行完整同步"""
         try:
@@ -320,6 +324,10 @@ class PlaybookSyncService:
             
             # 批量同步
             sync_result = await self.sync_playbooks_batch(playbooks)
+
+            # 剧本数据可能已变化：丢弃已编译的参数校验器并重建剧本目录
+            param_validators.clear()
+            playbook_catalog.rebuild()
             
             # 获取同步统计
             stats = self.db_manager.get_sync_stats()
@@ -507,6 +515,7 @@ class AppsSyncService:
             "elapsed_time": elapsed_time
         }
     
+    @timed_sync("apps")
     async def full_sync(self) -> Dict[str, Any]:
         """执行完整同步"""
         try:
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+pytest 公共配置与共享 fixture
+
+导入项目模块前把全局数据库与日志目录指向临时目录，测试不会在仓库根目录创建
+soar_mcp.db 或写入 logs/
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+_TEST_DIR = tempfile.mkdtemp(prefix="soar-mcp-tests-")
+os.environ.setdefault("DB_PATH", os.path.join(_TEST_DIR, "soar_mcp.db"))
+os.environ.setdefault("LOG_DIR", os.path.join(_TEST_DIR, "logs"))
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _make_catalog_store(*playbooks):
+    """构造只包含指定剧本的目录；不传剧本时目录保持未加载状态"""
+    from playbook_catalog import PlaybookCatalog, PlaybookCatalogStore
+    store = PlaybookCatalogStore(None)
+    if playbooks:
+        store.replace(PlaybookCatalog.from_playbooks(playbooks))
+    return store
+
+
+@pytest.fixture(scope="class")
+def catalog_store(request):
+    """为 unittest 测试类提供 self.make_catalog_store(*playbooks)"""
+    request.cls.make_catalog_store = staticmethod(_make_catalog_store)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_TEST_DIR, ignore_errors=True)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准：在全新解释器中分阶段测量服务冷启动耗时
+（模块导入、数据库初始化、配置初始化、认证初始化、剧本目录加载），并按顶层模块拆分导入耗时
+
+使用方法:
+    python tests/scripts/startup_benchmark.py
+    python tests/scripts/startup_benchmark.py --runs 5 --top 15
+    python tests/scripts/startup_benchmark.py --json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+# 在子进程中执行的启动流程（与 soar_mcp_server 入口的初始化顺序一致）
+STAGE_SCRIPT = r"""
+import json, sys, time
+stages = {}
+t = time.perf_counter()
+import soar_mcp_server
+stages["import"] = time.perf_counter() - t
+
+t = time.perf_counter()
+soar_mcp_server.db_manager.init_db()
+soar_mcp_server.db_manager.start_writer()
+stages["db_init"] = time.perf_counter() - t
+
+t = time.perf_counter()
+soar_mcp_server.config_manager.init()
+stages["config_init"] = time.perf_counter() - t
+
+t = time.perf_counter()
+soar_mcp_server.get_auth_manager().init_admin_password()
+stages["auth_init"] = time.perf_counter() - t
+
+t = time.perf_counter()
+soar_mcp_server.playbook_catalog.rebuild()
+stages["catalog_load"] = time.perf_counter() - t
+
+soar_mcp_server.db_manager.stop_writer()
+print("STAGES=" + json.dumps(stages), file=sys.stdout)
+"""
+
+CRITICAL_STAGES = ["import", "db_init", "config_init", "auth_init", "catalog_load"]
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    解析 -X importtime 输出，返回 {模块: 累计耗时(秒)}
+
+    统计 soar_mcp_server 直接导入的模块，以及之后各启动阶段中新导入的顶层模块；
+    解释器自身启动时导入的模块不计入
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        raw_name = parts[2][1:]
+        level = (len(raw_name) - len(raw_name.lstrip(" "))) // 2
+        entries.append((level, raw_name.strip(), int(parts[1]) / 1e6))
+
+    # 输出为后序：子模块先于父模块输出，用栈还原层级关系
+    roots, pending = [], []
+    for level, name, cumulative in entries:
+        children = []
+        while pending and pending[-1][0] > level:
+            child = pending.pop()
+            if child[0] == level + 1:
+                children.append(child)
+        node = (level, name, cumulative, children)
+        if level == 0:
+            roots.append(node)
+        else:
+            pending.append(node)
+
+    totals = {}
+    started = False
+    for _, name, cumulative, children in roots:
+        if name == "soar_mcp_server":
+            started = True
+            for _, child_name, child_cumulative, _ in children:
+                totals[child_name] = child_cumulative
+        elif started:
+            totals[name] = cumulative
+    return totals
+
+
+def run_once() -> tuple:
+    """在临时目录中冷启动一次，返回 (阶段耗时, 模块导入耗时)"""
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, PYTHONPATH=str(PROJECT_ROOT), SKIP_SYNC="true")
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STAGE_SCRIPT],
+            cwd=workdir, env=env, capture_output=True, text=True, timeout=120,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"启动流程执行失败:\n{proc.stderr[-2000:]}")
+    stages_line = next(line for line in proc.stdout.splitlines() if line.startswith("STAGES="))
+    return json.loads(stages_line[len("STAGES="):]), parse_importtime(proc.stderr)
+
+
+def summarize(runs: list) -> dict:
+    """多次运行取中位数"""
+    stage_names = runs[0][0].keys()
+    stages = {name: statistics.median(r[0][name] for r in runs) for name in stage_names}
+    modules = defaultdict(list)
+    for _, imports in runs:
+        for name, seconds in imports.items():
+            modules[name].append(seconds)
+    return {
+        "runs": len(runs),
+        "stages": stages,
+        "critical_path": sum(stages[name] for name in CRITICAL_STAGES),
+        "imports": {name: statistics.median(values) for name, values in modules.items()},
+    }
+
+
+def print_report(summary: dict, top: int):
+    print(f"启动耗时（{summary['runs']} 次冷启动中位数）")
+    print("-" * 48)
+    for name, seconds in summary["stages"].items():
+        print(f"  {name:<24}{seconds * 1000:>10.1f} ms")
+    print("-" * 48)
+    print(f"  {'开始监听前合计':<20}{summary['critical_path'] * 1000:>12.1f} ms")
+    print()
+    print(f"导入耗时最高的 {top} 个顶层模块（累计）")
+    print("-" * 48)
+    ranked = sorted(summary["imports"].items(), key=lambda item: item[1], reverse=True)[:top]
+    for name, seconds in ranked:
+        print(f"  {name:<24}{seconds * 1000:>10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SOAR MCP 启动耗时基准")
+    parser.add_argument("--runs", type=int, default=3, help="冷启动次数，取中位数")
+    parser.add_argument("--top", type=int, default=10, help="显示导入耗时最高的模块数")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    args = parser.parse_args()
+
+    summary = summarize([run_once() for _ in range(max(1, args.runs))])
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_report(summary, args.top)
+
+
+if __name__ == "__main__":
+    main()
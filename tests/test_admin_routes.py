@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+管理后台路由测试（挂载在 MCP 服务的 ASGI 应用上）
+
+使用方法:
+    python tests/test_admin_routes.py
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin_server
+import auth_utils
+import soar_mcp_server
+from async_db import AsyncDatabaseManager, db_executor
+from auth_utils import AuthManager
+from models import DatabaseManager
+
+
+class TestAdminRoutes(unittest.TestCase):
+    """管理后台路由测试"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.temp_dir.name, "test.db"))
+        self.db.init_db()
+        self.auth_manager = AuthManager(jwt_secret_key="test-secret")
+        for target, name, value in (
+            (admin_server, "async_db", AsyncDatabaseManager(self.db, db_executor)),
+            (admin_server, "db_manager", self.db),
+            (auth_utils, "_auth_manager", self.auth_manager),
+        ):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.app = soar_mcp_server.mcp.http_app(path="/mcp")
+        self.jwt = self.auth_manager.generate_jwt({"user_type": "admin"})
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def request(self, method, url, authorized=True, **kwargs):
+        headers = {"Authorization": f"Bearer {self.jwt}"} if authorized else {}
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app),
+                                         base_url="http://test") as client:
+                return await client.request(method, url, headers=headers, **kwargs)
+        return asyncio.run(run())
+
+    def test_pages_served_on_mcp_app(self):
+        """测试管理页面与静态文件由 MCP 服务的应用提供"""
+        response = self.request("GET", "/admin", authorized=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("text/html", response.headers["content-type"])
+        self.assertEqual(self.request("GET", "/login", authorized=False).status_code, 200)
+        self.assertEqual(self.request("GET", "/static/logo.webp", authorized=False).status_code, 200)
+
+    def test_static_rejects_path_traversal(self):
+        """测试静态文件路径不能越出 static 目录"""
+        response = self.request("GET", "/static/..%2Fmodels.py", authorized=False)
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_requires_jwt(self):
+        """测试管理 API 需要 JWT"""
+        response = self.request("GET", "/api/admin/tokens", authorized=False)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["error"], "需要认证token")
+
+        self.jwt = "invalid"
+        self.assertEqual(self.request("GET", "/api/admin/tokens").status_code, 401)
+
+    def test_login(self):
+        """测试管理员登录签发 JWT"""
+        with patch.object(self.auth_manager, "verify_password", side_effect=lambda p: p == "secret"):
+            ok = self.request("POST", "/api/admin/login", authorized=False, json={"adminPassword": "secret"})
+            bad = self.request("POST", "/api/admin/login", authorized=False, json={"adminPassword": "wrong"})
+        self.assertEqual(ok.status_code, 200)
+        self.assertTrue(self.auth_manager.verify_jwt(ok.json()["jwt"]))
+        self.assertEqual(bad.status_code, 401)
+
+        missing = self.request("POST", "/api/admin/login", authorized=False, content=b"not json")
+        self.assertEqual(missing.status_code, 400)
+
+    def test_token_management(self):
+        """测试 Token 创建、列表、限速、启停与删除"""
+        created = self.request("POST", "/api/admin/tokens", json={"name": "ci"})
+        self.assertTrue(created.json()["success"])
+
+        tokens = self.request("GET", "/api/admin/tokens").json()["data"]
+        self.assertEqual([t["name"] for t in tokens], ["ci"])
+        token_id = tokens[0]["id"]
+
+        response = self.request("PUT", f"/api/admin/tokens/{token_id}/rate-limit", json={"execute_rate_limit": -1})
+        self.assertEqual(response.status_code, 400)
+        response = self.request("PUT", f"/api/admin/tokens/{token_id}/rate-limit", json={"execute_rate_limit": 5})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.request("POST", f"/api/admin/tokens/{token_id}/toggle", json={"is_active": False})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.db.get_user_tokens()[0]["is_active"])
+
+        self.assertEqual(self.request("DELETE", f"/api/admin/tokens/{token_id}").status_code, 200)
+        self.assertEqual(self.request("DELETE", f"/api/admin/tokens/{token_id}").status_code, 404)
+
+    def test_stats(self):
+        """测试系统统计"""
+        response = self.request("GET", "/api/admin/stats")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["stats"]["total_playbooks"], 0)
+
+
+class TestConnectionRoute(unittest.TestCase):
+    """连接测试路由：异步执行并复用共享 HTTP 客户端"""
+
+    CONFIG = {"soar_api_url": "https://soar.example.com", "soar_api_token": "tok", "soar_timeout": 5}
+
+    def setUp(self):
+        patcher = patch.object(auth_utils, "_auth_manager", AuthManager(jwt_secret_key="test-secret"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.jwt = auth_utils._auth_manager.generate_jwt({"user_type": "admin"})
+        self.app = soar_mcp_server.mcp.http_app(path="/mcp")
+        self.requests = []
+
+    def use_shared_client(self, handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        patcher = patch.object(soar_mcp_server, "_soar_http_client", client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return client
+
+    def test_uses_shared_client(self):
+        """测试连接测试通过共享客户端发出请求"""
+        def handler(request):
+            self.requests.append(request)
+            return httpx.Response(200, json={"code": 200, "result": [1, 2]})
+        self.use_shared_client(handler)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://test") as client:
+                return await client.post("/api/admin/config/test", json=self.CONFIG,
+                                         headers={"Authorization": f"Bearer {self.jwt}"})
+        response = asyncio.run(run())
+
+        self.assertEqual(response.json()["data"], {
+            "success": True, "message": "连接成功", "response_code": 200, "api_code": 200, "data_count": 2})
+        self.assertEqual(str(self.requests[0].url), "https://soar.example.com/odp/core/v1/api/playbook/findAll")
+        self.assertEqual(self.requests[0].headers["hg-token"], "tok")
+
+    def test_slow_backend_does_not_block_other_requests(self):
+        """测试 SOAR 后端缓慢时，其他请求照常响应"""
+        async def handler(request):
+            await asyncio.sleep(0.5)
+            return httpx.Response(200, json={"code": 200, "result": []})
+        self.use_shared_client(handler)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://test") as client:
+                slow = asyncio.ensure_future(client.post(
+                    "/api/admin/config/test", json=self.CONFIG, headers={"Authorization": f"Bearer {self.jwt}"}))
+                await asyncio.sleep(0.05)
+                started = time.perf_counter()
+                await client.get("/admin")
+                elapsed = time.perf_counter() - started
+                await slow
+                return elapsed
+
+        self.assertLess(asyncio.run(run()), 0.3)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+数据库异步访问测试：长写事务持锁期间事件循环保持响应
+
+使用方法:
+    python tests/test_async_db.py
+"""
+
+import sys
+import os
+import time
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_db import AsyncDatabaseManager, DatabaseExecutor
+from models import DatabaseManager
+
+# 模拟的长写事务持锁时长（秒）
+LOCK_HOLD_SECONDS = 0.5
+
+
+class SlowWriter:
+    """在另一连接中开启排他事务并持锁一段时间"""
+
+    def __init__(self, db_path: str, hold: float = LOCK_HOLD_SECONDS):
+        self.db_path = db_path
+        self.hold = hold
+        self.locked = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("BEGIN EXCLUSIVE")
+        self.locked.set()
+        time.sleep(self.hold)
+        conn.execute("COMMIT")
+        conn.close()
+
+    def __enter__(self):
+        self.thread.start()
+        self.locked.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self.thread.join()
+
+
+async def max_loop_stall(operation) -> tuple:
+    """执行操作期间持续测量事件循环的最大停顿，返回 (操作结果, 最大停顿秒数, 操作耗时)"""
+    task = asyncio.ensure_future(operation)
+    started = time.perf_counter()
+    worst = 0.0
+    while not task.done():
+        before = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - before - 0.01)
+    return task.result(), worst, time.perf_counter() - started
+
+
+class AsyncDbTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "test.db")
+        self.db = DatabaseManager(self.db_path)
+        self.db.init_db()
+        self.token = self.db.create_user_token("loop-test")
+        self.executor = DatabaseExecutor(max_workers=2)
+        self.async_db = AsyncDatabaseManager(self.db, self.executor)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.db.engine.dispose()
+        self.temp_dir.cleanup()
+
+
+class TestEventLoopResponsiveness(AsyncDbTestCase):
+    """事件循环响应性测试"""
+
+    def test_write_waiting_on_lock_does_not_stall_loop(self):
+        """测试写操作等待SQLite锁期间事件循环不被阻塞"""
+        with SlowWriter(self.db_path):
+            result, stall, elapsed = asyncio.run(max_loop_stall(self.async_db.verify_token(self.token)))
+
+        self.assertTrue(result)
+        self.assertGreaterEqual(elapsed, LOCK_HOLD_SECONDS * 0.8)
+        self.assertLess(stall, 0.1)
+
+    def test_token_verification_does_not_stall_loop(self):
+        """测试认证时的Token查询与使用统计更新不阻塞事件循环"""
+        import auth_provider
+
+        provider = auth_provider.SOARAuthProvider()
+        with patch.object(auth_provider, "db_manager", self.db), \
+                patch.object(auth_provider, "db_executor", self.executor), \
+                SlowWriter(self.db_path):
+            access, stall, elapsed = asyncio.run(max_loop_stall(provider.verify_token(self.token)))
+
+        self.assertIsNotNone(access)
+        self.assertGreaterEqual(elapsed, LOCK_HOLD_SECONDS * 0.8)
+        self.assertLess(stall, 0.1)
+
+    def test_audit_logging_returns_immediately(self):
+        """测试审计日志写入不等待数据库锁"""
+        import soar_mcp_server
+
+        with patch.object(soar_mcp_server, "db_manager", self.db), \
+                patch.object(soar_mcp_server, "db_executor", self.executor), \
+                SlowWriter(self.db_path):
+            started = time.perf_counter()
+            soar_mcp_server.audit_mcp_access(action="unit_test", resource="soar://test")
+            self.assertLess(time.perf_counter() - started, 0.1)
+            self.executor.shutdown(wait=True)
+
+        self.assertEqual(len(self.db.get_audit_logs(action="unit_test")), 1)
+
+
+class TestAsyncDatabaseManager(AsyncDbTestCase):
+    """异步门面测试"""
+
+    def test_methods_run_in_db_threads(self):
+        """测试方法在数据库线程中执行并返回结果"""
+        seen = []
+
+        def current_thread_name():
+            seen.append(threading.current_thread().name)
+            return self.db.get_token_by_value(self.token)
+
+        async def run():
+            via_facade = await self.async_db.get_token_by_value(self.token)
+            via_run = await self.executor.run(current_thread_name)
+            return via_facade, via_run
+
+        via_facade, via_run = asyncio.run(run())
+        self.assertEqual(via_facade["name"], "loop-test")
+        self.assertEqual(via_run["id"], via_facade["id"])
+        self.assertTrue(seen[0].startswith("db"))
+        self.assertEqual(self.executor.stats()["pending"], 0)
+
+    def test_pending_counts_submitted_work(self):
+        """测试不等待结果的提交同样计入 pending，完成后归零"""
+        release = threading.Event()
+        self.executor.submit(release.wait, 5)
+        self.assertEqual(self.executor.stats()["pending"], 1)
+        release.set()
+        self.executor.shutdown(wait=True)
+        self.assertEqual(self.executor.stats()["pending"], 0)
+
+    def test_non_callable_attribute_rejected(self):
+        """测试非方法属性不通过门面暴露"""
+        with self.assertRaises(AttributeError):
+            self.async_db.db_path
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
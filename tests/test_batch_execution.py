@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+批量执行与多活动状态查询工具测试
+
+使用方法:
+    python tests/test_batch_execution.py
+"""
+
+import sys
+import os
+import json
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import soar_mcp_server
+
+
+@pytest.mark.usefixtures("catalog_store")
+class TestExecutePlaybooksBatch(unittest.TestCase):
+    """execute_playbooks_batch 单元测试"""
+
+    def setUp(self):
+        self.running = 0
+        self.max_running = 0
+        self.audit_patch = patch.object(soar_mcp_server, "audit_mcp_access")
+        self.audit_patch.start()
+
+    def tearDown(self):
+        self.audit_patch.stop()
+
+    async def fake_launch(self, playbook_id, parameters=None, event_id=0):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.02)
+            if str(playbook_id) == "404":
+                raise soar_mcp_server.PlaybookNotFoundError(f"未找到剧本 ID: {playbook_id}")
+            return f"act-{parameters['ip']}"
+        finally:
+            self.running -= 1
+
+    def test_launch_respects_concurrency_limit(self):
+        """测试并发启动数不超过 max_concurrency，并返回所有活动ID"""
+        items = [{"playbook_id": 1, "parameters": {"ip": f"10.0.0.{i}"}} for i in range(12)]
+
+        with patch.object(soar_mcp_server, "launch_playbook", self.fake_launch):
+            result = json.loads(asyncio.run(
+                soar_mcp_server.execute_playbooks_batch(items, max_concurrency=3)))
+
+        self.assertEqual(result["launched"], 12)
+        self.assertLessEqual(self.max_running, 3)
+        self.assertEqual(result["results"][5]["activity_id"], "act-10.0.0.5")
+
+    def test_per_item_errors(self):
+        """测试单个条目失败不影响其他条目"""
+        items = [
+            {"playbook_id": 1, "parameters": {"ip": "1.1.1.1"}},
+            {"playbook_id": 404, "parameters": {"ip": "2.2.2.2"}},
+            {"parameters": {"ip": "3.3.3.3"}},
+        ]
+
+        with patch.object(soar_mcp_server, "launch_playbook", self.fake_launch):
+            result = json.loads(asyncio.run(soar_mcp_server.execute_playbooks_batch(items)))
+
+        self.assertEqual(result["launched"], 1)
+        self.assertEqual(result["failed"], 2)
+        self.assertIn("未找到剧本", result["results"][1]["error"])
+        self.assertIn("playbook_id", result["results"][2]["error"])
+
+    def test_too_many_items_rejected(self):
+        """测试条目数超过上限时直接拒绝"""
+        items = [{"playbook_id": 1}] * (soar_mcp_server.BATCH_MAX_ITEMS + 1)
+        result = json.loads(asyncio.run(soar_mcp_server.execute_playbooks_batch(items)))
+        self.assertFalse(result["success"])
+
+    def test_wait_for_completion(self):
+        """测试等待全部执行进入终态"""
+        polls = {}
+
+        async def fake_status(activity_id):
+            polls[activity_id] = polls.get(activity_id, 0) + 1
+            return {"executeStatus": "SUCCESS" if polls[activity_id] >= 2 else "RUNNING"}
+
+        items = [{"playbook_id": 1, "parameters": {"ip": f"10.0.1.{i}"}} for i in range(3)]
+        with patch.object(soar_mcp_server, "launch_playbook", self.fake_launch), \
+                patch.object(soar_mcp_server, "fetch_execution_status", fake_status), \
+                patch.object(soar_mcp_server, "BATCH_POLL_INTERVAL", 0.01):
+            result = json.loads(asyncio.run(soar_mcp_server.execute_playbooks_batch(
+                items, wait_for_completion=True, wait_timeout=5)))
+
+        self.assertTrue(result["allCompleted"])
+        self.assertTrue(all(r["status"] == "SUCCESS" for r in result["results"]))
+
+    def test_batch_goes_through_dispatcher(self):
+        """测试启用执行调度时批量条目同样受在途上限约束，超出的条目排队"""
+        from execution_dispatcher import TICKET_LAUNCHED, ExecutionDispatcher
+        from models import PlaybookData
+
+        async def never_finished(activity_id):
+            return {"executeStatus": "RUNNING"}
+
+        store = self.make_catalog_store(PlaybookData(id=1, name="pb"))
+        dispatcher = ExecutionDispatcher(never_finished, poll_interval=60)
+        config = {"dispatcher_max_inflight": 2}
+        items = [{"playbook_id": 1, "parameters": {"ip": f"10.0.2.{i}"}} for i in range(5)]
+
+        async def run():
+            result = json.loads(await soar_mcp_server.execute_playbooks_batch(items, max_concurrency=5))
+            dispatcher.release(result["results"][0]["activity_id"])
+            await asyncio.sleep(0.05)
+            return result
+
+        with patch.object(soar_mcp_server, "launch_playbook", self.fake_launch), \
+                patch.object(soar_mcp_server, "execution_dispatcher", dispatcher), \
+                patch.object(soar_mcp_server, "playbook_catalog", store), \
+                patch.object(soar_mcp_server.config_manager, "get",
+                             side_effect=lambda key, default=None: config.get(key, default)):
+            result = asyncio.run(run())
+
+        self.assertEqual(result["launched"], 2)
+        self.assertEqual(result["queued"], 3)
+        self.assertEqual(result["failed"], 0)
+        ticket = dispatcher.get_ticket(result["results"][2]["ticketId"])
+        self.assertEqual(ticket.state, TICKET_LAUNCHED)
+        self.assertEqual(dispatcher.stats()["inflight"], 2)
+
+
+class TestQueryExecutionStatuses(unittest.TestCase):
+    """query_execution_statuses 单元测试"""
+
+    def setUp(self):
+        self.audit_patch = patch.object(soar_mcp_server, "audit_mcp_access")
+        self.audit_patch.start()
+
+    def tearDown(self):
+        self.audit_patch.stop()
+
+    def test_statuses_table(self):
+        """测试返回紧凑状态表与错误列表"""
+        async def fake_status(activity_id):
+            if activity_id == "bad":
+                raise Exception("API调用失败: 500")
+            status = "SUCCESS" if activity_id.endswith("0") else "RUNNING"
+            return {"executeStatus": status, "executorInstanceName": "P_IP_INFO_ENRICH"}
+
+        ids = [f"act-{i}" for i in range(5)] + ["bad", "act-0"]
+        with patch.object(soar_mcp_server, "fetch_execution_status", fake_status):
+            result = json.loads(asyncio.run(soar_mcp_server.query_execution_statuses(ids)))
+
+        self.assertEqual(result["total"], 6)  # 重复ID去重
+        self.assertEqual(result["summary"], {"SUCCESS": 1, "RUNNING": 4})
+        self.assertEqual(result["rows"][0][:2], ["act-0", "SUCCESS"])
+        self.assertIn("bad", result["errors"])
+        self.assertFalse(result["allCompleted"])
+
+    def test_concurrency_is_capped(self):
+        """测试并发查询数受上限约束"""
+        state = {"running": 0, "max": 0}
+
+        async def fake_status(activity_id):
+            state["running"] += 1
+            state["max"] = max(state["max"], state["running"])
+            await asyncio.sleep(0.01)
+            state["running"] -= 1
+            return {"executeStatus": "SUCCESS"}
+
+        ids = [f"act-{i}" for i in range(50)]
+        with patch.object(soar_mcp_server, "fetch_execution_status", fake_status):
+            result = json.loads(asyncio.run(soar_mcp_server.query_execution_statuses(ids)))
+
+        self.assertTrue(result["allCompleted"])
+        self.assertLessEqual(state["max"], soar_mcp_server.STATUS_QUERY_CONCURRENCY)
+
+    def test_empty_ids_rejected(self):
+        """测试空列表被拒绝"""
+        result = json.loads(asyncio.run(soar_mcp_server.query_execution_statuses([])))
+        self.assertFalse(result["success"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -147,17 +147,18 @@ class TestSOARAuthProviderUnit(unittest.TestCase):
         middleware = provider.get_middleware()
 
         self.assertIsInstance(middleware, list)
-        self.assertEqual(len(middleware), 2)  # AuthenticationMiddleware + AuthContextMiddleware
+        self.assertEqual(len(middleware), 3)  # TracingMiddleware + AuthenticationMiddleware + AuthContextMiddleware
 
 
 class TestBearerOrQueryAuthBackendUnit(unittest.TestCase):
     """BearerOrQueryAuthBackend 单元测试"""
 
-    def _make_mock_conn(self, headers=None, query_params=None):
+    def _make_mock_conn(self, headers=None, query_params=None, path="/mcp"):
         """创建模拟的HTTP连接"""
         conn = MagicMock()
         conn.headers = headers or {}
         conn.query_params = query_params or {}
+        conn.url.path = path
         return conn
 
     @patch("auth_provider.db_manager")
@@ -282,6 +283,17 @@ class TestBearerOrQueryAuthBackendUnit(unittest.TestCase):
         result = asyncio.run(backend.authenticate(conn))
         self.assertIsNone(result)
 
+    @patch("auth_provider.db_manager")
+    def test_admin_paths_skip_token_lookup(self, mock_db_manager):
+        """测试管理后台请求携带的管理员JWT不作为MCP Token查询"""
+        from auth_provider import BearerOrQueryAuthBackend, SOARAuthProvider
+
+        backend = BearerOrQueryAuthBackend(SOARAuthProvider())
+        for path in ("/api/admin/stats", "/admin", "/login", "/static/app.js"):
+            conn = self._make_mock_conn(headers={"authorization": "Bearer admin.jwt.value"}, path=path)
+            self.assertIsNone(asyncio.run(backend.authenticate(conn)))
+        mock_db_manager.get_token_by_value.assert_not_called()
+
     @patch("auth_provider.db_manager")
     def test_case_insensitive_bearer(self, mock_db_manager):
         """测试 Authorization 头大小写不敏感"""
@@ -564,7 +576,7 @@ def main():
     parser = argparse.ArgumentParser(description="Bearer Token 认证测试套件")
     parser.add_argument("--host", default="127.0.0.1", help="MCP Server 地址 (默认 127.0.0.1)")
     parser.add_argument("--port", type=int, default=12345, help="MCP Server 端口 (默认 12345)")
-    parser.add_argument("--admin-port", type=int, default=12346, help="Admin 端口 (默认 12346)")
+    parser.add_argument("--admin-port", type=int, default=None, help="Admin 端口 (默认与 MCP 端口相同)")
     parser.add_argument("--token", default=None, help="用于测试的有效Token")
     parser.add_argument("--unit-only", action="store_true", help="只运行单元测试（不需要服务器）")
 
@@ -590,7 +602,7 @@ def main():
     integration = TestBearerAuthIntegration(
         host=args.host,
         port=args.port,
-        admin_port=args.admin_port,
+        admin_port=args.admin_port or args.port,
         token=args.token,
     )
     integration.run_all()
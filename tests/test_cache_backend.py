@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+共享缓存后端测试（Redis 协议后端使用进程内的 FakeRedis 模拟多个节点共享同一实例）
+
+使用方法:
+    python tests/test_cache_backend.py
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth_provider
+from cache_backend import (
+    TOKEN_BUCKET_SCRIPT, CacheLockTimeout, LocalCacheBackend, RedisCacheBackend, create_cache_backend,
+    reserve_token_bucket
+)
+from execution_cache import IdempotencyConflictError, IdempotencyInProgressError, IdempotencyStore, StatusCache
+from rate_limiter import RateLimitExceeded, RateLimiter
+
+
+class FakeRedis:
+    """实现 redis.asyncio 客户端所用子集的内存模拟"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.data = {}
+
+    def _alive(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and self.clock() >= entry[1]:
+            del self.data[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        entry = self._alive(key)
+        return entry[0] if entry else None
+
+    async def set(self, key, value, px=None, nx=False):
+        if nx and self._alive(key):
+            return None
+        self.data[key] = (value.encode() if isinstance(value, str) else value,
+                          self.clock() + px / 1000 if px else None)
+        return True
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def lock(self, name, timeout=None, blocking_timeout=None):
+        return FakeLock(self, name, timeout, blocking_timeout)
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        """只支持令牌桶脚本，以等价的 Python 实现模拟服务端原子执行"""
+        assert script == TOKEN_BUCKET_SCRIPT and numkeys == 1
+        key, *args = keys_and_args
+        entry = self._alive(key)
+        admitted, wait, state = reserve_token_bucket(entry[0] if entry else None, *map(float, args))
+        if admitted:
+            rate, capacity = float(args[0]), float(args[1])
+            self.data[key] = (state, self.clock() + max(0.0, capacity - state["tokens"]) / rate + 1)
+        return [int(admitted), str(wait).encode()]
+
+    async def aclose(self):
+        pass
+
+
+class FakeLock:
+    def __init__(self, redis, name, timeout, blocking_timeout):
+        self.redis, self.name = redis, name
+        self.timeout, self.blocking_timeout = timeout, blocking_timeout
+        self.token = object()
+
+    async def acquire(self):
+        deadline = time.monotonic() + (self.blocking_timeout or 0)
+        while not await self.redis.set(self.name, self.token, px=int(self.timeout * 1000), nx=True):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    async def release(self):
+        entry = self.redis._alive(self.name)
+        if entry is None or entry[0] is not self.token:
+            raise RuntimeError("锁已过期")
+        await self.redis.delete(self.name)
+
+
+class BrokenRedis(FakeRedis):
+    """所有操作都失败的 Redis"""
+
+    async def get(self, key):
+        raise ConnectionError("connection refused")
+
+    async def set(self, key, value, px=None, nx=False):
+        raise ConnectionError("connection refused")
+
+
+class TestLocalCacheBackend(unittest.TestCase):
+    """进程内缓存后端测试"""
+
+    def test_ttl_and_lru(self):
+        """测试过期与条目数上限"""
+        now = [0.0]
+        cache = LocalCacheBackend(max_entries=2, clock=lambda: now[0])
+
+        async def run():
+            await cache.set("a", {"v": 1}, ttl=5)
+            await cache.set("b", 2)
+            self.assertEqual(await cache.get("a"), {"v": 1})
+            await cache.set("c", 3)
+            self.assertIsNone(await cache.get("b"))
+            now[0] = 6.0
+            self.assertIsNone(await cache.get("a"))
+            self.assertEqual(await cache.get("c"), 3)
+            await cache.delete("c")
+            self.assertIsNone(await cache.get("c"))
+        asyncio.run(run())
+        self.assertFalse(cache.shared)
+
+    def test_lock_timeout(self):
+        """测试锁被占用时等待超时"""
+        cache = LocalCacheBackend()
+
+        async def run():
+            async with cache.lock("job"):
+                with self.assertRaises(CacheLockTimeout):
+                    async with cache.lock("job", timeout=0.05):
+                        pass
+            async with cache.lock("job", timeout=0.05):
+                pass
+        asyncio.run(run())
+
+    def test_local_backend_reserve_tokens(self):
+        """测试进程内后端的令牌桶预约与补充"""
+        now = [0.0]
+        cache = LocalCacheBackend(clock=lambda: now[0])
+
+        async def run():
+            results = [await cache.reserve_tokens("b", 1.0, 2.0, 1.0, 0.0, now[0]) for _ in range(3)]
+            now[0] = 1.0
+            results.append(await cache.reserve_tokens("b", 1.0, 2.0, 1.0, 0.0, now[0]))
+            return [admitted for admitted, _ in results]
+        self.assertEqual(asyncio.run(run()), [True, True, False, True])
+
+    def test_create_from_url(self):
+        """测试根据地址创建后端"""
+        self.assertIsInstance(create_cache_backend(None), LocalCacheBackend)
+        self.assertIsInstance(create_cache_backend("memory://"), LocalCacheBackend)
+        with self.assertRaises(ValueError):
+            create_cache_backend("memcached://localhost")
+
+
+class TestRedisCacheBackend(unittest.TestCase):
+    """Redis 协议后端测试"""
+
+    def test_shared_between_nodes(self):
+        """测试两个节点读写同一实例，值按 JSON 编码并带前缀与过期时间"""
+        now = [0.0]
+        redis = FakeRedis(clock=lambda: now[0])
+        a, b = RedisCacheBackend(client=redis), RedisCacheBackend(client=redis)
+
+        async def run():
+            await a.set("k", {"name": "剧本", "ids": [1, 2]}, ttl=2)
+            self.assertEqual(await b.get("k"), {"name": "剧本", "ids": [1, 2]})
+            self.assertIn("soar-mcp:k", redis.data)
+            now[0] = 3.0
+            self.assertIsNone(await b.get("k"))
+        asyncio.run(run())
+        self.assertTrue(a.shared)
+        self.assertEqual(b.stats()["hits"], 1)
+
+    def test_lock_excludes_other_nodes(self):
+        """测试一个节点持有锁时其他节点等待超时"""
+        redis = FakeRedis()
+        a, b = RedisCacheBackend(client=redis), RedisCacheBackend(client=redis)
+
+        async def run():
+            async with a.lock("job", ttl=5):
+                with self.assertRaises(CacheLockTimeout):
+                    async with b.lock("job", ttl=5, timeout=0.05):
+                        pass
+            async with b.lock("job", ttl=5, timeout=0.05):
+                pass
+        asyncio.run(run())
+
+    def test_errors_degrade_to_miss(self):
+        """测试后端故障时读取视为未命中、写入被忽略"""
+        backend = RedisCacheBackend(client=BrokenRedis())
+
+        async def run():
+            await backend.set("k", 1)
+            return await backend.get("k")
+        self.assertIsNone(asyncio.run(run()))
+        self.assertEqual(backend.stats()["errors"], 2)
+
+
+class TestSharedRateLimiter(unittest.TestCase):
+    """共享令牌桶测试"""
+
+    POLICY = {"rate_limit_execute_per_minute": 60, "rate_limit_execute_burst": 2, "rate_limit_max_wait": 0}
+
+    def make_limiter(self, backend, now):
+        return RateLimiter(policy_loader=lambda: dict(self.POLICY), clock=lambda: now[0],
+                           backend=backend, shared_clock=lambda: now[0])
+
+    def test_limit_enforced_across_nodes(self):
+        """测试两个节点共同执行同一Token的限额"""
+        now = [1000.0]
+        redis = FakeRedis()
+        a = self.make_limiter(RedisCacheBackend(client=redis), now)
+        b = self.make_limiter(RedisCacheBackend(client=redis), now)
+        token = {"id": 7}
+
+        async def run():
+            await a.acquire("execute", token)
+            await b.acquire("execute", token)
+            with self.assertRaises(RateLimitExceeded):
+                await a.acquire("execute", token)
+            now[0] += 1.0
+            await b.acquire("execute", token)
+        asyncio.run(run())
+        self.assertEqual(a.stats()["buckets"], 0)
+
+    def test_concurrent_reservations_are_atomic(self):
+        """测试两个节点并发申请时每次只执行一次原子预约，不使用分布式锁，准入数不超过突发容量"""
+        now = [1000.0]
+        redis = FakeRedis()
+        redis.lock = lambda *args, **kwargs: self.fail("共享限流不应使用分布式锁")
+        a = self.make_limiter(RedisCacheBackend(client=redis), now)
+        b = self.make_limiter(RedisCacheBackend(client=redis), now)
+        token = {"id": 7}
+
+        async def run():
+            results = await asyncio.gather(*(limiter.acquire("execute", token) for limiter in (a, b) * 3),
+                                           return_exceptions=True)
+            return [r for r in results if isinstance(r, RateLimitExceeded)]
+        self.assertEqual(len(asyncio.run(run())), 4)
+
+    def test_falls_back_to_local_bucket(self):
+        """测试共享后端不可用时回退到本节点令牌桶"""
+        now = [1000.0]
+        backend = RedisCacheBackend(client=FakeRedis())
+
+        async def unavailable(*args, **kwargs):
+            raise ConnectionError("connection refused")
+        backend._client.eval = unavailable
+        limiter = self.make_limiter(backend, now)
+
+        async def run():
+            for _ in range(2):
+                await limiter.acquire("execute", {"id": 7})
+            with self.assertRaises(RateLimitExceeded):
+                await limiter.acquire("execute", {"id": 7})
+        asyncio.run(run())
+        self.assertEqual(limiter.stats()["buckets"], 1)
+
+
+class TestSharedTokenCache(unittest.TestCase):
+    """Token 验证缓存测试"""
+
+    TOKEN_INFO = {"id": 3, "name": "ci", "token": "secret-token", "is_active": True, "expires_at": None}
+
+    @patch("auth_provider.db_manager")
+    def test_other_node_skips_database(self, mock_db_manager):
+        """测试一个节点验证过的Token，其他节点直接使用缓存；失效后重新查询数据库"""
+        mock_db_manager.get_token_by_value.return_value = dict(self.TOKEN_INFO)
+        mock_db_manager.verify_token.return_value = True
+        redis = FakeRedis()
+        a, b = (auth_provider.SOARAuthProvider(cache=RedisCacheBackend(client=redis)) for _ in range(2))
+
+        async def run():
+            self.assertEqual((await a.verify_token("secret-token")).client_id, "3")
+            self.assertEqual((await b.verify_token("secret-token")).client_id, "3")
+            self.assertEqual(mock_db_manager.get_token_by_value.call_count, 1)
+
+            await a.invalidate_token(3)
+            await b.verify_token("secret-token")
+            self.assertEqual(mock_db_manager.get_token_by_value.call_count, 2)
+        asyncio.run(run())
+        # 缓存中不保存 Token 明文
+        self.assertFalse(any(b"secret-token" in value for value, _ in redis.data.values()))
+
+    @patch("auth_provider.db_manager")
+    def test_expired_token_not_served_from_cache(self, mock_db_manager):
+        """测试缓存期间Token到期后不再通过验证"""
+        mock_db_manager.get_token_by_value.side_effect = [
+            dict(self.TOKEN_INFO, expires_at="2000-01-01T00:00:00"), None]
+        mock_db_manager.verify_token.return_value = True
+        provider = auth_provider.SOARAuthProvider()
+
+        async def run():
+            await provider._cache_token_info("secret-token", mock_db_manager.get_token_by_value("secret-token"),
+                                             await provider._current_token_version())
+            return await provider.verify_token("secret-token")
+        self.assertIsNone(asyncio.run(run()))
+
+    def test_local_cache_sees_other_worker_changes(self):
+        """测试本地缓存：另一 worker 进程停用Token后，版本号变化使本进程缓存失效"""
+        from models import DatabaseManager
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        db = DatabaseManager(os.path.join(temp_dir.name, "test.db"))
+        db.init_db()
+        self.addCleanup(db.engine.dispose)
+        token = db.create_user_token("ci")
+        token_id = db.get_token_by_value(token)["id"]
+        a, b = (auth_provider.SOARAuthProvider(cache=LocalCacheBackend(), version_check_interval=0)
+                for _ in range(2))
+
+        async def run():
+            with patch.object(auth_provider, "db_manager", db):
+                self.assertIsNotNone(await a.verify_token(token))
+                version = db.get_token_version()
+                # 使用统计的更新不改变版本号，缓存继续命中
+                with patch.object(db, "get_token_by_value", side_effect=AssertionError("应命中缓存")):
+                    self.assertIsNotNone(await a.verify_token(token))
+                self.assertEqual(db.get_token_version(), version)
+
+                # 管理后台请求由 worker b 处理，只能清除 b 的缓存
+                db.update_token_status(token_id, False)
+                await b.invalidate_token(token_id)
+                return await a.verify_token(token)
+        self.assertIsNone(asyncio.run(run()))
+
+
+class TestSharedExecutionState(unittest.TestCase):
+    """执行状态与幂等键共享测试"""
+
+    def test_status_read_from_other_node(self):
+        """测试其他节点写入的状态可直接读取并进入本地缓存"""
+        redis = FakeRedis()
+        a, b = (StatusCache(backend=RedisCacheBackend(client=redis)) for _ in range(2))
+
+        async def run():
+            await a.put_shared("act-1", "SUCCESS", {"executeStatus": "SUCCESS"})
+            self.assertIsNone(b.get("act-1"))
+            self.assertEqual(await b.get_shared("act-1"), {"executeStatus": "SUCCESS"})
+        asyncio.run(run())
+        self.assertEqual(b.get("act-1"), {"executeStatus": "SUCCESS"})
+
+    def test_local_backend_not_used_as_second_level(self):
+        """测试进程内后端不作为二级缓存"""
+        cache = StatusCache(backend=LocalCacheBackend())
+
+        async def run():
+            await cache.put_shared("act-1", "SUCCESS", {})
+            return await cache.get_shared("act-1")
+        self.assertIsNone(asyncio.run(run()))
+
+    def test_idempotency_key_shared(self):
+        """测试其他节点重复使用幂等键时返回首次结果，不再启动剧本"""
+        redis = FakeRedis()
+        a, b = (IdempotencyStore(backend=RedisCacheBackend(client=redis)) for _ in range(2))
+        calls = []
+
+        async def launch():
+            calls.append(1)
+            return "act-1"
+
+        async def run():
+            self.assertEqual(await a.run("u:key", "fp", launch), ("act-1", False))
+            self.assertEqual(await b.run("u:key", "fp", launch), ("act-1", True))
+            with self.assertRaises(IdempotencyConflictError):
+                await b.run("u:key", "other", launch)
+        asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+
+
+    def test_idempotency_lock_timeout_does_not_relaunch(self):
+        """测试其他节点持锁超过等待时间时返回"进行中"错误，不再次启动剧本；首次调用完成后返回其结果"""
+        redis = FakeRedis()
+        a, b = (IdempotencyStore(backend=RedisCacheBackend(client=redis), lock_timeout=0.05) for _ in range(2))
+        calls = []
+
+        async def run():
+            finish = asyncio.Event()
+
+            async def slow_launch():
+                calls.append(1)
+                await finish.wait()
+                return "act-1"
+
+            first = asyncio.ensure_future(a._call("u:key", "fp", slow_launch))
+            await asyncio.sleep(0)
+            with self.assertRaises(IdempotencyInProgressError):
+                await b._call("u:key", "fp", slow_launch)
+            finish.set()
+            self.assertEqual(await first, ("act-1", False))
+            self.assertEqual(await b._call("u:key", "fp", slow_launch), ("act-1", True))
+        asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
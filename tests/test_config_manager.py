@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+配置快照与变化订阅测试
+
+使用方法:
+    python tests/test_config_manager.py
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_manager as config_module
+from config_manager import ConfigManager
+from models import DatabaseManager
+
+
+class ConfigTestCase(unittest.TestCase):
+    """使用临时数据库的配置管理器"""
+
+    def setUp(self):
+        # 清理按注册的逆序执行：测试中注册的清理（如停止检查线程）先于释放数据库与删除临时目录
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.db = DatabaseManager(os.path.join(self.temp_dir.name, "test.db"))
+        self.addCleanup(self.db.engine.dispose)
+        self.db.init_db()
+        self.db.set_system_config("soar_timeout", 30)
+        self.db.set_system_config("sync_interval", 3600)
+        patcher = patch.object(config_module, "db_manager", self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manager = ConfigManager()
+
+
+class TestConfigSnapshot(ConfigTestCase):
+    """配置快照读取测试"""
+
+    def test_first_read_loads_snapshot(self):
+        """测试首次读取加载快照"""
+        self.assertEqual(self.manager.get("soar_timeout"), 30)
+        self.assertEqual(self.manager.get("missing", "x"), "x")
+        with self.assertRaises(TypeError):
+            self.manager.snapshot.values["soar_timeout"] = 1
+
+    def test_stale_read_does_not_wait_for_refresh(self):
+        """测试配置已变化而刷新进行中时，读取直接使用旧快照"""
+        first = self.manager.snapshot
+        self.manager._check_interval = 0
+        self.db.set_system_config("soar_timeout", 45)
+        self.manager._lock.acquire()
+        try:
+            self.assertIs(self.manager.snapshot, first)
+            self.assertEqual(self.manager.get("soar_timeout"), 30)
+        finally:
+            self.manager._lock.release()
+        self.assertEqual(self.manager.get("soar_timeout"), 45)
+
+    def test_set_replaces_snapshot(self):
+        """测试写入后立即替换快照"""
+        old = self.manager.snapshot
+        self.assertTrue(self.manager.set("soar_timeout", 45))
+        self.assertEqual(self.manager.get("soar_timeout"), 45)
+        self.assertGreater(self.manager.snapshot.version, old.version)
+        self.assertEqual(old.get("soar_timeout"), 30)
+
+
+class TestConfigSubscribers(ConfigTestCase):
+    """配置变化订阅测试"""
+
+    def test_notifies_changed_keys(self):
+        """测试只通知实际变化且被关注的配置键"""
+        events, timeout_events = [], []
+        self.manager.get("soar_timeout")
+        self.manager.subscribe(lambda changed, snapshot: events.append(changed))
+        self.manager.subscribe(lambda changed, snapshot: timeout_events.append(snapshot.get("soar_timeout")),
+                               keys=["soar_timeout"])
+
+        self.manager.set("sync_interval", 3600)  # 值未变化
+        self.manager.set("sync_interval", 7200)
+        self.manager.set("soar_timeout", 10)
+
+        self.assertEqual(events, [{"sync_interval"}, {"soar_timeout"}])
+        self.assertEqual(timeout_events, [10])
+
+    def test_set_many_notifies_once(self):
+        """测试批量写入只刷新并通知一次"""
+        events = []
+        self.manager.get("soar_timeout")
+        unsubscribe = self.manager.subscribe(lambda changed, snapshot: events.append(changed))
+        self.manager.set_many({"soar_timeout": (60, None), "sync_interval": (60, "同步周期(秒)")})
+        unsubscribe()
+        self.manager.set("soar_timeout", 5)
+        self.assertEqual(events, [{"soar_timeout", "sync_interval"}])
+
+    def test_failing_listener_does_not_break_set(self):
+        """测试回调异常不影响写入与其他订阅方"""
+        events = []
+        self.manager.get("soar_timeout")
+
+        def broken(changed, snapshot):
+            raise RuntimeError("boom")
+
+        self.manager.subscribe(broken)
+        self.manager.subscribe(lambda changed, snapshot: events.append(changed))
+        self.assertTrue(self.manager.set("soar_timeout", 5))
+        self.assertEqual(events, [{"soar_timeout"}])
+
+
+class TestCrossProcessChanges(ConfigTestCase):
+    """跨进程配置变化检测测试（两个配置管理器共享同一数据库）"""
+
+    def setUp(self):
+        super().setUp()
+        self.manager._check_interval = 0
+        self.other = ConfigManager()
+
+    def test_change_from_other_process_visible_immediately(self):
+        """测试另一进程修改配置后下一次读取即可见，并通知订阅方"""
+        events = []
+        self.assertEqual(self.manager.get("sync_interval"), 3600)
+        self.manager.subscribe(lambda changed, snapshot: events.append(changed))
+
+        self.other.set("sync_interval", 600)
+
+        self.assertEqual(self.manager.get("sync_interval"), 600)
+        self.assertEqual(events, [{"sync_interval"}])
+
+    def test_direct_table_writes_bump_version(self):
+        """测试直接写表（新增、修改、删除）都会递增配置版本号"""
+        versions = [self.db.get_config_version()]
+        self.db.set_system_config("new_key", 1)
+        versions.append(self.db.get_config_version())
+        self.db.set_system_config("new_key", 2)
+        versions.append(self.db.get_config_version())
+        with self.db.engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM system_config WHERE key = 'new_key'")
+        versions.append(self.db.get_config_version())
+        self.assertEqual(versions, sorted(set(versions)))
+
+    def test_unchanged_config_not_reloaded(self):
+        """测试配置未变化时只检查版本号，不重新加载整表"""
+        self.manager.get("soar_timeout")
+        with patch.object(self.db, "get_all_system_configs",
+                          side_effect=AssertionError("不应重新加载")) as reload:
+            for _ in range(20):
+                self.assertEqual(self.manager.get("soar_timeout"), 30)
+        self.assertFalse(reload.called)
+
+    def test_check_interval_throttles_version_reads(self):
+        """测试检查间隔内不读取版本号"""
+        self.manager._check_interval = 60
+        self.manager.get("soar_timeout")
+        with patch.object(self.db, "get_config_version", side_effect=AssertionError("不应检查")):
+            self.assertEqual(self.manager.get("soar_timeout"), 30)
+
+
+class TestConfigWatcher(ConfigTestCase):
+    """后台检查配置版本号测试"""
+
+    def test_reads_do_not_query_database(self):
+        """测试检查线程运行时读取只使用内存快照，其他进程的修改由检查线程加载"""
+        other = ConfigManager()
+        reloaded = threading.Event()
+        self.manager._check_interval = 0
+        self.manager.get("sync_interval")
+        self.manager.subscribe(lambda changed, snapshot: reloaded.set(), keys=["sync_interval"])
+        self.manager.start_watcher(interval=0.01)
+        self.addCleanup(self.manager.stop_watcher)
+
+        with patch.object(self.db, "get_config_version", side_effect=AssertionError("读取时不应检查")):
+            for _ in range(20):
+                self.assertEqual(self.manager.get("sync_interval"), 3600)
+        self.assertTrue(self.manager.watching)
+
+        other.set("sync_interval", 600)
+        self.assertTrue(reloaded.wait(timeout=10))
+        self.assertEqual(self.manager.get("sync_interval"), 600)
+
+
+class TestConfigConsumers(unittest.TestCase):
+    """订阅方响应配置变化测试"""
+
+    def test_rate_limit_policy_reloaded(self):
+        """测试限流配置变化后全局限流器策略立即失效"""
+        from config_manager import config_manager
+        from rate_limiter import rate_limiter
+
+        rate_limiter._policy_loaded_at = 0.0
+        config_manager._notify(frozenset({"rate_limit_execute_burst"}), config_manager._snapshot)
+        self.assertIsNone(rate_limiter._policy_loaded_at)
+
+    def test_http_client_rebuilt_after_ssl_change(self):
+        """测试SSL配置变化后重建共享HTTP客户端"""
+        import soar_mcp_server
+
+        async def run():
+            with patch.object(soar_mcp_server, "_soar_http_client", None):
+                first = await soar_mcp_server.get_soar_client()
+                self.assertIs(await soar_mcp_server.get_soar_client(), first)
+                soar_mcp_server._on_http_client_config_change(frozenset({"ssl_verify"}), None)
+                second = await soar_mcp_server.get_soar_client()
+                await second.aclose()
+                await first.aclose()
+                return first, second
+
+        first, second = asyncio.run(run())
+        self.assertIsNot(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+数据库单写线程测试
+
+使用方法:
+    python tests/test_db_writer.py
+"""
+
+import sys
+import os
+import time
+import tempfile
+import threading
+import unittest
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_writer import WRITE_PRIORITY_BULK, WRITE_PRIORITY_INTERACTIVE
+from models import DatabaseManager
+
+
+class WriterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.temp_dir.name, "test.db"))
+        self.db.init_db()
+        self.writer = self.db.start_writer()
+
+    def tearDown(self):
+        self.db.stop_writer()
+        self.db.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def hold_writer(self) -> threading.Event:
+        """让写线程阻塞在一个写入上，便于在队列中堆积写入"""
+        gate, started = threading.Event(), threading.Event()
+
+        def blocker():
+            started.set()
+            gate.wait(5)
+
+        self.writer.submit(blocker, priority=WRITE_PRIORITY_INTERACTIVE)
+        started.wait(5)
+        return gate
+
+    def wait_queued(self, count: int):
+        deadline = time.time() + 5
+        while self.writer.stats()["queued"] < count and time.time() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(self.writer.stats()["queued"], count)
+
+    def in_threads(self, func, count: int) -> list:
+        results = [None] * count
+
+        def run(i):
+            results[i] = func(i)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for t in threads:
+            t.start()
+        return threads, results
+
+
+class TestWritePriority(WriterTestCase):
+    """写入优先级测试"""
+
+    def test_interactive_writes_go_first(self):
+        """测试交互写入排在已排队的批量写入之前"""
+        order = []
+        gate = self.hold_writer()
+        bulk = [self.writer.submit(order.append, f"bulk-{i}", priority=WRITE_PRIORITY_BULK) for i in range(3)]
+        toggle = self.writer.submit(order.append, "toggle", priority=WRITE_PRIORITY_INTERACTIVE)
+        gate.set()
+        for future in bulk + [toggle]:
+            future.result(5)
+        self.assertEqual(order, ["toggle", "bulk-0", "bulk-1", "bulk-2"])
+
+    def test_manager_writes_routed_through_writer(self):
+        """测试 DatabaseManager 的变更方法在写线程中执行"""
+        token = self.db.create_user_token("routed")
+        seen = []
+        original = self.db.get_session
+
+        def tracking_session():
+            seen.append(threading.current_thread().name)
+            return original()
+
+        self.db.get_session = tracking_session
+        try:
+            self.assertTrue(self.db.update_token_status(self.db.get_token_by_value(token)["id"], False))
+        finally:
+            del self.db.get_session
+        self.assertIn("db-writer", seen)
+
+
+class TestMergedWrites(WriterTestCase):
+    """小写入合并提交测试"""
+
+    def test_adjacent_small_writes_share_transaction(self):
+        """测试排队中的审计日志合并为一个事务提交"""
+        gate = self.hold_writer()
+        before = self.writer.stats()
+        threads, results = self.in_threads(
+            lambda i: self.db.log_audit_event(action="merged", parameters={"i": i}), 10)
+        self.wait_queued(10)
+        gate.set()
+        for t in threads:
+            t.join(5)
+
+        after = self.writer.stats()
+        self.assertTrue(all(results))
+        self.assertEqual(len(self.db.get_audit_logs(action="merged")), 10)
+        self.assertEqual(after["transactions"] - before["transactions"], 1)
+        self.assertEqual(after["merged"] - before["merged"], 10)
+
+    def test_status_update_sees_record_in_same_batch(self):
+        """测试同一批次中后面的状态更新能看到前面新增的执行记录"""
+        gate = self.hold_writer()
+        first = self.writer.submit_in_session(self.db._add_execution, "act-1", 1, None, 0, "NEW")
+        second = self.writer.submit_in_session(self.db._set_execution_status, "act-1", "SUCCESS", True)
+        gate.set()
+        self.assertTrue(first.result(5))
+        self.assertTrue(second.result(5))
+        self.assertEqual(self.db.get_executions()["items"][0]["status"], "SUCCESS")
+
+    def test_failing_write_does_not_fail_batch(self):
+        """测试合并事务中单个写入失败时，其余写入仍然提交"""
+        def broken(session):
+            raise RuntimeError("boom")
+
+        gate = self.hold_writer()
+        ok1 = self.writer.submit_in_session(self.db._add_execution, "act-1", 1, None, 0, "NEW")
+        bad = self.writer.submit_in_session(broken)
+        ok2 = self.writer.submit_in_session(self.db._add_execution, "act-2", 1, None, 0, "NEW")
+        gate.set()
+
+        self.assertTrue(ok1.result(5))
+        self.assertTrue(ok2.result(5))
+        with self.assertRaises(RuntimeError):
+            bad.result(5)
+        self.assertEqual(self.db.get_executions()["total"], 2)
+
+
+class TestConcurrentWriters(WriterTestCase):
+    """多线程并发写入测试"""
+
+    def test_concurrent_writes_all_succeed(self):
+        """测试多线程混合写入全部成功且无锁冲突"""
+        token = self.db.create_user_token("busy")
+
+        def work(i):
+            ok = True
+            for j in range(10):
+                ok &= self.db.set_system_config(f"key_{i}", j)
+                ok &= self.db.log_audit_event(action="concurrent")
+                ok &= self.db.verify_token(token)
+            return ok
+
+        threads, results = self.in_threads(work, 8)
+        for t in threads:
+            t.join(30)
+
+        self.assertTrue(all(results))
+        self.assertEqual(len(self.db.get_audit_logs(limit=1000, action="concurrent")), 80)
+        self.assertEqual(self.db.get_token_by_value(token)["usage_count"], 80)
+
+    def test_nested_write_in_writer_thread(self):
+        """测试写线程中调用的其他变更方法直接执行，不会自我等待"""
+        self.assertTrue(self.db.update_last_sync_time())
+        self.assertIsNotNone(self.db.get_last_sync_time())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+执行状态缓存与并发合并测试
+
+使用方法:
+    python tests/test_execution_cache.py
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution_cache import ResultCache, SingleFlight, StatusCache, is_terminal_status
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStatusCache(unittest.TestCase):
+    """StatusCache 单元测试"""
+
+    def test_pending_status_expires_after_ttl(self):
+        """测试非终态在TTL后过期"""
+        clock = FakeClock()
+        cache = StatusCache(ttl=2.0, clock=clock)
+        cache.put("a1", "RUNNING", {"executeStatus": "RUNNING"})
+
+        self.assertEqual(cache.get("a1"), {"executeStatus": "RUNNING"})
+        clock.now += 2.5
+        self.assertIsNone(cache.get("a1"))
+
+    def test_terminal_status_never_expires(self):
+        """测试终态永久缓存"""
+        clock = FakeClock()
+        cache = StatusCache(ttl=2.0, clock=clock)
+        cache.put("a1", "SUCCESS", {"executeStatus": "SUCCESS"})
+
+        clock.now += 86400
+        self.assertEqual(cache.get("a1"), {"executeStatus": "SUCCESS"})
+
+    def test_terminal_entries_are_size_bounded(self):
+        """测试终态缓存按LRU淘汰"""
+        cache = StatusCache(max_terminal=2)
+        cache.put("a1", "SUCCESS", {"id": 1})
+        cache.put("a2", "FAIL", {"id": 2})
+        cache.get("a1")  # a1 变为最近使用
+        cache.put("a3", "SUCCESS", {"id": 3})
+
+        self.assertIsNotNone(cache.get("a1"))
+        self.assertIsNone(cache.get("a2"))
+        self.assertIsNotNone(cache.get("a3"))
+
+    def test_terminal_replaces_pending(self):
+        """测试状态进入终态后覆盖非终态条目"""
+        cache = StatusCache(ttl=10)
+        cache.put("a1", "RUNNING", {"executeStatus": "RUNNING"})
+        cache.put("a1", "SUCCESS", {"executeStatus": "SUCCESS"})
+
+        self.assertEqual(cache.stats(), {"pending": 0, "terminal": 1})
+
+    def test_is_terminal_status(self):
+        """测试终态判断"""
+        self.assertTrue(is_terminal_status("SUCCESS"))
+        self.assertTrue(is_terminal_status("FAILED"))
+        self.assertFalse(is_terminal_status("RUNNING"))
+        self.assertFalse(is_terminal_status(None))
+
+
+class TestSingleFlight(unittest.TestCase):
+    """SingleFlight 单元测试"""
+
+    def test_concurrent_calls_are_coalesced(self):
+        """测试相同key的并发调用只执行一次"""
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"executeStatus": "RUNNING"}
+
+        async def run():
+            flight = SingleFlight()
+            results = await asyncio.gather(*[flight.do("a1", fetch) for _ in range(10)])
+            self.assertEqual(flight.inflight_count(), 0)
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r == {"executeStatus": "RUNNING"} for r in results))
+
+    def test_exception_propagates_to_all_waiters(self):
+        """测试异常传递给所有等待者"""
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def run():
+            flight = SingleFlight()
+            return await asyncio.gather(*[flight.do("a1", fail) for _ in range(3)],
+                                        return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+
+class TestResultCache(unittest.TestCase):
+    """ResultCache 单元测试"""
+
+    def _payload(self, n: int, size: int = 100) -> dict:
+        return {"code": 200, "result": {"activity": {"executeStatus": "SUCCESS"}, "data": str(n) * size}}
+
+    def test_memory_bounded_by_bytes(self):
+        """测试内存占用按字节数约束"""
+        cache = ResultCache(max_bytes=500)
+        for i in range(10):
+            cache.put(f"a{i}", self._payload(i))
+
+        stats = cache.stats()
+        self.assertLessEqual(stats["memory_bytes"], 500)
+        self.assertIsNone(cache.get("a0"))
+        self.assertEqual(cache.get("a9"), self._payload(9))
+
+    def test_evicted_entries_spill_to_disk(self):
+        """测试淘汰条目压缩落盘并可再次读取"""
+        with tempfile.TemporaryDirectory() as spill_dir:
+            cache = ResultCache(max_bytes=500, spill_dir=spill_dir)
+            for i in range(10):
+                cache.put(f"a{i}", self._payload(i))
+
+            stats = cache.stats()
+            self.assertGreater(stats["disk_entries"], 0)
+            self.assertLess(stats["disk_bytes"], stats["disk_entries"] * 150)
+            self.assertEqual(cache.get("a0"), self._payload(0))
+
+    def test_oversized_entry_goes_straight_to_disk(self):
+        """测试超过内存上限的单条结果直接落盘"""
+        with tempfile.TemporaryDirectory() as spill_dir:
+            cache = ResultCache(max_bytes=100, spill_dir=spill_dir)
+            big = self._payload(7, size=5000)
+            cache.put("big", big)
+
+            self.assertEqual(cache.stats()["memory_entries"], 0)
+            self.assertEqual(cache.stats()["disk_entries"], 1)
+            self.assertEqual(cache.get("big"), big)
+
+    def test_disk_bounded_by_bytes(self):
+        """测试磁盘占用按字节数约束"""
+        with tempfile.TemporaryDirectory() as spill_dir:
+            cache = ResultCache(max_bytes=10, spill_dir=spill_dir, max_disk_bytes=200)
+            for i in range(20):
+                cache.put(f"a{i}", {"data": os.urandom(40).hex()})
+
+            stats = cache.stats()
+            self.assertLessEqual(stats["disk_bytes"], 200)
+            self.assertEqual(len(os.listdir(spill_dir)), stats["disk_entries"])
+
+    def test_clear_removes_spilled_files(self):
+        """测试清空缓存同时删除落盘文件"""
+        with tempfile.TemporaryDirectory() as spill_dir:
+            cache = ResultCache(max_bytes=10, spill_dir=spill_dir)
+            cache.put("a1", self._payload(1))
+            cache.clear()
+
+            self.assertEqual(os.listdir(spill_dir), [])
+            self.assertIsNone(cache.get("a1"))
+
+
+class TestStatusTool(unittest.TestCase):
+    """状态查询工具的缓存集成测试"""
+
+    def test_status_queries_share_backend_call(self):
+        """测试突发的相同状态查询只调用一次后端"""
+        import soar_mcp_server
+        from execution_cache import status_cache
+
+        calls = []
+
+        async def fake_request(activity_id):
+            calls.append(activity_id)
+            await asyncio.sleep(0.05)
+            data = {"executeStatus": "SUCCESS", "eventId": 1}
+            status_cache.put(activity_id, "SUCCESS", data)
+            return data
+
+        async def run():
+            tool = soar_mcp_server.query_playbook_execution_status_by_activity_id
+            first = await asyncio.gather(*[tool("act-cache-1") for _ in range(5)])
+            second = await tool("act-cache-1")
+            return first, second
+
+        status_cache.clear()
+        with patch.object(soar_mcp_server, "_request_execution_status", fake_request), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            first, second = asyncio.run(run())
+        status_cache.clear()
+
+        self.assertEqual(calls, ["act-cache-1"])
+        self.assertIn('"status": "SUCCESS"', second)
+
+    def test_terminal_result_served_from_cache(self):
+        """测试终态执行结果命中缓存后不再请求后端"""
+        import soar_mcp_server
+        from execution_cache import result_cache
+
+        calls = []
+        payload = {"code": 200, "result": {"activity": {"executeStatus": "SUCCESS"}, "nodeResults": []}}
+
+        class FakeResponse:
+            status_code = 200
+
+            def json(self):
+                return payload
+
+        class FakeClient:
+            async def get(self, url, headers=None):
+                calls.append(url)
+                return FakeResponse()
+
+        async def fake_get_client():
+            return FakeClient()
+
+        async def run():
+            tool = soar_mcp_server.query_playbook_execution_result_by_activity_id
+            await tool("act-result-1")
+            return await tool("act-result-1")
+
+        result_cache.clear()
+        with patch.object(soar_mcp_server, "get_soar_client", fake_get_client), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            second = asyncio.run(run())
+        result_cache.clear()
+
+        self.assertEqual(len(calls), 1)
+        self.assertIn('"executeStatus": "SUCCESS"', second)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
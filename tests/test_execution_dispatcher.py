@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+剧本执行优先级调度器测试
+
+使用方法:
+    python tests/test_execution_dispatcher.py
+"""
+
+import sys
+import os
+import json
+import asyncio
+import contextvars
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution_dispatcher import (
+    DEFAULT_PRIORITY, TICKET_FAILED, TICKET_LAUNCHED, TICKET_QUEUED, ExecutionDispatcher, resolve_priority
+)
+
+_request_user = contextvars.ContextVar("_request_user", default=None)
+
+
+async def never_finished(activity_id):
+    return {"executeStatus": "RUNNING"}
+
+
+class TestExecutionDispatcher(unittest.TestCase):
+    """ExecutionDispatcher 单元测试"""
+
+    def test_launch_immediately_with_capacity(self):
+        """测试有空闲名额时立即启动"""
+        async def run():
+            dispatcher = ExecutionDispatcher(never_finished, max_inflight=2)
+
+            async def launch():
+                return "act-1"
+
+            ticket = await dispatcher.submit(launch)
+            return dispatcher, ticket
+
+        dispatcher, ticket = asyncio.run(run())
+        self.assertEqual(ticket.state, TICKET_LAUNCHED)
+        self.assertEqual(ticket.activity_id, "act-1")
+
+    def test_queue_dispatches_by_priority(self):
+        """测试饱和时排队，释放名额后按优先级派发"""
+        launched = []
+
+        def launcher(name):
+            async def launch():
+                launched.append(name)
+                return f"act-{name}"
+            return launch
+
+        async def run():
+            dispatcher = ExecutionDispatcher(never_finished, max_inflight=2, poll_interval=60)
+            await dispatcher.submit(launcher("a"))
+            await dispatcher.submit(launcher("b"))
+            bulk1 = await dispatcher.submit(launcher("bulk1"), priority=DEFAULT_PRIORITY)
+            critical = await dispatcher.submit(launcher("critical"), priority=10)
+            bulk2 = await dispatcher.submit(launcher("bulk2"), priority=DEFAULT_PRIORITY)
+
+            self.assertEqual([bulk1.state, critical.state, bulk2.state], [TICKET_QUEUED] * 3)
+            self.assertEqual(dispatcher.position(critical), 1)
+            self.assertEqual(dispatcher.position(bulk2), 3)
+            self.assertGreater(dispatcher.describe(bulk2)["estimatedWaitSeconds"], 0)
+
+            dispatcher.observe_status("act-a", "SUCCESS")
+            await asyncio.sleep(0)
+            self.assertEqual(critical.state, TICKET_LAUNCHED)
+            self.assertEqual(bulk1.state, TICKET_QUEUED)
+
+            dispatcher.release("act-b")
+            await asyncio.sleep(0)
+            return dispatcher
+
+        dispatcher = asyncio.run(run())
+        self.assertEqual(launched, ["a", "b", "critical", "bulk1"])
+        self.assertEqual(dispatcher.stats()["queued"], 1)
+
+    def test_failed_launch_frees_slot(self):
+        """测试启动失败时记录错误并释放名额"""
+        async def run():
+            dispatcher = ExecutionDispatcher(never_finished, max_inflight=1)
+
+            async def fail():
+                raise RuntimeError("API调用失败: 500")
+
+            ticket = await dispatcher.submit(fail)
+            return dispatcher, ticket
+
+        dispatcher, ticket = asyncio.run(run())
+        self.assertEqual(ticket.state, TICKET_FAILED)
+        self.assertIsInstance(ticket.exception, RuntimeError)
+        self.assertEqual(dispatcher.stats()["launching"], 0)
+
+    def test_disabling_releases_queue(self):
+        """测试运行中将上限改为0（关闭调度）时，已排队的请求全部派发"""
+        async def launch():
+            return "act-x"
+
+        async def run():
+            dispatcher = ExecutionDispatcher(never_finished, max_inflight=1, poll_interval=60)
+            await dispatcher.submit(launch)
+            queued = [await dispatcher.submit(launch) for _ in range(3)]
+            self.assertEqual([t.state for t in queued], [TICKET_QUEUED] * 3)
+
+            dispatcher.max_inflight = 0
+            await asyncio.sleep(0)
+            return dispatcher, queued
+
+        dispatcher, queued = asyncio.run(run())
+        self.assertEqual([t.state for t in queued], [TICKET_LAUNCHED] * 3)
+        self.assertEqual(dispatcher.stats()["queued"], 0)
+
+    def test_deferred_launch_keeps_request_context(self):
+        """测试延迟派发时使用提交请求时的上下文"""
+        seen = []
+
+        async def launch():
+            seen.append(_request_user.get())
+            return f"act-{len(seen)}"
+
+        async def run():
+            dispatcher = ExecutionDispatcher(never_finished, max_inflight=1, poll_interval=60)
+            _request_user.set("first")
+            await dispatcher.submit(launch)
+            _request_user.set("second")
+            await dispatcher.submit(launch)
+            _request_user.set("releaser")
+            dispatcher.release("act-1")
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+        self.assertEqual(seen, ["first", "second"])
+
+    def test_monitor_releases_terminal_executions(self):
+        """测试后台轮询发现终态后释放名额"""
+        async def finished(activity_id):
+            return {"executeStatus": "SUCCESS"}
+
+        async def run():
+            dispatcher = ExecutionDispatcher(finished, max_inflight=1, poll_interval=0.01)
+
+            async def launch():
+                return "act-1"
+
+            await dispatcher.submit(launch)
+            queued = await dispatcher.submit(launch)
+            self.assertEqual(queued.state, TICKET_QUEUED)
+            await asyncio.sleep(0.05)
+            return queued
+
+        self.assertEqual(asyncio.run(run()).state, TICKET_LAUNCHED)
+
+    def test_resolve_priority(self):
+        """测试按剧本分类与Token计算优先级"""
+        categories = {"containment": 10, "enrichment": 200}
+        tokens = {"7": 50, "soc-bot": 5}
+        self.assertEqual(resolve_priority("containment", {"id": 7}, categories, tokens), 10)
+        self.assertEqual(resolve_priority("enrichment", {"id": 7}, categories, tokens), 50)
+        self.assertEqual(resolve_priority("enrichment", {"id": 1, "name": "soc-bot"}, categories, tokens), 5)
+        self.assertEqual(resolve_priority(None, None, None, None), DEFAULT_PRIORITY)
+
+
+@pytest.mark.usefixtures("catalog_store")
+class TestExecutePlaybookDispatch(unittest.TestCase):
+    """execute_playbook 调度集成测试"""
+
+    def test_saturated_call_returns_ticket(self):
+        """测试饱和时 execute_playbook 返回排队凭证，派发后可查询活动ID"""
+        import soar_mcp_server
+        from models import PlaybookData
+
+        config = {"dispatcher_max_inflight": 1, "dispatcher_category_priorities": {"containment": 10}}
+        playbook = PlaybookData(id=1001, name="block_ip", playbook_category="containment")
+        counter = []
+
+        async def fake_launch(playbook_id, parameters=None, event_id=0):
+            counter.append(1)
+            return f"act-{len(counter)}"
+
+        async def run():
+            first = json.loads(await soar_mcp_server.execute_playbook(1001))
+            second = json.loads(await soar_mcp_server.execute_playbook(1001))
+            ticket_id = second["ticketId"]
+            soar_mcp_server.execution_dispatcher.release(first["activity_id"])
+            await asyncio.sleep(0)
+            return first, second, json.loads(soar_mcp_server.query_execution_ticket(ticket_id))
+
+        dispatcher = ExecutionDispatcher(never_finished, poll_interval=60)
+        with patch.object(soar_mcp_server, "execution_dispatcher", dispatcher), \
+                patch.object(soar_mcp_server.config_manager, "get",
+                             side_effect=lambda key, default=None: config.get(key, default)), \
+                patch.object(soar_mcp_server, "playbook_catalog", self.make_catalog_store(playbook)), \
+                patch.object(soar_mcp_server, "launch_playbook", fake_launch), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            first, second, ticket = asyncio.run(run())
+
+        self.assertEqual(first["activity_id"], "act-1")
+        self.assertTrue(second["queued"])
+        self.assertEqual(second["queuePosition"], 1)
+        self.assertEqual(second["priority"], 10)
+        self.assertEqual(ticket["state"], TICKET_LAUNCHED)
+        self.assertEqual(ticket["activity_id"], "act-2")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+剧本执行记录持久化测试
+
+使用方法:
+    python tests/test_execution_history.py
+"""
+
+import sys
+import os
+import json
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import DatabaseManager
+
+
+class TestExecutionHistory(unittest.TestCase):
+    """执行记录数据库操作测试"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.temp_dir.name, "test.db"))
+        self.db.init_db()
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def test_record_and_update_status(self):
+        """测试记录执行与状态更新"""
+        self.assertTrue(self.db.record_execution("act-1", 820862018959180, token_id=7, event_id=0))
+        self.assertTrue(self.db.update_execution_status("act-1", "RUNNING"))
+        self.assertTrue(self.db.update_execution_status("act-1", "SUCCESS", finished=True))
+
+        item = self.db.get_executions()["items"][0]
+        self.assertEqual(item["activity_id"], "act-1")
+        self.assertEqual(item["playbook_id"], "820862018959180")
+        self.assertEqual(item["token_id"], 7)
+        self.assertEqual(item["status"], "SUCCESS")
+        self.assertIsNotNone(item["finished_time"])
+
+    def test_duplicate_record_is_ignored(self):
+        """测试重复记录同一活动不会报错或重复插入"""
+        self.db.record_execution("act-1", 1)
+        self.assertTrue(self.db.record_execution("act-1", 1))
+        self.assertEqual(self.db.get_executions()["total"], 1)
+
+    def test_update_unknown_activity(self):
+        """测试更新不存在的活动"""
+        self.assertFalse(self.db.update_execution_status("missing", "SUCCESS"))
+
+    def test_pagination_and_filters(self):
+        """测试分页与按剧本、Token筛选"""
+        for i in range(25):
+            self.db.record_execution(f"act-{i:02d}", playbook_id=i % 2, token_id=i % 3)
+
+        page = self.db.get_executions(limit=10, offset=20)
+        self.assertEqual(page["total"], 25)
+        self.assertEqual(len(page["items"]), 5)
+
+        newest = self.db.get_executions(limit=1)["items"][0]
+        self.assertEqual(newest["activity_id"], "act-24")
+
+        self.assertEqual(self.db.get_executions(playbook_id=1)["total"], 12)
+        self.assertEqual(self.db.get_executions(token_id=0)["total"], 9)
+
+    def test_indexes_created(self):
+        """测试按剧本、Token和时间查询的索引已创建"""
+        from sqlalchemy import inspect
+        names = {ix["name"] for ix in inspect(self.db.engine).get_indexes("executions")}
+        self.assertIn("ix_executions_playbook_created", names)
+        self.assertIn("ix_executions_token_created", names)
+        self.assertIn("ix_executions_created_time", names)
+
+
+class TestExecutionsResource(unittest.TestCase):
+    """soar://executions 资源测试"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.temp_dir.name, "test.db"))
+        self.db.init_db()
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def test_resource_is_paginated(self):
+        """测试资源按页返回并提供下一页地址"""
+        import soar_mcp_server
+
+        for i in range(60):
+            self.db.record_execution(f"act-{i}", playbook_id=1)
+
+        from async_db import AsyncDatabaseManager, db_executor
+
+        with patch.object(soar_mcp_server, "async_db", AsyncDatabaseManager(self.db, db_executor)), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            first = json.loads(asyncio.run(soar_mcp_server.get_executions_resource()))
+            second = json.loads(asyncio.run(soar_mcp_server.get_executions_page_resource(2)))
+
+        self.assertEqual(first["total"], 60)
+        self.assertEqual(len(first["items"]), soar_mcp_server.EXECUTIONS_PAGE_SIZE)
+        self.assertEqual(first["nextPage"], "soar://executions/page/2")
+        self.assertEqual(len(second["items"]), 10)
+        self.assertNotIn("nextPage", second)
+
+    def test_status_changes_written_once(self):
+        """测试相同状态不会重复写库"""
+        import soar_mcp_server
+
+        self.db.start_writer()
+        self.addCleanup(self.db.stop_writer)
+        with patch.object(soar_mcp_server, "db_manager", self.db), \
+                patch.object(self.db.writer, "submit", wraps=self.db.writer.submit) as submit:
+            soar_mcp_server.record_execution_started("act-x", 1)
+            soar_mcp_server.record_execution_status("act-x", "RUNNING")
+            soar_mcp_server.record_execution_status("act-x", "RUNNING")
+            soar_mcp_server.record_execution_status("act-x", "SUCCESS")
+            # 写入直接排入写线程；等待队列中的写入完成
+            self.db.writer.submit(lambda: None).result(timeout=5)
+        self.assertEqual(submit.call_count, 4)
+
+        item = self.db.get_executions()["items"][0]
+        self.assertEqual(item["status"], "SUCCESS")
+        self.assertIsNotNone(item["finished_time"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
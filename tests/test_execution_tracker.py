@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+执行状态跟踪与 MCP 进度通知测试
+
+使用方法:
+    python tests/test_execution_tracker.py
+"""
+
+import sys
+import os
+import json
+import asyncio
+import unittest
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution_tracker import ExecutionTracker
+
+
+class ScriptedStatus:
+    """按预设序列返回执行状态的后端"""
+
+    def __init__(self, sequence):
+        self.sequence = list(sequence)
+        self.calls = 0
+
+    async def __call__(self, activity_id):
+        status = self.sequence[min(self.calls, len(self.sequence) - 1)]
+        self.calls += 1
+        return {"executeStatus": status}
+
+
+class TestExecutionTracker(unittest.TestCase):
+    """ExecutionTracker 单元测试"""
+
+    def test_follow_until_terminal(self):
+        """测试跟踪到终态结束，并标记状态变化"""
+        backend = ScriptedStatus(["NEW", "RUNNING", "RUNNING", "SUCCESS"])
+        tracker = ExecutionTracker(backend, poll_interval=0.01, max_poll_interval=0.02)
+
+        async def run():
+            return [e async for e in tracker.follow("act-1", timeout=5)]
+
+        events = asyncio.run(run())
+        self.assertEqual([e["status"] for e in events], ["NEW", "RUNNING", "RUNNING", "SUCCESS"])
+        self.assertEqual([e["changed"] for e in events], [True, True, False, True])
+        self.assertEqual(tracker.stats(), {"tracked": 0, "subscribers": 0})
+
+    def test_follow_times_out(self):
+        """测试超时后停止跟踪并取消轮询"""
+        tracker = ExecutionTracker(ScriptedStatus(["RUNNING"]), poll_interval=0.01)
+
+        async def run():
+            events = [e async for e in tracker.follow("act-1", timeout=0.05)]
+            await asyncio.sleep(0)
+            return events
+
+        events = asyncio.run(run())
+        self.assertTrue(all(e["status"] == "RUNNING" for e in events))
+        self.assertEqual(tracker.stats()["tracked"], 0)
+
+    def test_subscribers_share_one_poller(self):
+        """测试同一活动的多个等待者共享轮询"""
+        backend = ScriptedStatus(["RUNNING", "RUNNING", "SUCCESS"])
+        tracker = ExecutionTracker(backend, poll_interval=0.01, backoff=1.0)
+
+        async def run():
+            return await asyncio.gather(*[tracker.wait(["act-1"], timeout=5) for _ in range(5)])
+
+        results = asyncio.run(run())
+        self.assertTrue(all(r == {"act-1": "SUCCESS"} for r in results))
+        self.assertEqual(backend.calls, 3)
+
+    def test_poll_interval_backs_off(self):
+        """测试状态不变时轮询间隔逐步增大"""
+        backend = ScriptedStatus(["RUNNING"])
+        tracker = ExecutionTracker(backend, poll_interval=0.01, max_poll_interval=1.0, backoff=3.0)
+
+        async def run():
+            return [e async for e in tracker.follow("act-1", timeout=0.2)]
+
+        events = asyncio.run(run())
+        # 0.01 + 0.03 + 0.09 + 0.27 > 0.2：固定间隔约需20次轮询，退避后只需少数几次
+        self.assertLessEqual(len(events), 5)
+
+
+class TestExecutePlaybookProgress(unittest.TestCase):
+    """execute_playbook 等待完成与进度通知集成测试"""
+
+    def test_progress_notifications_until_completion(self):
+        """测试 wait_for_completion 时通过 MCP 进度通知推送状态变化"""
+        import soar_mcp_server
+        from fastmcp import Client
+
+        backend = ScriptedStatus(["RUNNING", "RUNNING", "SUCCESS"])
+        progress = []
+
+        async def fake_launch(playbook_id, parameters=None, event_id=0):
+            return "act-progress-1"
+
+        async def on_progress(value, total, message):
+            progress.append((value, total, message))
+
+        async def run():
+            async with Client(soar_mcp_server.mcp) as client:
+                result = await client.call_tool(
+                    "execute_playbook",
+                    {"playbook_id": 1, "wait_for_completion": True, "wait_timeout": 30},
+                    progress_handler=on_progress)
+                return json.loads(result.content[0].text)
+
+        tracker = ExecutionTracker(backend, poll_interval=0.01)
+        with patch.object(soar_mcp_server, "execution_tracker", tracker), \
+                patch.object(soar_mcp_server, "launch_playbook", fake_launch), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            result = asyncio.run(run())
+
+        self.assertEqual(result["activity_id"], "act-progress-1")
+        self.assertEqual(result["status"], "SUCCESS")
+        self.assertTrue(result["completed"])
+        self.assertEqual(len(progress), 3)
+        self.assertIn("SUCCESS", progress[-1][2])
+        self.assertEqual(progress[-1][1], 30)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
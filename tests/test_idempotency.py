@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+剧本执行幂等键测试
+
+使用方法:
+    python tests/test_idempotency.py
+"""
+
+import sys
+import os
+import json
+import asyncio
+import unittest
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution_cache import IdempotencyConflictError, IdempotencyStore
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestIdempotencyStore(unittest.TestCase):
+    """IdempotencyStore 单元测试"""
+
+    def test_repeated_key_returns_first_result(self):
+        """测试重复幂等键返回首次结果且只执行一次"""
+        calls = []
+
+        async def launch():
+            calls.append(1)
+            return f"act-{len(calls)}"
+
+        async def run():
+            store = IdempotencyStore()
+            first = await store.run("k1", "fp", launch)
+            second = await store.run("k1", "fp", launch)
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first, ("act-1", False))
+        self.assertEqual(second, ("act-1", True))
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrent_duplicates_are_coalesced(self):
+        """测试首次调用进行中的重复调用合并等待"""
+        calls = []
+
+        async def launch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "act-1"
+
+        async def run():
+            store = IdempotencyStore()
+            return await asyncio.gather(*[store.run("k1", "fp", launch) for _ in range(5)])
+
+        results = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(r[1] for r in results), [False, True, True, True, True])
+        self.assertTrue(all(r[0] == "act-1" for r in results))
+
+    def test_failure_is_not_recorded(self):
+        """测试失败的调用不记录，可用同一幂等键重试"""
+        attempts = []
+
+        async def launch():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("timeout")
+            return "act-2"
+
+        async def run():
+            store = IdempotencyStore()
+            with self.assertRaises(RuntimeError):
+                await store.run("k1", "fp", launch)
+            return await store.run("k1", "fp", launch)
+
+        self.assertEqual(asyncio.run(run()), ("act-2", False))
+
+    def test_fingerprint_conflict(self):
+        """测试同一幂等键用于不同请求时报冲突"""
+        async def launch():
+            return "act-1"
+
+        async def run():
+            store = IdempotencyStore()
+            await store.run("k1", "fp-a", launch)
+            await store.run("k1", "fp-b", launch)
+
+        with self.assertRaises(IdempotencyConflictError):
+            asyncio.run(run())
+
+    def test_entries_expire(self):
+        """测试幂等记录过期"""
+        clock = FakeClock()
+        store = IdempotencyStore(ttl=60, clock=clock)
+        store.put("k1", "fp", "act-1")
+        self.assertEqual(store.get("k1"), ("fp", "act-1"))
+        clock.now += 61
+        self.assertIsNone(store.get("k1"))
+
+
+class TestExecutePlaybookIdempotency(unittest.TestCase):
+    """execute_playbook 幂等键集成测试"""
+
+    def test_retry_does_not_relaunch(self):
+        """测试带相同幂等键的重试不再调用SOAR API"""
+        import soar_mcp_server
+
+        calls = []
+
+        async def fake_launch(playbook_id, parameters=None, event_id=0):
+            calls.append(playbook_id)
+            await asyncio.sleep(0.02)
+            return "act-idem-1"
+
+        async def run():
+            tool = soar_mcp_server.execute_playbook
+            concurrent = await asyncio.gather(*[
+                tool(1001, {"ip": "1.1.1.1"}, idempotency_key="retry-1") for _ in range(3)])
+            later = await tool(1001, {"ip": "1.1.1.1"}, idempotency_key="retry-1")
+            conflict = await tool(1001, {"ip": "2.2.2.2"}, idempotency_key="retry-1")
+            return concurrent, later, conflict
+
+        soar_mcp_server.idempotency_store.clear()
+        with patch.object(soar_mcp_server, "launch_playbook", fake_launch), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            concurrent, later, conflict = asyncio.run(run())
+        soar_mcp_server.idempotency_store.clear()
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(json.loads(r)["activity_id"] == "act-idem-1" for r in concurrent))
+        self.assertTrue(json.loads(later)["idempotentReplay"])
+        self.assertFalse(json.loads(conflict)["success"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+后台任务主节点选举测试
+
+使用方法:
+    python tests/test_leader_election.py
+"""
+
+import sys
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import soar_mcp_server
+from leader_election import LeaderElector
+from models import DatabaseManager
+
+
+class TestLeaderElector(unittest.TestCase):
+    """租约选举测试（每个 DatabaseManager 模拟一个 worker 进程）"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "test.db")
+        self.dbs = [DatabaseManager(self.path) for _ in range(2)]
+        self.dbs[0].init_db()
+
+    def tearDown(self):
+        for db in self.dbs:
+            db.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def electors(self, ttl=30.0):
+        return [LeaderElector(db, ttl=ttl, holder=f"worker-{i}") for i, db in enumerate(self.dbs)]
+
+    def test_single_leader(self):
+        """测试同一时刻只有一个主节点，续约不受影响"""
+        a, b = self.electors()
+        self.assertTrue(a.try_acquire())
+        self.assertFalse(b.try_acquire())
+        self.assertTrue(a.try_acquire())
+        self.assertEqual(self.dbs[1].get_lease("background-jobs")["holder"], "worker-0")
+
+    def test_release_hands_over_immediately(self):
+        """测试主节点停止时释放租约，其他 worker 立即接管"""
+        a, b = self.electors()
+        events = []
+        a.subscribe(events.append)
+        self.assertTrue(a.start())
+        a.stop()
+        self.assertEqual(events, [True, False])
+        self.assertFalse(a.is_leader)
+        self.assertTrue(b.try_acquire())
+
+    def test_failover_after_lease_expires(self):
+        """测试主节点停止续约后，租约过期由其他 worker 接管，原主节点随后失去身份"""
+        a, b = self.electors(ttl=0.3)
+        events = []
+        a.subscribe(events.append)
+        self.assertTrue(a.try_acquire())
+        self.assertFalse(b.try_acquire())
+
+        time.sleep(0.35)
+        self.assertFalse(a.is_leader)
+        self.assertTrue(b.try_acquire())
+        self.assertFalse(a.try_acquire())
+        self.assertEqual(events, [True, False])
+
+    def test_local_validity_ends_before_lease(self):
+        """测试本地认定的主节点有效期早于数据库租约过期时间"""
+        now = [0.0]
+        elector = LeaderElector(self.dbs[0], ttl=30.0, holder="worker-0", clock=lambda: now[0])
+        self.assertTrue(elector.try_acquire())
+        now[0] = 19.0
+        self.assertTrue(elector.is_leader)
+        now[0] = 21.0
+        self.assertFalse(elector.is_leader)
+
+
+class TestPeriodicSyncLeadership(unittest.TestCase):
+    """定时同步只在主节点执行"""
+
+    def run_service(self, is_leader: bool) -> AsyncMock:
+        elector = SimpleNamespace(is_leader=is_leader, subscribe=lambda listener: (lambda: None))
+        service = soar_mcp_server.PeriodicSyncService()
+        perform = AsyncMock()
+        with patch.object(soar_mcp_server, "leader_elector", elector), \
+                patch.object(soar_mcp_server.config_manager, "get",
+                             side_effect=lambda key, default=None: default), \
+                patch.object(service, "_perform_sync", perform), \
+                patch.object(service, "CHECK_INTERVAL", 0.05):
+            service.start_periodic_sync()
+            try:
+                service._on_sync_config_change(frozenset({"soar_api_url"}), None)
+                time.sleep(0.3)
+            finally:
+                service.stop()
+        return perform
+
+    def test_leader_syncs_on_config_change(self):
+        """测试主节点在同步相关配置变化后立即同步"""
+        self.assertEqual(self.run_service(is_leader=True).await_count, 1)
+
+    def test_follower_does_not_sync(self):
+        """测试非主节点忽略配置变化触发的同步"""
+        self.assertEqual(self.run_service(is_leader=False).await_count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+运行指标测试
+
+使用方法:
+    python tests/test_metrics.py
+"""
+
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastmcp import Client
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth_utils
+import metrics
+import soar_mcp_server
+from auth_utils import AuthManager
+from metrics import InstrumentedTransport, MetricsRegistry, endpoint_label, record_sync, timed_methods
+from models import PlaybookData
+
+
+class TestRegistry(unittest.TestCase):
+    """指标注册表与文本格式测试"""
+
+    def test_render_counter_and_histogram(self):
+        """测试计数器与累积分桶直方图的文本输出"""
+        registry = MetricsRegistry()
+        counter = registry.counter("calls_total", "调用次数", ("tool",))
+        histogram = registry.histogram("latency_seconds", "耗时", ("tool",), buckets=(0.1, 1.0))
+        counter.inc('say "hi"')
+        counter.inc('say "hi"', amount=2)
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, "t")
+
+        text = registry.render()
+        self.assertIn("# TYPE calls_total counter", text)
+        self.assertIn('calls_total{tool="say \\"hi\\""} 3', text)
+        self.assertIn('latency_seconds_bucket{tool="t",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{tool="t",le="1"} 2', text)
+        self.assertIn('latency_seconds_bucket{tool="t",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_sum{tool="t"} 5.55', text)
+        self.assertIn('latency_seconds_count{tool="t"} 3', text)
+
+    def test_failing_gauge_does_not_break_scrape(self):
+        """测试单个回调出错不影响其他指标"""
+        registry = MetricsRegistry()
+        registry.gauge("broken", "出错的仪表", ("state",), lambda: 1 / 0)
+        registry.counter("ok_total", "正常计数").inc()
+        text = registry.render()
+        self.assertIn("ok_total 1", text)
+        self.assertIn("# broken 采集失败", text)
+
+    def test_label_count_checked(self):
+        """测试标签数量不符时报错"""
+        with self.assertRaises(ValueError):
+            MetricsRegistry().counter("c_total", "计数", ("a",)).inc()
+
+
+class TestInstrumentation(unittest.TestCase):
+    """埋点测试"""
+
+    def test_endpoint_label_collapses_ids(self):
+        """测试路径中的ID段归并，版本号等普通段保留"""
+        self.assertEqual(endpoint_label("/odp/core/v1/api/activity/123456"), "/odp/core/v1/api/activity/{id}")
+        self.assertEqual(endpoint_label("/api/activity/3f2b1c9a-0d4e-4b8a-9c1d-7e6f5a4b3c2d"), "/api/activity/{id}")
+
+    def test_timed_methods(self):
+        """测试公开方法计时与异常计数，私有方法与排除项不计时"""
+        @timed_methods(exclude=("skipped",))
+        class Store:
+            def load(self):
+                return 1
+
+            def fail(self):
+                raise RuntimeError("boom")
+
+            def skipped(self):
+                return 2
+
+            def _private(self):
+                return 3
+
+        store = Store()
+        before = metrics.db_query_duration.count("load")
+        self.assertEqual(store.load(), 1)
+        with self.assertRaises(RuntimeError):
+            store.fail()
+        self.assertEqual(metrics.db_query_duration.count("load"), before + 1)
+        self.assertEqual(metrics.db_errors.get("fail"), 1)
+        self.assertEqual(metrics.db_query_duration.count("skipped"), 0)
+        self.assertEqual(metrics.db_query_duration.count("_private"), 0)
+
+    def test_http_transport_records_status(self):
+        """测试SOAR请求按端点与状态码计时，传输层异常记为 error"""
+        def handler(request):
+            if request.url.path.endswith("/down"):
+                raise httpx.ConnectError("refused")
+            return httpx.Response(404)
+
+        transport = InstrumentedTransport("test", trust_env=False)
+        transport._transport = httpx.MockTransport(handler)
+
+        async def run():
+            async with httpx.AsyncClient(transport=transport, base_url="http://soar") as client:
+                await client.get("/api/activity/42")
+                with self.assertRaises(httpx.ConnectError):
+                    await client.get("/api/down")
+        asyncio.run(run())
+
+        self.assertEqual(metrics.soar_http_duration.count("test", "GET", "/api/activity/{id}", "404"), 1)
+        self.assertEqual(metrics.soar_http_duration.count("test", "GET", "/api/down", "error"), 1)
+        self.assertEqual(transport.inflight, 0)
+
+    def test_http_transport_uses_env_proxy(self):
+        """测试传输层沿用代理环境变量：HTTPS 请求经 HTTPS_PROXY 建立隧道，NO_PROXY 中的主机直连"""
+        request_lines = []
+
+        async def handle(reader, writer):
+            request_lines.append((await reader.readline()).decode().strip())
+            while (await reader.readline()) not in (b"\r\n", b""):
+                pass
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            env = {"HTTPS_PROXY": f"http://127.0.0.1:{port}", "NO_PROXY": "127.0.0.1"}
+            with patch.dict(os.environ, env):
+                transport = InstrumentedTransport("proxy-test")
+            async with server, httpx.AsyncClient(transport=transport) as client:
+                with self.assertRaises(httpx.ProxyError):
+                    await client.get("https://soar.example/api/activity/1")
+                response = await client.get(f"http://127.0.0.1:{port}/api/activity/2")
+            return response
+
+        self.assertEqual(asyncio.run(run()).status_code, 502)
+        self.assertEqual(request_lines, ["CONNECT soar.example:443 HTTP/1.1", "GET /api/activity/2 HTTP/1.1"])
+
+    def test_record_sync(self):
+        """测试同步耗时与条目数，成功数中扣除忽略的条目"""
+        before = metrics.sync_items.get("test", "synced")
+        record_sync("test", 12.0, {"sync_result": {"success": 5, "ignored": 3, "failed": 1}})
+        record_sync("test", 1.0, {"error": "连接超时"})
+        self.assertEqual(metrics.sync_items.get("test", "synced"), before + 2)
+        self.assertEqual(metrics.sync_items.get("test", "failed"), 1)
+        self.assertEqual(metrics.sync_duration.count("test", "failed"), 1)
+
+
+@pytest.mark.usefixtures("catalog_store")
+class TestToolMetrics(unittest.TestCase):
+    """MCP 工具调用指标与 /metrics 端点测试"""
+
+    def setUp(self):
+        store = self.make_catalog_store(PlaybookData(id=1, name="pb", display_name="剧本"))
+        for name, value in (("playbook_catalog", store), ("audit_mcp_access", lambda **kwargs: None)):
+            patcher = patch.object(soar_mcp_server, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def call_tool(self, name, arguments):
+        async def run():
+            async with Client(soar_mcp_server.mcp) as client:
+                return await client.call_tool(name, arguments, raise_on_error=False)
+        return asyncio.run(run())
+
+    def test_tool_latency_and_error_results(self):
+        """测试工具调用计时，返回错误结果的调用计入失败次数"""
+        tool = "query_playbook_execution_params"
+        calls = metrics.tool_duration.count(tool)
+        errors = metrics.tool_errors.get(tool, "error")
+
+        self.call_tool(tool, {"playbook_id": 1})
+        self.assertEqual(metrics.tool_errors.get(tool, "error"), errors)
+        self.call_tool(tool, {"playbook_id": 999})
+        self.assertEqual(metrics.tool_duration.count(tool), calls + 2)
+        self.assertEqual(metrics.tool_errors.get(tool, "error"), errors + 1)
+
+    def test_unknown_tool_name_collapsed(self):
+        """测试调用未注册的工具名时指标记为 unknown，不为任意名称新建序列"""
+        unknown = metrics.tool_duration.count("unknown")
+        self.call_tool("no_such_tool_e3b0c442", {})
+        self.assertEqual(metrics.tool_duration.count("unknown"), unknown + 1)
+        self.assertEqual(metrics.tool_duration.count("no_such_tool_e3b0c442"), 0)
+
+    def get_metrics(self, headers=None):
+        async def run():
+            app = soar_mcp_server.mcp.http_app(path="/mcp")
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await client.get("/metrics", headers=headers)
+        return asyncio.run(run())
+
+    def test_metrics_requires_auth(self):
+        """测试 /metrics 需要 METRICS_TOKEN 或管理员 JWT"""
+        auth_manager = AuthManager(jwt_secret_key="test-secret")
+        with patch.object(soar_mcp_server, "METRICS_TOKEN", "scrape-secret"), \
+                patch.object(auth_utils, "_auth_manager", auth_manager):
+            self.assertEqual(self.get_metrics().status_code, 401)
+            self.assertEqual(self.get_metrics({"Authorization": "Bearer wrong"}).status_code, 401)
+            jwt = auth_manager.generate_jwt({"user_type": "admin"})
+            self.assertEqual(self.get_metrics({"Authorization": f"Bearer {jwt}"}).status_code, 200)
+
+    def test_metrics_endpoint(self):
+        """测试 /metrics 输出 Prometheus 文本格式"""
+        self.call_tool("list_playbooks_quick", {})
+        with patch.object(soar_mcp_server, "METRICS_TOKEN", "scrape-secret"):
+            response = self.get_metrics({"Authorization": "Bearer scrape-secret"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn('soar_mcp_tool_duration_seconds_count{tool="list_playbooks_quick"}', response.text)
+        self.assertIn('soar_mcp_db_pool_connections{state="executor_pending"}', response.text)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
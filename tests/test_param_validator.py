@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+剧本执行参数本地校验测试
+
+使用方法:
+    python tests/test_param_validator.py
+"""
+
+import sys
+import os
+import json
+import asyncio
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import PlaybookData, PlaybookParam
+from param_validator import ParamValidationError, ParamValidatorRegistry, PlaybookParamValidator
+
+
+def make_playbook(params=None, sync_time=None) -> PlaybookData:
+    if params is None:
+        params = [
+            PlaybookParam(cef_column="sourceAddress", cef_desc="源IP", value_type="STRING", required=True),
+            PlaybookParam(cef_column="destinationPort", cef_desc="目标端口", value_type="integer"),
+            PlaybookParam(cef_column="block", cef_desc="是否封禁", value_type="boolean"),
+        ]
+    return PlaybookData(id=1001, name="ip_block", playbook_params=params,
+                        sync_time=sync_time or datetime(2025, 1, 1))
+
+
+class TestPlaybookParamValidator(unittest.TestCase):
+    """单剧本校验器测试"""
+
+    def setUp(self):
+        self.validator = PlaybookParamValidator(make_playbook())
+
+    def test_valid_parameters(self):
+        """测试合法参数通过校验"""
+        self.assertEqual(self.validator.validate(
+            {"sourceAddress": "1.1.1.1", "destinationPort": "443", "block": "true"}), [])
+        self.assertEqual(self.validator.validate(
+            {"sourceAddress": "1.1.1.1", "destinationPort": 443, "block": False}), [])
+
+    def test_missing_required(self):
+        """测试缺少或为空的必填参数"""
+        self.assertEqual(self.validator.validate({}), ["缺少必填参数: sourceAddress"])
+        self.assertEqual(self.validator.validate({"sourceAddress": "  "}), ["缺少必填参数: sourceAddress"])
+
+    def test_unknown_parameter(self):
+        """测试未知参数被拒绝"""
+        errors = self.validator.validate({"sourceAddress": "1.1.1.1", "srcIp": "2.2.2.2"})
+        self.assertEqual(len(errors), 1)
+        self.assertIn("未知参数: srcIp", errors[0])
+
+    def test_type_mismatch(self):
+        """测试类型错误"""
+        errors = self.validator.validate({
+            "sourceAddress": {"ip": "1.1.1.1"},
+            "destinationPort": "https",
+            "block": "yes",
+        })
+        self.assertEqual(len(errors), 3)
+
+    def test_schema_without_params_accepts_anything(self):
+        """测试剧本无参数定义时不拦截"""
+        validator = PlaybookParamValidator(make_playbook(params=[]))
+        self.assertEqual(validator.validate({"anything": "x"}), [])
+
+    def test_parameters_must_be_dict(self):
+        """测试 parameters 非对象时报错"""
+        self.assertEqual(len(self.validator.validate(["1.1.1.1"])), 1)
+
+
+class TestParamValidatorRegistry(unittest.TestCase):
+    """校验器缓存测试"""
+
+    def test_validator_is_cached_until_resync(self):
+        """测试校验器按剧本缓存，同步时间变化后重建"""
+        registry = ParamValidatorRegistry()
+        playbook = make_playbook()
+        first = registry.get(playbook)
+        self.assertIs(registry.get(make_playbook()), first)
+
+        resynced = make_playbook(params=[], sync_time=datetime(2025, 1, 2))
+        self.assertIsNot(registry.get(resynced), first)
+        registry.validate(resynced, {"anything": "x"})
+
+    def test_validate_raises(self):
+        """测试校验失败抛出异常并携带错误列表"""
+        registry = ParamValidatorRegistry()
+        with self.assertRaises(ParamValidationError) as ctx:
+            registry.validate(make_playbook(), {})
+        self.assertEqual(ctx.exception.errors, ["缺少必填参数: sourceAddress"])
+
+    def test_clear(self):
+        """测试清空缓存"""
+        registry = ParamValidatorRegistry()
+        registry.get(make_playbook())
+        registry.clear()
+        self.assertEqual(len(registry), 0)
+
+
+@pytest.mark.usefixtures("catalog_store")
+class TestExecutePlaybookValidation(unittest.TestCase):
+    """execute_playbook 参数校验集成测试"""
+
+    def test_invalid_parameters_rejected_before_network(self):
+        """测试参数不合法时不调用SOAR API"""
+        import soar_mcp_server
+
+        async def no_client():
+            raise AssertionError("不应发起网络请求")
+
+        with patch.object(soar_mcp_server, "playbook_catalog", self.make_catalog_store(make_playbook())), \
+                patch.object(soar_mcp_server, "get_soar_client", no_client), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            result = json.loads(asyncio.run(soar_mcp_server.execute_playbook(
+                1001, {"destinationPort": "abc"})))
+
+        self.assertFalse(result["success"])
+        self.assertEqual(len(result["details"]), 2)
+
+
+    def test_rendered_schema_matches_validation(self):
+        """测试参数查询返回的必填标记与执行时的校验一致"""
+        import soar_mcp_server
+        from playbook_catalog import PlaybookCatalog
+
+        playbook = make_playbook()
+        rendered = json.loads(soar_mcp_server.render_playbook_params(
+            PlaybookCatalog.from_playbooks([playbook]), 1001))
+        required = {p["paramName"]: p["required"] for p in rendered["requiredParams"]}
+        self.assertEqual(required, {"sourceAddress": True, "destinationPort": False, "block": False})
+
+        validator = PlaybookParamValidator(playbook)
+        self.assertEqual(validator.validate({"sourceAddress": "1.1.1.1"}), [])
+        self.assertEqual(validator.validate({}), ["缺少必填参数: sourceAddress"])
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
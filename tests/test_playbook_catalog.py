@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+剧本内存目录测试
+
+使用方法:
+    python tests/test_playbook_catalog.py
+"""
+
+import sys
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import DatabaseManager, PlaybookData, PlaybookParam
+from playbook_catalog import PlaybookCatalog, PlaybookCatalogStore
+
+
+def make_playbook(playbook_id: int, category: str = "enrichment") -> PlaybookData:
+    return PlaybookData(
+        id=playbook_id, name=f"pb_{playbook_id}", display_name=f"剧本{playbook_id}",
+        playbook_category=category,
+        playbook_params=[PlaybookParam(cef_column="sourceAddress", cef_desc="源IP", value_type="string")],
+    )
+
+
+class TestPlaybookCatalog(unittest.TestCase):
+    """PlaybookCatalog 快照测试"""
+
+    def setUp(self):
+        self.catalog = PlaybookCatalog.from_playbooks(
+            [make_playbook(3, "containment"), make_playbook(1), make_playbook(2)], disabled_ids=[2])
+
+    def test_lists_enabled_sorted(self):
+        """测试列表只包含启用剧本且按ID排序"""
+        self.assertEqual([p.id for p in self.catalog.list()], [1, 3])
+        self.assertEqual([p.id for p in self.catalog.list(limit=1)], [1])
+        self.assertEqual([p.id for p in self.catalog.list(category="containment")], [3])
+        self.assertEqual(self.catalog.list(category="unknown"), ())
+
+    def test_get_includes_disabled(self):
+        """测试按ID查询包含已禁用剧本"""
+        self.assertEqual(self.catalog.get(2).name, "pb_2")
+        self.assertIsNone(self.catalog.get(99))
+
+    def test_snapshot_is_read_only(self):
+        """测试快照映射不可修改"""
+        with self.assertRaises(TypeError):
+            self.catalog.by_id[4] = make_playbook(4)
+
+    def test_versions_increase(self):
+        """测试每次构建版本号递增"""
+        newer = PlaybookCatalog.from_playbooks([])
+        self.assertGreater(newer.version, self.catalog.version)
+
+
+class TestPlaybookCatalogStore(unittest.TestCase):
+    """目录构建与替换测试"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.temp_dir.name, "test.db"))
+        self.db.init_db()
+        for i in (1, 2):
+            self.db.save_playbook(make_playbook(i))
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def test_rebuild_after_toggle(self):
+        """测试启用状态变化后重建，旧快照保持不变"""
+        store = PlaybookCatalogStore(self.db)
+        old = store.current
+        self.assertEqual(len(old.enabled), 2)
+
+        self.db.update_playbook_status(2, False)
+        self.assertIs(store.current, old)
+
+        new = store.rebuild()
+        self.assertIs(store.current, new)
+        self.assertEqual([p.id for p in new.enabled], [1])
+        self.assertEqual(len(old.enabled), 2)
+        self.assertEqual(new.get(1).playbook_params[0].cef_column, "sourceAddress")
+
+    def test_refresh_after_change_in_other_process(self):
+        """测试其他进程修改剧本后按版本号重建，未变化时不重建"""
+        store = PlaybookCatalogStore(self.db)
+        old = store.current
+        self.assertFalse(store.refresh_if_changed())
+
+        other = DatabaseManager(self.db.db_path)
+        try:
+            other.update_playbook_status(2, False)
+        finally:
+            other.engine.dispose()
+
+        self.assertTrue(store.refresh_if_changed())
+        self.assertIsNot(store.current, old)
+        self.assertEqual([p.id for p in store.current.enabled], [1])
+        self.assertFalse(store.refresh_if_changed())
+
+
+class TestReadToolsUseCatalog(unittest.TestCase):
+    """读取类工具从目录读取测试"""
+
+    def test_tools_do_not_touch_database(self):
+        """测试剧本列表与参数查询不访问数据库"""
+        import soar_mcp_server
+
+        store = PlaybookCatalogStore(None)
+        store.replace(PlaybookCatalog.from_playbooks([make_playbook(1), make_playbook(2, "containment")]))
+
+        with patch.object(soar_mcp_server, "playbook_catalog", store), \
+                patch.object(soar_mcp_server.db_manager, "get_session",
+                             side_effect=AssertionError("不应访问数据库")), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            listing = json.loads(soar_mcp_server.list_playbooks_quick(category="containment"))
+            params = json.loads(soar_mcp_server.query_playbook_execution_params("1"))
+            resource = json.loads(soar_mcp_server.get_playbooks_resource())
+
+        self.assertEqual(listing["playbooks"], [{"id": 2, "name": "pb_2", "displayName": "剧本2"}])
+        self.assertEqual(params["requiredParams"][0]["paramName"], "sourceAddress")
+        self.assertEqual(len(resource), 2)
+
+
+class TestPrerenderedResponses(unittest.TestCase):
+    """预渲染响应缓存测试"""
+
+    def setUp(self):
+        import soar_mcp_server
+        self.server = soar_mcp_server
+        self.store = PlaybookCatalogStore(None)
+        self.store.add_warmer(soar_mcp_server.prerender_playbook_responses)
+        self.store.replace(PlaybookCatalog.from_playbooks([make_playbook(1), make_playbook(2, "containment")]))
+
+    def call(self, func, *args, **kwargs):
+        with patch.object(self.server, "playbook_catalog", self.store), \
+                patch.object(self.server, "audit_mcp_access"):
+            return func(*args, **kwargs)
+
+    def test_common_responses_prerendered(self):
+        """测试发布快照时预渲染全部列表、分类列表与剧本参数"""
+        catalog = self.store.current
+        # 全部列表 + 2个分类 + 2个剧本参数
+        self.assertEqual(catalog.cached_count(), 5)
+
+        with patch.object(self.server.json, "dumps", side_effect=AssertionError("不应重新序列化")):
+            listing = self.call(self.server.list_playbooks_quick)
+            by_category = self.call(self.server.list_playbooks_quick, category="containment")
+            params = self.call(self.server.query_playbook_execution_params, "2")
+
+        self.assertEqual(json.loads(listing)["total"], 2)
+        self.assertEqual(json.loads(by_category)["playbooks"][0]["id"], 2)
+        self.assertEqual(json.loads(params)["playbookId"], 2)
+        self.assertIs(self.call(self.server.list_playbooks_quick), listing)
+
+    def test_uncommon_arguments_not_cached(self):
+        """测试未知分类与截断的 limit 不进入缓存"""
+        catalog = self.store.current
+        self.assertEqual(json.loads(self.call(self.server.list_playbooks_quick, category="nope"))["total"], 0)
+        self.assertEqual(json.loads(self.call(self.server.list_playbooks_quick, limit=1))["total"], 1)
+        self.assertEqual(catalog.cached_count(), 5)
+
+    def test_new_version_renders_fresh(self):
+        """测试目录替换后响应随新版本重新渲染"""
+        before = json.loads(self.call(self.server.list_playbooks_quick))
+        self.store.replace(PlaybookCatalog.from_playbooks([make_playbook(1)]))
+        after = json.loads(self.call(self.server.list_playbooks_quick))
+        self.assertEqual((before["total"], after["total"]), (2, 1))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -6,7 +6,7 @@ import requests
 import json
 import sys
 
-BASE_URL = "http://127.0.0.1:12346"
+BASE_URL = "http://127.0.0.1:12345"
 
 def test_playbook_params():
     """测试剧本参数显示功能"""
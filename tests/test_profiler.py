@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+在线采样分析器测试
+
+使用方法:
+    python tests/test_profiler.py
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth_utils
+import profiler
+import soar_mcp_server
+from auth_utils import AuthManager
+from profiler import ProfilerBusy, SamplingProfiler
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    """调用栈采样测试"""
+
+    def start_thread(self, target, name):
+        stop = threading.Event()
+        thread = threading.Thread(target=target, args=(stop,), name=name, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+        return stop
+
+    def parse(self, collapsed):
+        stacks = {}
+        for line in collapsed.splitlines():
+            stack, count = line.rsplit(" ", 1)
+            stacks[stack] = int(count)
+        return stacks
+
+    def test_busy_thread_collapsed_stack(self):
+        """测试忙碌线程的调用栈以线程名为根、按调用顺序折叠"""
+        self.start_thread(busy_loop, "busy-worker")
+        sampler = SamplingProfiler(interval=0.005, thread_filter="busy-worker")
+        stacks = self.parse(sampler.run(0.2))
+
+        self.assertGreater(sampler.samples, 5)
+        self.assertTrue(stacks)
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            self.assertEqual(frames[0], "busy-worker")
+            self.assertGreater(count, 0)
+        self.assertTrue(any(frame.startswith("busy_loop (tests/test_profiler.py:")
+                            for stack in stacks for frame in stack.split(";")))
+
+    def test_idle_threads_skipped_by_default(self):
+        """测试空闲等待的线程默认不计入，include_idle 时保留"""
+        self.start_thread(lambda stop: stop.wait(), "idle-worker")
+        idle = SamplingProfiler(thread_filter="idle-worker")
+        idle.sample()
+        self.assertEqual(idle.collapsed(), "")
+
+        included = SamplingProfiler(include_idle=True, thread_filter="idle-worker")
+        included.sample()
+        self.assertTrue(included.collapsed().startswith("idle-worker;"))
+
+    def test_concurrent_profile_rejected(self):
+        """测试同一时刻只允许一次采样"""
+        with profiler._profile_lock:
+            with self.assertRaises(ProfilerBusy):
+                profiler.profile(0.01)
+        collapsed, samples = profiler.profile(0.02, interval=0.005)
+        self.assertGreater(samples, 0)
+
+
+class TestProfileRoute(unittest.TestCase):
+    """管理后台采样端点测试"""
+
+    def setUp(self):
+        auth_manager = AuthManager(jwt_secret_key="test-secret")
+        patcher = patch.object(auth_utils, "_auth_manager", auth_manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.jwt = auth_manager.generate_jwt({"user_type": "admin"})
+        self.app = soar_mcp_server.mcp.http_app(path="/mcp")
+
+    def post(self, body, authorized=True):
+        headers = {"Authorization": f"Bearer {self.jwt}"} if authorized else {}
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app),
+                                         base_url="http://test") as client:
+                return await client.post("/api/admin/profile", json=body, headers=headers)
+        return asyncio.run(run())
+
+    def test_profile_returns_collapsed_file(self):
+        """测试采样期间事件循环保持运行并出现在折叠栈中"""
+        response = self.post({"seconds": 0.3, "interval": 0.005, "include_idle": True})
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn(".collapsed", response.headers["content-disposition"])
+        self.assertGreater(int(response.headers["x-profile-samples"]), 0)
+        self.assertIn("MainThread;", response.text)
+
+    def test_requires_jwt(self):
+        """测试未登录不能采样"""
+        self.assertEqual(self.post({"seconds": 0.1}, authorized=False).status_code, 401)
+
+    def test_invalid_parameters(self):
+        """测试采样时长与间隔越界时返回 400"""
+        for body in ({"seconds": 0}, {"seconds": 3600}, {"seconds": "10"},
+                     {"interval": 0}, {"seconds": 1, "thread": 1}, [1]):
+            self.assertEqual(self.post(body).status_code, 400, body)
+
+    def test_busy_returns_conflict(self):
+        """测试已有采样进行时返回 409"""
+        with profiler._profile_lock:
+            self.assertEqual(self.post({"seconds": 0.1}).status_code, 409)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
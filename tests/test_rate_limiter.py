@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+按Token速率限制测试
+
+使用方法:
+    python tests/test_rate_limiter.py
+"""
+
+import sys
+import os
+import json
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_context import set_current_user_info
+from rate_limiter import DEFAULT_POLICY, KIND_EXECUTE, KIND_STATUS, RateLimiter, RateLimitExceeded
+
+
+class FakeClock:
+    """可手动推进的时钟，sleep 直接推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def make_limiter(clock: FakeClock, **overrides) -> RateLimiter:
+    policy = dict(DEFAULT_POLICY, **overrides)
+    return RateLimiter(policy_loader=lambda: policy, clock=clock, sleep=clock.sleep)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """RateLimiter 单元测试"""
+
+    def test_burst_then_wait(self):
+        """测试突发容量用尽后排队等待补充令牌"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, rate_limit_execute_per_minute=60, rate_limit_execute_burst=3,
+                               rate_limit_max_wait=2.0)
+        token = {"id": 1}
+
+        async def run():
+            for _ in range(3):
+                await limiter.acquire(KIND_EXECUTE, token)
+            self.assertEqual(clock.slept, [])
+            # 第4次需要等待1秒补充令牌
+            await limiter.acquire(KIND_EXECUTE, token)
+            self.assertEqual(clock.slept, [1.0])
+
+        asyncio.run(run())
+
+    def test_queue_is_bounded(self):
+        """测试并发排队的调用按间隔放行，超过最大等待时间的被拒绝"""
+        # 时钟不推进，所有调用在同一时刻到达
+        policy = dict(DEFAULT_POLICY, rate_limit_execute_per_minute=60, rate_limit_execute_burst=1,
+                      rate_limit_max_wait=2.0)
+        limiter = RateLimiter(policy_loader=lambda: policy, clock=FakeClock(),
+                              sleep=lambda seconds: asyncio.sleep(0))
+        token = {"id": 1}
+
+        async def run():
+            return await asyncio.gather(*[limiter.acquire(KIND_EXECUTE, token) for _ in range(5)],
+                                        return_exceptions=True)
+
+        results = asyncio.run(run())
+        rejected = [r for r in results if isinstance(r, RateLimitExceeded)]
+        self.assertEqual(len(rejected), 2)
+        self.assertGreater(rejected[0].retry_after, 2.0)
+
+    def test_tokens_are_isolated(self):
+        """测试不同Token互不影响"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, rate_limit_status_per_minute=60, rate_limit_status_burst=1,
+                               rate_limit_max_wait=0)
+
+        async def run():
+            await limiter.acquire(KIND_STATUS, {"id": 1})
+            await limiter.acquire(KIND_STATUS, {"id": 2})
+            with self.assertRaises(RateLimitExceeded):
+                await limiter.acquire(KIND_STATUS, {"id": 1})
+
+        asyncio.run(run())
+
+    def test_cost_counts_each_unit(self):
+        """测试按数量计费：超过突发容量的批量调用在令牌补满时准入，欠额由后续调用偿还"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, rate_limit_status_per_minute=60, rate_limit_status_burst=10,
+                               rate_limit_max_wait=0)
+        token = {"id": 1}
+
+        async def run():
+            await limiter.acquire(KIND_STATUS, token, cost=50)
+            with self.assertRaises(RateLimitExceeded) as cm:
+                await limiter.acquire(KIND_STATUS, token)
+            self.assertAlmostEqual(cm.exception.retry_after, 41.0)
+            clock.now += 41.0
+            await limiter.acquire(KIND_STATUS, token)
+
+        asyncio.run(run())
+
+    def test_per_token_override(self):
+        """测试Token自定义速率优先于系统配置，0表示不限"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, rate_limit_execute_per_minute=1, rate_limit_execute_burst=1,
+                               rate_limit_max_wait=0)
+
+        async def run():
+            for _ in range(20):
+                await limiter.acquire(KIND_EXECUTE, {"id": 1, "execute_rate_limit": 0})
+            self.assertEqual(limiter.limit_for(KIND_EXECUTE, {"id": 2, "execute_rate_limit": 120})[0], 120)
+
+        asyncio.run(run())
+
+    def test_no_token_is_not_limited(self):
+        """测试无Token上下文的调用不限流"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, rate_limit_execute_per_minute=1, rate_limit_execute_burst=1,
+                               rate_limit_max_wait=0)
+
+        async def run():
+            for _ in range(5):
+                await limiter.acquire(KIND_EXECUTE, None)
+
+        asyncio.run(run())
+        self.assertEqual(limiter.stats()["buckets"], 0)
+
+
+class TestRateLimitColumns(unittest.TestCase):
+    """Token速率限制字段与数据库迁移测试"""
+
+    def test_migrate_existing_database(self):
+        """测试旧数据库初始化时补充速率限制列"""
+        from models import DatabaseManager
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "old.db")
+            old_db = DatabaseManager(db_path)
+            old_db.init_db()
+            old_db.engine.dispose()
+            # 模拟旧版本数据库：删除新增列
+            conn = sqlite3.connect(db_path)
+            conn.execute("ALTER TABLE user_tokens DROP COLUMN execute_rate_limit")
+            conn.execute("ALTER TABLE user_tokens DROP COLUMN status_rate_limit")
+            conn.commit()
+            conn.close()
+
+            db = DatabaseManager(db_path)
+            db.init_db()
+            token = db.create_user_token("agent")
+            token_id = db.get_token_by_value(token)["id"]
+            self.assertTrue(db.update_token_rate_limits(token_id, 10, None))
+
+            info = db.get_token_by_value(token)
+            self.assertEqual(info["execute_rate_limit"], 10)
+            self.assertIsNone(info["status_rate_limit"])
+            db.engine.dispose()
+
+
+class TestToolRateLimit(unittest.TestCase):
+    """工具速率限制集成测试"""
+
+    def test_execute_playbook_rejected_with_retry_hint(self):
+        """测试超限时 execute_playbook 快速拒绝并返回重试时间"""
+        import soar_mcp_server
+
+        clock = FakeClock()
+        limiter = make_limiter(clock, rate_limit_execute_per_minute=60, rate_limit_execute_burst=1,
+                               rate_limit_max_wait=0)
+
+        async def fake_launch(playbook_id, parameters=None, event_id=0):
+            return "act-rl-1"
+
+        async def run():
+            set_current_user_info("tok", {"id": 42, "name": "agent"})
+            first = await soar_mcp_server.execute_playbook(1)
+            second = await soar_mcp_server.execute_playbook(1)
+            return json.loads(first), json.loads(second)
+
+        with patch.object(soar_mcp_server, "rate_limiter", limiter), \
+                patch.object(soar_mcp_server, "launch_playbook", fake_launch), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            first, second = asyncio.run(run())
+
+        self.assertTrue(first["success"])
+        self.assertTrue(second["rateLimited"])
+        self.assertAlmostEqual(second["retryAfter"], 1.0)
+
+    def test_status_batch_charged_per_activity(self):
+        """测试批量状态查询按活动数计入状态查询限额"""
+        import soar_mcp_server
+
+        limiter = make_limiter(FakeClock(), rate_limit_status_per_minute=60, rate_limit_status_burst=3,
+                               rate_limit_max_wait=0)
+
+        async def fake_fetch(activity_id):
+            return {"executeStatus": "SUCCESS"}
+
+        async def run():
+            set_current_user_info("tok", {"id": 42, "name": "agent"})
+            first = await soar_mcp_server.query_execution_statuses(["a1", "a2"])
+            second = await soar_mcp_server.query_execution_statuses(["a3", "a4"])
+            return json.loads(first), json.loads(second)
+
+        with patch.object(soar_mcp_server, "rate_limiter", limiter), \
+                patch.object(soar_mcp_server, "fetch_execution_status", fake_fetch), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            first, second = asyncio.run(run())
+
+        self.assertTrue(first["success"])
+        self.assertTrue(second["rateLimited"])
+        self.assertAlmostEqual(second["retryAfter"], 1.0)
+
+
+class TestRequestContext(unittest.TestCase):
+    """认证后端写入的Token上下文在工具中可见"""
+
+    def test_bearer_token_reaches_tool_context(self):
+        """测试经 BearerOrQueryAuthBackend 认证的请求，工具侧能读到调用方Token并按其限流"""
+        import httpx
+        import auth_provider
+        import soar_mcp_server
+        from models import DatabaseManager
+        from request_context import current_user_id
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db = DatabaseManager(os.path.join(temp_dir, "test.db"))
+            db.init_db()
+            token = db.create_user_token("ci")
+            token_id = db.get_token_by_value(token)["id"]
+            limiter = make_limiter(FakeClock(), rate_limit_execute_per_minute=60, rate_limit_execute_burst=1,
+                                   rate_limit_max_wait=0)
+            seen = []
+
+            async def fake_launch(playbook_id, parameters=None, event_id=0):
+                seen.append(current_user_id())
+                return "act-ctx-1"
+
+            app = soar_mcp_server.mcp.http_app(path="/mcp", stateless_http=True, json_response=True)
+            request = {"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                       "params": {"name": "execute_playbook", "arguments": {"playbook_id": 1}}}
+
+            async def run():
+                async with app.router.lifespan_context(app):
+                    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                                 base_url="http://test") as client:
+                        responses = []
+                        for _ in range(2):
+                            response = await client.post("/mcp", json=request, headers={
+                                "Authorization": f"Bearer {token}",
+                                "Accept": "application/json, text/event-stream"})
+                            responses.append(json.loads(response.json()["result"]["content"][0]["text"]))
+                        return responses
+
+            with patch.object(auth_provider, "db_manager", db), \
+                    patch.object(soar_mcp_server, "rate_limiter", limiter), \
+                    patch.object(soar_mcp_server, "launch_playbook", fake_launch), \
+                    patch.object(soar_mcp_server, "audit_mcp_access"):
+                first, second = asyncio.run(run())
+            db.engine.dispose()
+
+        self.assertEqual(seen, [token_id])
+        self.assertTrue(first["success"])
+        self.assertTrue(second["rateLimited"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
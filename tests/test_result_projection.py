@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+执行结果投影与分页测试
+
+使用方法:
+    python tests/test_result_projection.py
+"""
+
+import sys
+import os
+import json
+import asyncio
+import unittest
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_projection import (
+    ProjectionError, build_result_view, decode_cursor, encode_cursor, parse_path, select_fields
+)
+
+
+def make_payload(node_count: int = 5) -> dict:
+    """构造与 /odp/core/v1/api/event/activity 结构一致的执行结果"""
+    return {
+        "code": 200,
+        "result": {
+            "activity": {"executeStatus": "SUCCESS", "displayName": "demo_ip情报信息调查"},
+            "nodeResults": [
+                {
+                    "nodeResultModel": {"nodeName": f"node_{i}", "excuteStatus": "SUCCESS"},
+                    "assetResultModels": [{"detailModels": [{"jsonData": {"data": "x" * 50}}]}],
+                } for i in range(node_count)
+            ],
+        },
+    }
+
+
+class TestPathParsing(unittest.TestCase):
+    """路径解析测试"""
+
+    def test_parse_path(self):
+        """测试解析键、下标与通配符"""
+        self.assertEqual(parse_path("result.nodeResults[*].nodeResultModel"),
+                         ["result", "nodeResults", "*", "nodeResultModel"])
+        self.assertEqual(parse_path("result.nodeResults[2]"), ["result", "nodeResults", 2])
+
+    def test_parse_invalid_path(self):
+        """测试非法路径"""
+        with self.assertRaises(ProjectionError):
+            parse_path("")
+        with self.assertRaises(ProjectionError):
+            parse_path("result.nodeResults[abc]")
+
+
+class TestSelectFields(unittest.TestCase):
+    """字段投影测试"""
+
+    def test_select_nested_fields(self):
+        """测试多路径投影合并为同一结构"""
+        payload = make_payload(2)
+        view = select_fields(payload, [
+            "result.activity.executeStatus",
+            "result.nodeResults[*].nodeResultModel.nodeName",
+        ])
+        self.assertEqual(view, {
+            "result": {
+                "activity": {"executeStatus": "SUCCESS"},
+                "nodeResults": [
+                    {"nodeResultModel": {"nodeName": "node_0"}},
+                    {"nodeResultModel": {"nodeName": "node_1"}},
+                ],
+            }
+        })
+
+    def test_select_does_not_mutate_source(self):
+        """测试投影不修改原始结果"""
+        payload = make_payload(2)
+        snapshot = json.dumps(payload, sort_keys=True)
+        select_fields(payload, ["result.nodeResults[0]"])
+        self.assertEqual(json.dumps(payload, sort_keys=True), snapshot)
+
+    def test_missing_fields_are_omitted(self):
+        """测试不存在的路径被忽略"""
+        self.assertEqual(select_fields(make_payload(1), ["result.unknown"]), {})
+
+
+class TestBuildResultView(unittest.TestCase):
+    """分页与大小限制测试"""
+
+    def test_page_with_limit(self):
+        """测试按 offset/limit 分页并返回续取游标"""
+        rendered, page = build_result_view({"success": True}, make_payload(5),
+                                           page_path="result.nodeResults", offset=1, limit=2)
+        body = json.loads(rendered)
+        nodes = body["executionResult"]["result"]["nodeResults"]
+        self.assertEqual([n["nodeResultModel"]["nodeName"] for n in nodes], ["node_1", "node_2"])
+        self.assertEqual(page["nextOffset"], 3)
+        self.assertTrue(page["hasMore"])
+        self.assertEqual(decode_cursor(page["nextCursor"])["offset"], 3)
+
+    def test_max_bytes_shrinks_page(self):
+        """测试超过 max_bytes 时缩小当前页，且可通过游标取完全部数据"""
+        payload = make_payload(20)
+        seen = []
+        offset = 0
+        while True:
+            rendered, page = build_result_view({"success": True}, payload,
+                                               page_path="result.nodeResults",
+                                               offset=offset, max_bytes=800)
+            self.assertLessEqual(len(rendered.encode("utf-8")), 800)
+            body = json.loads(rendered)
+            seen.extend(n["nodeResultModel"]["nodeName"]
+                        for n in body["executionResult"]["result"]["nodeResults"])
+            if not page["hasMore"]:
+                break
+            offset = decode_cursor(page["nextCursor"])["offset"]
+
+        self.assertEqual(seen, [f"node_{i}" for i in range(20)])
+
+    def test_max_bytes_without_page_path(self):
+        """测试无可分页数组时返回截断提示"""
+        rendered, _ = build_result_view({"success": True}, make_payload(20), max_bytes=200)
+        body = json.loads(rendered)
+        self.assertTrue(body["truncated"])
+        self.assertNotIn("executionResult", body)
+
+    def test_default_page_path(self):
+        """测试指定 max_bytes 未指定 page_path 时对默认数组分页，游标记录实际分页路径"""
+        rendered, page = build_result_view({"success": True}, make_payload(20), max_bytes=800,
+                                           default_page_path="result.nodeResults")
+        self.assertEqual(page["path"], "result.nodeResults")
+        self.assertEqual(decode_cursor(page["nextCursor"])["page_path"], "result.nodeResults")
+        self.assertNotIn("truncated", json.loads(rendered))
+
+    def test_page_path_must_be_array(self):
+        """测试分页路径必须指向数组"""
+        with self.assertRaises(ProjectionError):
+            build_result_view({}, make_payload(1), page_path="result.activity")
+
+    def test_cursor_roundtrip(self):
+        """测试游标编解码"""
+        state = {"activityId": "a1", "offset": 10, "fields": ["result.activity"]}
+        self.assertEqual(decode_cursor(encode_cursor(state)), state)
+        with self.assertRaises(ProjectionError):
+            decode_cursor("not-a-cursor!")
+
+
+class TestResultTool(unittest.TestCase):
+    """执行结果工具集成测试"""
+
+    def test_tool_pages_with_cursor(self):
+        """测试工具按 max_bytes 分页并支持游标续取"""
+        import soar_mcp_server
+
+        payload = make_payload(10)
+
+        async def fake_fetch(activity_id):
+            return payload
+
+        async def run():
+            tool = soar_mcp_server.query_playbook_execution_result_by_activity_id
+            first = json.loads(await tool("act-page-1", max_bytes=1000))
+            second = json.loads(await tool("act-page-1", cursor=first["page"]["nextCursor"]))
+            mismatch = json.loads(await tool("act-other", cursor=first["page"]["nextCursor"]))
+            return first, second, mismatch
+
+        with patch.object(soar_mcp_server, "fetch_execution_result", fake_fetch), \
+                patch.object(soar_mcp_server, "audit_mcp_access"):
+            first, second, mismatch = asyncio.run(run())
+
+        self.assertEqual(first["page"]["path"], "result.nodeResults")
+        self.assertEqual(second["page"]["offset"], first["page"]["nextOffset"])
+        self.assertFalse(mismatch["success"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
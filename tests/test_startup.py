@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+后台启动同步与就绪检查测试
+
+使用方法:
+    python tests/test_startup.py
+"""
+
+import sys
+import os
+import time
+import subprocess
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+
+import auth_utils
+import soar_mcp_server
+from auth_utils import AuthManager
+from models import PlaybookData
+
+
+def get_ready(app, path: str = "/ready", headers: dict = None) -> httpx.Response:
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+    return asyncio.run(run())
+
+
+@pytest.mark.usefixtures("catalog_store")
+class TestReadiness(unittest.TestCase):
+    """就绪检查测试"""
+
+    def setUp(self):
+        self.config = {"sync_interval": 3600}
+        patcher = patch.object(soar_mcp_server.config_manager, "get",
+                               side_effect=lambda key, default=None: self.config.get(key, default))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        auth_manager = AuthManager(jwt_secret_key="test-secret")
+        patcher = patch.object(auth_utils, "_auth_manager", auth_manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.admin_headers = {"Authorization": f"Bearer {auth_manager.generate_jwt({'user_type': 'admin'})}"}
+        self.app = soar_mcp_server.mcp.http_app(path="/mcp")
+
+    def get_report(self) -> httpx.Response:
+        return get_ready(self.app, "/api/admin/ready", self.admin_headers)
+
+    def test_not_ready_before_catalog_loaded(self):
+        """测试剧本目录未加载时返回 503"""
+        with patch.object(soar_mcp_server, "playbook_catalog", self.make_catalog_store()):
+            response = get_ready(self.app)
+            report = self.get_report()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {"ready": False})
+        self.assertEqual(report.status_code, 503)
+
+    def test_public_probe_omits_details(self):
+        """测试无需认证的 /ready 只返回是否就绪，详细报告需要管理员 JWT"""
+        with patch.object(soar_mcp_server, "playbook_catalog", self.make_catalog_store(PlaybookData(id=1, name="pb"))):
+            response = get_ready(self.app)
+            unauthorized = get_ready(self.app, "/api/admin/ready")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"ready": True})
+        self.assertEqual(unauthorized.status_code, 401)
+
+    def test_ready_with_stale_catalog(self):
+        """测试使用已持久化的旧目录即可就绪，并标记过期"""
+        old = datetime.now() - timedelta(hours=5)
+        playbook = PlaybookData(id=1, name="pb", sync_time=old)
+        with patch.object(soar_mcp_server, "playbook_catalog", self.make_catalog_store(playbook)):
+            response = self.get_report()
+
+        body = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(body["ready"])
+        self.assertEqual(body["catalog"]["playbooks"], 1)
+        self.assertTrue(body["catalog"]["stale"])
+        self.assertGreater(body["catalog"]["ageSeconds"], 4 * 3600)
+
+    def test_fresh_after_recent_sync(self):
+        """测试最近同步过的目录不视为过期"""
+        self.config["last_sync_time"] = (datetime.now() - timedelta(minutes=5)).isoformat()
+        with patch.object(soar_mcp_server, "playbook_catalog", self.make_catalog_store(PlaybookData(id=1, name="pb"))):
+            body = self.get_report().json()
+        self.assertFalse(body["catalog"]["stale"])
+
+
+class FakeSyncService:
+    """替代 PlaybookSyncService，返回预设的同步结果"""
+
+    result = {"playbooks": {}}
+    delay = 0.0
+
+    def __init__(self, db_manager):
+        pass
+
+    async def full_sync(self):
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+class TestBackgroundStartupSync(unittest.TestCase):
+    """后台启动同步测试"""
+
+    def setUp(self):
+        self.elector = SimpleNamespace(is_leader=True)
+        patcher = patch.object(soar_mcp_server, "leader_elector", self.elector)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sync_runs_in_background(self):
+        """测试慢速同步不阻塞启动，完成后更新同步状态"""
+        class SlowSync(FakeSyncService):
+            delay = 0.3
+
+        with patch.object(soar_mcp_server, "PlaybookSyncService", SlowSync), \
+                patch.object(soar_mcp_server.config_manager, "is_first_run", return_value=False), \
+                patch.dict(os.environ, {"SKIP_SYNC": "false"}):
+            started = time.perf_counter()
+            thread = soar_mcp_server.start_background_startup_sync()
+            self.assertLess(time.perf_counter() - started, 0.1)
+            time.sleep(0.1)
+            self.assertEqual(soar_mcp_server.initial_sync_state["state"], "running")
+            thread.join(5)
+
+        self.assertEqual(soar_mcp_server.initial_sync_state["state"], "succeeded")
+        self.assertIsNotNone(soar_mcp_server.initial_sync_state["finishedAt"])
+
+    def test_failed_sync_recorded(self):
+        """测试同步失败时记录错误，服务仍可使用旧目录"""
+        class FailingSync(FakeSyncService):
+            result = {"error": "连接超时"}
+
+        with patch.object(soar_mcp_server, "PlaybookSyncService", FailingSync), \
+                patch.object(soar_mcp_server.config_manager, "is_first_run", return_value=False), \
+                patch.dict(os.environ, {"SKIP_SYNC": "false"}):
+            soar_mcp_server.start_background_startup_sync().join(5)
+
+        self.assertEqual(soar_mcp_server.initial_sync_state["state"], "failed")
+        self.assertEqual(soar_mcp_server.initial_sync_state["error"], "连接超时")
+
+    def test_follower_skips_sync(self):
+        """测试非主节点 worker 不执行启动同步"""
+        self.elector.is_leader = False
+
+        class UnexpectedSync(FakeSyncService):
+            def __init__(self, db):
+                raise AssertionError("非主节点不应同步")
+
+        with patch.object(soar_mcp_server, "PlaybookSyncService", UnexpectedSync), \
+                patch.object(soar_mcp_server.config_manager, "is_first_run", return_value=False), \
+                patch.dict(os.environ, {"SKIP_SYNC": "false"}):
+            soar_mcp_server.start_background_startup_sync().join(5)
+
+        self.assertEqual(soar_mcp_server.initial_sync_state["state"], "skipped")
+
+
+class TestLazyImports(unittest.TestCase):
+    """非关键依赖延迟导入测试"""
+
+    def test_server_import_skips_admin_dependencies(self):
+        """测试导入 MCP 服务不会加载 Flask、bcrypt、jwt 与 requests，也不会创建数据库引擎"""
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = ("import sys, models, soar_mcp_server; "
+                  "print('LOADED=' + ','.join(m for m in ('flask', 'bcrypt', 'jwt', 'requests') if m in sys.modules)); "
+                  "print('ENGINE=' + str(models.db_manager._engine))")
+        proc = subprocess.run([sys.executable, "-c", script], cwd=project_root,
+                              capture_output=True, text=True, timeout=60)
+        self.assertEqual(proc.returncode, 0, proc.stderr[-2000:])
+        self.assertIn("LOADED=\n", proc.stdout)
+        self.assertIn("ENGINE=None\n", proc.stdout)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
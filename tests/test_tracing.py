@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+请求链路追踪测试
+
+使用方法:
+    python tests/test_tracing.py
+"""
+
+import sys
+import os
+import asyncio
+import json
+import logging
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+# 将项目根目录添加到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth_provider
+import soar_mcp_server
+import tracing
+from async_db import db_executor
+from logger_config import TraceContextFilter
+from metrics import InstrumentedTransport
+from models import DatabaseManager, PlaybookData
+from tracing import FileSpanExporter, InMemorySpanExporter, start_span
+
+
+class TracingTestCase(unittest.TestCase):
+    """启用内存导出器，测试结束后关闭追踪"""
+
+    def setUp(self):
+        self.exporter = InMemorySpanExporter()
+        tracing.configure_tracing(self.exporter)
+        self.addCleanup(tracing.configure_tracing, None)
+
+    def spans(self):
+        return {span["name"]: span for span in self.exporter.get_finished_spans()}
+
+    def wait_for_span(self, name, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while name not in self.spans() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.spans()[name]
+
+
+class TestSpans(TracingTestCase):
+    """span 层级、采样与日志关联"""
+
+    def test_children_share_trace(self):
+        """测试子 span 继承链路ID并记录父 span"""
+        with start_span("parent") as parent:
+            with start_span("child", attributes={"k": "v"}):
+                pass
+        spans = self.spans()
+        self.assertEqual(spans["child"]["traceId"], spans["parent"]["traceId"])
+        self.assertEqual(spans["child"]["parentSpanId"], spans["parent"]["spanId"])
+        self.assertIsNone(spans["parent"]["parentSpanId"])
+        self.assertEqual(spans["child"]["attributes"], {"k": "v"})
+        self.assertFalse(parent.is_recording())
+
+    def test_exception_recorded(self):
+        """测试异常记录为错误状态与 exception 事件"""
+        with self.assertRaises(ValueError):
+            with start_span("failing"):
+                raise ValueError("boom")
+        span = self.spans()["failing"]
+        self.assertEqual(span["status"]["code"], "ERROR")
+        self.assertEqual(span["events"][0]["attributes"]["exception.message"], "boom")
+
+    def test_unsampled_trace_records_nothing(self):
+        """测试未采样的链路及其子 span 都不记录"""
+        tracing.configure_tracing(self.exporter, sample_ratio=0.0)
+        with start_span("parent"):
+            with start_span("child"):
+                pass
+        self.assertEqual(self.exporter.get_finished_spans(), [])
+
+    def test_disabled_is_noop(self):
+        """测试关闭追踪后不记录 span"""
+        tracing.configure_tracing(None)
+        with start_span("ignored") as span:
+            self.assertFalse(span.is_recording())
+        self.assertEqual(self.exporter.get_finished_spans(), [])
+
+    def test_log_records_carry_trace_id(self):
+        """测试日志附加当前链路ID"""
+        record = logging.LogRecord("t", logging.INFO, __file__, 1, "msg", None, None)
+        TraceContextFilter().filter(record)
+        self.assertEqual(record.trace, "")
+        with start_span("request"):
+            TraceContextFilter().filter(record)
+            trace_id = tracing.current_trace_id()
+        self.assertEqual(record.trace, f" | trace_id={trace_id}")
+
+    def test_file_exporter_writes_json_lines(self):
+        """测试文件导出器以 JSON Lines 追加写入"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "traces", "spans.jsonl")
+            exporter = FileSpanExporter(path)
+            tracing.configure_tracing(exporter)
+            with start_span("a"):
+                with start_span("b"):
+                    pass
+            tracing.configure_tracing(self.exporter)
+            with open(path, encoding="utf-8") as f:
+                names = [json.loads(line)["name"] for line in f]
+        self.assertEqual(names, ["b", "a"])
+
+
+class TestInstrumentation(TracingTestCase):
+    """数据库与 SOAR HTTP 调用的子 span"""
+
+    def test_db_calls_in_executor_join_trace(self):
+        """测试数据库线程中执行的调用归属到调用方的链路"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db = DatabaseManager(os.path.join(temp_dir, "test.db"))
+            db.init_db()
+
+            async def run():
+                with start_span("request"):
+                    await db_executor.run(db.get_user_tokens)
+            asyncio.run(run())
+            db.engine.dispose()
+
+        spans = self.spans()
+        self.assertEqual(spans["db.get_user_tokens"]["parentSpanId"], spans["request"]["spanId"])
+        self.assertEqual(spans["db.get_user_tokens"]["attributes"]["db.system"], "sqlite")
+        # 链路之外的数据库调用（init_db 等）不单独成为链路
+        self.assertNotIn("db.init_db", spans)
+
+    def test_http_request_span(self):
+        """测试每个 SOAR HTTP 请求一个 CLIENT span，路径中的ID归并"""
+        transport = InstrumentedTransport("test", trust_env=False)
+        transport._transport = httpx.MockTransport(lambda request: httpx.Response(502))
+
+        async def run():
+            async with httpx.AsyncClient(transport=transport, base_url="http://soar") as client:
+                with start_span("request"):
+                    await client.get("/api/activity/42")
+        asyncio.run(run())
+
+        span = self.spans()["GET /api/activity/{id}"]
+        self.assertEqual(span["kind"], "CLIENT")
+        self.assertEqual(span["parentSpanId"], self.spans()["request"]["spanId"])
+        self.assertEqual(span["attributes"]["http.response.status_code"], 502)
+        self.assertEqual(span["status"]["code"], "ERROR")
+
+
+@pytest.mark.usefixtures("catalog_store")
+class TestMcpRequestTrace(TracingTestCase):
+    """MCP 请求：HTTP 根 span → Token 验证 / 工具调用 → 审计日志 → 数据库"""
+
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.temp_dir.name, "test.db"))
+        self.db.init_db()
+        self.token = self.db.create_user_token("ci")
+        store = self.make_catalog_store(PlaybookData(id=1, name="pb"))
+        for target, name, value in ((auth_provider, "db_manager", self.db),
+                                    (soar_mcp_server, "db_manager", self.db),
+                                    (soar_mcp_server, "playbook_catalog", store)):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.temp_dir.cleanup()
+
+    def test_tool_call_trace(self):
+        """测试一次工具调用的各阶段 span 位于同一链路，响应头返回链路ID"""
+        app = soar_mcp_server.mcp.http_app(path="/mcp", stateless_http=True, json_response=True)
+        request = {"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                   "params": {"name": "list_playbooks_quick", "arguments": {}}}
+
+        async def run():
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                    return await client.post("/mcp", json=request, headers={
+                        "Authorization": f"Bearer {self.token}",
+                        "Accept": "application/json, text/event-stream"})
+        response = asyncio.run(run())
+        self.assertEqual(response.status_code, 200, response.text)
+
+        audit_write = self.wait_for_span("db.log_audit_event")
+        spans = self.spans()
+        root = spans["POST /mcp"]
+        self.assertEqual(response.headers["x-trace-id"], root["traceId"])
+        self.assertEqual(root["kind"], "SERVER")
+        self.assertEqual(root["attributes"]["http.response.status_code"], 200)
+
+        verify = spans["verify_token"]
+        self.assertEqual(verify["parentSpanId"], root["spanId"])
+        self.assertEqual(spans["db.get_token_by_value"]["parentSpanId"], verify["spanId"])
+
+        # FastMCP 为工具调用创建的 span 挂在 HTTP 根 span 下
+        tool = spans["tools/call list_playbooks_quick"]
+        self.assertEqual(tool["parentSpanId"], root["spanId"])
+        audit = spans["audit_mcp_access"]
+        self.assertEqual(audit["parentSpanId"], tool["spanId"])
+        self.assertEqual(audit_write["parentSpanId"], audit["spanId"])
+        self.assertTrue(all(span["traceId"] == root["traceId"] for span in spans.values()))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+SOAR MCP 请求链路追踪
+基于 OpenTelemetry API 埋点：每个 HTTP 请求一个根 span，FastMCP 为每个 MCP 请求创建的 span，
+以及 Token 验证、审计日志、数据库调用与 SOAR HTTP 请求的子 span 都挂在同一条链路下，
+链路ID同时写入日志。
+
+TRACE_EXPORTER 选择导出方式：
+- 空（默认）  不追踪，埋点几乎没有开销
+- file       内置的轻量实现，span 以 JSON Lines 追加到 TRACE_FILE
+- memory     内置的轻量实现，保留在内存中（测试与调试）
+- otel       使用 OpenTelemetry SDK 配置的全局 TracerProvider（例如 opentelemetry-instrument 启动）
+
+项目只依赖 opentelemetry-api：file/memory 由本模块的轻量 TracerProvider 实现（只保留按比例采样、
+父子关系与导出，不含 SDK 的批处理与资源属性），需要 OTLP 等导出时安装 SDK 并使用 otel 模式。
+两种方式共用同一套埋点（start_span、traced_methods、TracingMiddleware）。
+"""
+
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Deque, Dict, Iterator, List, Mapping, Optional
+
+from opentelemetry import context as otel_context
+from opentelemetry import propagate
+from opentelemetry import trace as trace_api
+from opentelemetry.trace import (
+    INVALID_SPAN, NonRecordingSpan, SpanContext, SpanKind, Status, StatusCode, TraceFlags,
+    format_span_id, format_trace_id,
+)
+
+from logger_config import logger
+
+# 本项目埋点使用的 instrumentation 名称
+INSTRUMENTATION_NAME = "soar_mcp"
+
+# 不追踪的 HTTP 路径（探针、指标与静态资源）
+UNTRACED_PATH_PREFIXES = ("/metrics", "/ready", "/static/")
+
+
+def _span_to_dict(span: "_RecordedSpan") -> Dict[str, Any]:
+    """将 span 转为与 OTLP JSON 字段命名一致的字典"""
+    parent = span.parent
+    return {
+        "traceId": format_trace_id(span.context.trace_id),
+        "spanId": format_span_id(span.context.span_id),
+        "parentSpanId": format_span_id(parent.span_id) if parent is not None else None,
+        "name": span.name,
+        "kind": span.kind.name,
+        "startTimeUnixNano": span.start_time,
+        "endTimeUnixNano": span.end_time,
+        "durationMs": round((span.end_time - span.start_time) / 1e6, 3),
+        "attributes": dict(span.attributes),
+        "events": span.events,
+        "status": {"code": span.status.status_code.name, "message": span.status.description},
+        "scope": span.scope,
+    }
+
+
+class InMemorySpanExporter:
+    """内存导出器：保留最近结束的 span"""
+
+    def __init__(self, max_spans: int = 10000):
+        self._spans: Deque[Dict[str, Any]] = deque(maxlen=max_spans)
+
+    def export(self, span: "_RecordedSpan"):
+        self._spans.append(_span_to_dict(span))
+
+    def get_finished_spans(self) -> List[Dict[str, Any]]:
+        """已结束的 span（按结束顺序）"""
+        return list(self._spans)
+
+    def clear(self):
+        self._spans.clear()
+
+    def shutdown(self):
+        pass
+
+
+class FileSpanExporter:
+    """文件导出器：后台线程将 span 以 JSON Lines 追加到文件，不阻塞请求"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=10000)
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: "_RecordedSpan"):
+        try:
+            self._queue.put_nowait(_span_to_dict(span))
+        except queue.Full:
+            self._dropped += 1
+
+    def _run(self):
+        # 多 worker 进程写同一文件：以 O_APPEND 打开，每批 span 一次 write 追加，行不会交错
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            stopping = False
+            while not stopping:
+                batch = [self._queue.get()]
+                while not self._queue.empty() and len(batch) < 512:
+                    batch.append(self._queue.get_nowait())
+                stopping = None in batch
+                lines = [json.dumps(item, ensure_ascii=False, default=str) + "\n" for item in batch if item is not None]
+                if lines:
+                    os.write(fd, "".join(lines).encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        if self._dropped:
+            logger.warning(f"追踪导出队列已满，丢弃 {self._dropped} 个 span")
+
+
+class _RecordedSpan(trace_api.Span):
+    """内置实现的 span：结束时交给导出器"""
+
+    def __init__(self, name: str, context: SpanContext, parent: Optional[SpanContext], kind: SpanKind,
+                 scope: str, exporter: Any, attributes: Optional[Mapping[str, Any]] = None,
+                 start_time: Optional[int] = None):
+        self.name = name
+        self.context = context
+        self.parent = parent
+        self.kind = kind
+        self.scope = scope
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.dropped_attributes = 0
+        self.events: List[Dict[str, Any]] = []
+        self.status = Status(StatusCode.UNSET)
+        self.start_time = start_time or time.time_ns()
+        self.end_time: Optional[int] = None
+        self._exporter = exporter
+
+    def get_span_context(self) -> SpanContext:
+        return self.context
+
+    def set_attributes(self, attributes: Mapping[str, Any]):
+        if self.end_time is None:
+            self.attributes.update(attributes)
+
+    def set_attribute(self, key: str, value: Any):
+        if self.end_time is None:
+            self.attributes[key] = value
+
+    def add_event(self, name: str, attributes: Optional[Mapping[str, Any]] = None,
+                  timestamp: Optional[int] = None):
+        if self.end_time is None:
+            self.events.append({"name": name, "timeUnixNano": timestamp or time.time_ns(),
+                                "attributes": dict(attributes or {})})
+
+    def update_name(self, name: str):
+        if self.end_time is None:
+            self.name = name
+
+    def is_recording(self) -> bool:
+        return self.end_time is None
+
+    def set_status(self, status, description: Optional[str] = None):
+        if self.end_time is not None:
+            return
+        if isinstance(status, StatusCode):
+            status = Status(status, description)
+        self.status = status
+
+    def record_exception(self, exception: BaseException, attributes: Optional[Mapping[str, Any]] = None,
+                         timestamp: Optional[int] = None, escaped: bool = False):
+        self.add_event("exception", {"exception.type": type(exception).__name__,
+                                     "exception.message": str(exception), **(attributes or {})}, timestamp)
+
+    def end(self, end_time: Optional[int] = None):
+        if self.end_time is not None:
+            return
+        self.end_time = end_time or time.time_ns()
+        try:
+            self._exporter.export(self)
+        except Exception as e:
+            logger.debug(f"导出 span 失败: {e}")
+
+
+class _Tracer(trace_api.Tracer):
+    """内置实现的 tracer：按比例对新链路采样，子 span 继承父 span 的采样结果"""
+
+    def __init__(self, provider: "_TracerProvider", scope: str):
+        self._provider = provider
+        self._scope = scope
+
+    def start_span(self, name: str, context=None, kind: SpanKind = SpanKind.INTERNAL,
+                   attributes=None, links=None, start_time=None,
+                   record_exception: bool = True, set_status_on_exception: bool = True) -> trace_api.Span:
+        exporter = self._provider.exporter
+        if exporter is None:
+            return INVALID_SPAN
+        parent = trace_api.get_current_span(context).get_span_context()
+        if parent.is_valid:
+            trace_id, sampled = parent.trace_id, parent.trace_flags.sampled
+        else:
+            parent = None
+            trace_id = random.getrandbits(128)
+            sampled = random.random() < self._provider.sample_ratio
+        span_context = SpanContext(trace_id, random.getrandbits(64), is_remote=False,
+                                   trace_flags=TraceFlags(TraceFlags.SAMPLED if sampled else TraceFlags.DEFAULT))
+        if not sampled:
+            return NonRecordingSpan(span_context)
+        return _RecordedSpan(name, span_context, parent, kind, self._scope, exporter, attributes, start_time)
+
+    @contextmanager
+    def start_as_current_span(self, name: str, context=None, kind: SpanKind = SpanKind.INTERNAL,
+                              attributes=None, links=None, start_time=None, record_exception: bool = True,
+                              set_status_on_exception: bool = True, end_on_exit: bool = True) -> Iterator[trace_api.Span]:
+        span = self.start_span(name, context, kind, attributes, links, start_time,
+                               record_exception, set_status_on_exception)
+        with trace_api.use_span(span, end_on_exit=end_on_exit, record_exception=record_exception,
+                                set_status_on_exception=set_status_on_exception) as current:
+            yield current
+
+
+class _TracerProvider(trace_api.TracerProvider):
+    """内置实现的 TracerProvider，导出器可在运行时替换，为 None 时不记录"""
+
+    def __init__(self, exporter: Any = None, sample_ratio: float = 1.0):
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+
+    def get_tracer(self, instrumenting_module_name: str, instrumenting_library_version: Optional[str] = None,
+                   schema_url: Optional[str] = None, attributes=None) -> _Tracer:
+        return _Tracer(self, instrumenting_module_name)
+
+
+class _TracingState:
+    __slots__ = ("enabled", "provider", "tracer")
+
+    def __init__(self):
+        self.enabled = False
+        self.provider: Optional[_TracerProvider] = None
+        self.tracer: trace_api.Tracer = trace_api.get_tracer(INSTRUMENTATION_NAME)
+
+
+_state = _TracingState()
+
+
+def configure_tracing(exporter: Any = None, sample_ratio: float = 1.0, use_global_provider: bool = False):
+    """
+    配置追踪
+
+    Args:
+        exporter: 内置实现的导出器（InMemorySpanExporter / FileSpanExporter），None 表示关闭
+        sample_ratio: 新链路的采样比例
+        use_global_provider: 使用已由 OpenTelemetry SDK 配置的全局 TracerProvider
+    """
+    if use_global_provider:
+        _state.enabled = True
+        _state.tracer = trace_api.get_tracer(INSTRUMENTATION_NAME)
+        return
+    if _state.provider is None:
+        if exporter is None:
+            _state.enabled = False
+            return
+        # 全局 TracerProvider 只能设置一次，之后只替换导出器
+        _state.provider = _TracerProvider()
+        trace_api.set_tracer_provider(_state.provider)
+        _state.tracer = trace_api.get_tracer(INSTRUMENTATION_NAME)
+    elif _state.provider.exporter is not None and _state.provider.exporter is not exporter:
+        _state.provider.exporter.shutdown()
+    _state.provider.exporter = exporter
+    _state.provider.sample_ratio = sample_ratio
+    _state.enabled = exporter is not None
+
+
+def configure_from_env():
+    """根据环境变量配置追踪"""
+    mode = os.getenv("TRACE_EXPORTER", "").strip().lower()
+    ratio = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))
+    if mode == "file":
+        configure_tracing(FileSpanExporter(os.getenv("TRACE_FILE", "logs/traces.jsonl")), ratio)
+    elif mode == "memory":
+        configure_tracing(InMemorySpanExporter(), ratio)
+    elif mode == "otel":
+        configure_tracing(use_global_provider=True)
+    elif mode:
+        logger.warning(f"未知的 TRACE_EXPORTER: {mode}，不启用追踪")
+
+
+def shutdown_tracing():
+    """刷新并关闭导出器"""
+    if _state.provider is not None and _state.provider.exporter is not None:
+        _state.provider.exporter.shutdown()
+
+
+def start_span(name: str, kind: SpanKind = SpanKind.INTERNAL, attributes: Optional[Mapping[str, Any]] = None,
+               context: Optional[otel_context.Context] = None, child_only: bool = False):
+    """
+    在当前链路下创建子 span 并设为当前 span（上下文管理器）；未启用追踪时开销可忽略
+
+    child_only 为 True 时只在已有链路中创建，避免后台任务的每次数据库或 HTTP 调用各自成为一条链路
+    """
+    if not _state.enabled or (child_only and not _in_sampled_trace()):
+        return nullcontext(INVALID_SPAN)
+    return _state.tracer.start_as_current_span(name, context=context, kind=kind, attributes=attributes)
+
+
+def _in_sampled_trace() -> bool:
+    # 父 span 可能已结束（例如异步提交的审计写入），仍归属同一链路
+    span_context = trace_api.get_current_span().get_span_context()
+    return span_context.is_valid and span_context.trace_flags.sampled
+
+
+def current_trace_id() -> Optional[str]:
+    """当前链路ID，不在链路中时返回 None"""
+    span_context = trace_api.get_current_span().get_span_context()
+    return format_trace_id(span_context.trace_id) if span_context.is_valid else None
+
+
+# ===== 埋点 =====
+
+def traced_methods(prefix: str, exclude: tuple = ()):
+    """类装饰器：在请求链路中调用公开方法时创建 `{prefix}.{方法名}` 子 span"""
+    def wrap(name: str, method: Callable) -> Callable:
+        span_name = f"{prefix}.{name}"
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return method(*args, **kwargs)
+            with start_span(span_name, SpanKind.CLIENT, {"db.system": "sqlite", "db.operation": name},
+                            child_only=True):
+                return method(*args, **kwargs)
+        return wrapper
+
+    def decorator(cls):
+        for name, attr in list(vars(cls).items()):
+            if not name.startswith("_") and name not in exclude and inspect.isfunction(attr):
+                setattr(cls, name, wrap(name, attr))
+        return cls
+    return decorator
+
+
+class TracingMiddleware:
+    """
+    ASGI 中间件：为每个 HTTP 请求创建根 span（延续请求头中的 traceparent），
+    并在响应头 X-Trace-Id 中返回链路ID
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not _state.enabled or path.startswith(UNTRACED_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        method = scope.get("method", "GET")
+        attributes = {"http.request.method": method, "url.path": path}
+        with start_span(f"{method} {path}", SpanKind.SERVER, attributes, context=propagate.extract(carrier)) as span:
+            trace_id = current_trace_id()
+
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(StatusCode.ERROR)
+                    if trace_id:
+                        message = dict(message, headers=list(message.get("headers", [])) +
+                                       [(b"x-trace-id", trace_id.encode())])
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)